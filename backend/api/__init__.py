@@ -1,13 +1,52 @@
+import asyncio
 import os
+import weakref
 import firebase_admin
 from firebase_admin import credentials, firestore
 from django.conf import settings
 
+from api.instrumented_db import instrument
+
+# FIRESTORE_BACKEND=memory swaps Firestore for the in-process stand-in in
+# api.fake_firestore (benchmarks, local runs without a Firebase project)
+USE_FAKE_FIRESTORE = settings.FIRESTORE_BACKEND == "memory"
+cred_path = os.path.join(settings.BASE_DIR, "serviceAccountKey.json")
+
 # Initialize Firebase once for entire Django project
-if not firebase_admin._apps:
-    cred_path = os.path.join(settings.BASE_DIR, "serviceAccountKey.json")
+if not firebase_admin._apps and (not USE_FAKE_FIRESTORE or os.path.exists(cred_path)):
     cred = credentials.Certificate(cred_path)
     firebase_admin.initialize_app(cred)
 
-# Export Firestore client (shared across views + commands)
-db = firestore.client()
+# Export Firestore client (shared across views + commands). It is wrapped
+# so every RPC is timed and counted per request (api.metrics).
+if USE_FAKE_FIRESTORE:
+    from api.fake_firestore import FakeAsyncClient, FakeClient
+
+    _client = FakeClient()
+else:
+    _client = firestore.client()
+
+db = instrument(_client)
+
+
+# Async Firestore client for api.async_views. gRPC aio channels are bound
+# to the event loop that first uses them, so keep one client per loop:
+# under an ASGI server that is a single shared client, under runserver
+# (which spins up a loop per async request) it stays correct.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_db():
+    if USE_FAKE_FIRESTORE:
+        return instrument(FakeAsyncClient(_client))
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        app = firebase_admin.get_app()
+        client = firestore.AsyncClient(
+            project=app.project_id,
+            credentials=app.credential.get_credential(),
+        )
+        _async_clients[loop] = client
+    return instrument(client)
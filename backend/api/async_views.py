@@ -0,0 +1,354 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from firebase_admin import firestore
+
+from api import get_async_db
+from api.auth import get_uid_from_request
+from api.conditional import not_modified, page_validators, page_version, with_validators
+from api.display_names import get_display_names
+from api.geo import parse_lat_lng
+from api.live import (
+    ASGI_REQUIRED,
+    async_sse_stream,
+    event_stream_response,
+    live_feed_query,
+    live_registry,
+    live_tag_query,
+    served_over_asgi,
+)
+from api.pagination import InvalidCursor, apaginate, decode_rank_cursor, get_page_params
+from api.ranking import async_get_candidate_pool, ranked_page
+from api.tag_query import query_tags_all, query_tags_any
+from api.serializers import (
+    FEED_FIELDS,
+    TAG_FIELDS,
+    activity_row,
+    apply_comment_display_names,
+    comment_item,
+    get_fields_param,
+    projection,
+)
+from api.views import ai_feed_item, parse_tags
+from api.weather import async_fetch_weather_timeline
+
+# ============================================================
+# Async read endpoints
+# ============================================================
+#
+# Async twins of the read-heavy views in api.views, served under
+# /api/async/... . They run on Firestore's AsyncClient and issue each
+# request's independent reads concurrently with asyncio.gather(), so
+# latency is the slowest sub-query rather than the sum of all of them.
+# Run them under an ASGI server (e.g. `uvicorn core.asgi:application`)
+# to get the concurrency benefit; under runserver they still work.
+
+# Token verification / display-name lookups are sync (and cached);
+# run misses off the event loop.
+_get_uid = sync_to_async(get_uid_from_request, thread_sensitive=False)
+_get_display_names = sync_to_async(get_display_names, thread_sensitive=False)
+
+
+async def _optional_uid(request):
+    uid, _ = await _get_uid(request)
+    return uid
+
+
+async def get_liked_activity_ids(uid, activity_ids):
+    """Async api.views.get_liked_activity_ids(): one batched get_all()."""
+    if not uid or not activity_ids:
+        return set()
+
+    adb = get_async_db()
+    like_refs = [
+        adb.collection("activities").document(activity_id).collection("likes").document(uid)
+        for activity_id in activity_ids
+    ]
+    return {
+        snap.reference.parent.parent.id
+        async for snap in adb.get_all(like_refs)
+        if snap.exists
+    }
+
+
+async def _feed_display_names(feed):
+    uids = []
+    for item in feed:
+        uids.extend(item.get("participants") or [])
+        if item.get("last_comment"):
+            uids.append(item["last_comment"].get("user_id"))
+    return await _get_display_names(uids)
+
+
+# ============================================================
+# Feed
+# ============================================================
+
+async def get_feed(request):
+    limit, cursor, error = get_page_params(request)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, FEED_FIELDS)
+    if error:
+        return error
+
+    try:
+        activities_ref = get_async_db().collection("activities")
+        query = (
+            activities_ref
+            .select(projection(fields))
+            .order_by("time_start", direction=firestore.Query.DESCENDING)
+        )
+
+        uid, (docs, next_cursor) = await asyncio.gather(
+            _optional_uid(request),
+            apaginate(query, activities_ref, cursor, limit),
+        )
+
+        validators = page_validators(page_version(docs, next_cursor), uid)
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        # Rows are built first so display names can resolve alongside likes
+        feed_rows = [activity_row(doc.id, doc.to_dict(), False, fields) for doc in docs]
+
+        liked_ids, display_names = await asyncio.gather(
+            get_liked_activity_ids(uid if "user_liked" in fields else None, [doc.id for doc in docs]),
+            _feed_display_names(feed_rows),
+        )
+        if "user_liked" in fields:
+            for item in feed_rows:
+                item["user_liked"] = item["id"] in liked_ids
+
+        return with_validators(JsonResponse({
+            "feed": feed_rows,
+            "display_names": display_names,
+            "next_cursor": next_cursor,
+        }), validators)
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def get_feed_ai(request):
+    lat = request.GET.get("lat")
+    lng = request.GET.get("lng")
+
+    if not lat or not lng:
+        return JsonResponse({"error": "Missing ?lat=&lng="}, status=400)
+
+    lat, lng = parse_lat_lng(lat, lng)
+    if lat is None:
+        return JsonResponse({"error": "Invalid ?lat=&lng="}, status=400)
+
+    limit, cursor, error = get_page_params(request, decode=decode_rank_cursor)
+    if error:
+        return error
+
+    try:
+        uid, timeline, pool = await asyncio.gather(
+            _optional_uid(request),
+            async_fetch_weather_timeline(lat, lng),
+            async_get_candidate_pool(get_async_db()),
+        )
+        ranked, next_cursor = ranked_page(pool, lat, lng, timeline, cursor, limit)
+
+        feed_rows = [
+            ai_feed_item(activity_id, act, False, timeline, *scores)
+            for activity_id, act, *scores in ranked
+        ]
+
+        liked_ids, display_names = await asyncio.gather(
+            get_liked_activity_ids(uid, [row[0] for row in ranked]),
+            _feed_display_names(feed_rows),
+        )
+        for item in feed_rows:
+            item["user_liked"] = item["id"] in liked_ids
+
+        return JsonResponse({
+            "feed": feed_rows,
+            "display_names": display_names,
+            "next_cursor": next_cursor,
+        })
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# ============================================================
+# Comments
+# ============================================================
+
+async def list_comments(request, activity_id):
+    limit, cursor, error = get_page_params(request, default_limit=20)
+    if error:
+        return error
+
+    try:
+        comments_ref = (
+            get_async_db().collection("activities").document(activity_id).collection("comments")
+        )
+        query = comments_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
+        docs, next_cursor = await apaginate(query, comments_ref, cursor, limit)
+
+        validators = page_validators(page_version(docs, next_cursor))
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        comments = [comment_item(d.id, d.to_dict()) for d in docs]
+        display_names = await _get_display_names([c["user_id"] for c in comments])
+        apply_comment_display_names(comments, display_names)
+
+        return with_validators(JsonResponse({
+            "comments": comments,
+            "display_names": display_names,
+            "next_cursor": next_cursor,
+        }), validators)
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# ============================================================
+# Tag Filtering
+# ============================================================
+
+async def _activity_rows(docs, uid, fields):
+    liked_ids = set()
+    if "user_liked" in fields:
+        liked_ids = await get_liked_activity_ids(uid, [doc.id for doc in docs])
+    return [activity_row(doc.id, doc.to_dict(), doc.id in liked_ids, fields) for doc in docs]
+
+
+async def _tag_page(request, query, limit, cursor, fields):
+    """Run one tag query page concurrently with auth, answer If-None-Match, then resolve likes."""
+    activities_ref = get_async_db().collection("activities")
+
+    uid, (docs, next_cursor) = await asyncio.gather(
+        _optional_uid(request),
+        apaginate(query, activities_ref, cursor, limit),
+    )
+
+    validators = page_validators(page_version(docs, next_cursor), uid)
+    response = not_modified(request, validators)
+    if response:
+        return response
+
+    results = await _activity_rows(docs, uid, fields)
+    return with_validators(
+        JsonResponse({"activities": results, "next_cursor": next_cursor}), validators
+    )
+
+
+async def activities_by_tag(request):
+    tag = request.GET.get("tag")
+    if not tag:
+        return JsonResponse({"error": "Missing ?tag="}, status=400)
+
+    limit, cursor, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
+
+    try:
+        query = (
+            get_async_db().collection("activities")
+            .where("tags", "array_contains", tag)
+            .select(projection(fields))
+            .order_by("time_start", direction=firestore.Query.DESCENDING)
+        )
+        return await _tag_page(request, query, limit, cursor, fields)
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def _activities_by_tags(request, planner):
+    raw = request.GET.get("tags")
+    if not raw:
+        return JsonResponse({"error": "Missing ?tags="}, status=400)
+
+    tags = parse_tags(raw)
+    if not tags:
+        return JsonResponse({"error": "Missing ?tags="}, status=400)
+
+    limit, cursor, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
+
+    try:
+        # The planner's reads depend on each other (tag counts -> driver
+        # query -> follow-up scans), so it runs as one unit in a thread,
+        # concurrently with token verification.
+        uid, (docs, next_cursor) = await asyncio.gather(
+            _optional_uid(request),
+            sync_to_async(planner, thread_sensitive=False)(
+                tags, cursor, limit, select=projection(fields)
+            ),
+        )
+
+        results = await _activity_rows(docs, uid, fields)
+        return JsonResponse({"activities": results, "next_cursor": next_cursor})
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+async def activities_by_tags_any(request):
+    return await _activities_by_tags(request, query_tags_any)
+
+
+async def activities_by_tags_all(request):
+    return await _activities_by_tags(request, query_tags_all)
+
+
+# ============================================================
+# Live updates (SSE, see api.live)
+# ============================================================
+
+async def _live(request, key, make_query):
+    # Under WSGI the stream would hold a worker thread until it ends
+    if not served_over_asgi(request):
+        return JsonResponse({"error": ASGI_REQUIRED}, status=503)
+
+    # Starting a listener is a blocking call into the Firestore client
+    subscription, missed = await sync_to_async(live_registry.subscribe, thread_sensitive=False)(
+        key, make_query,
+        last_event_id=request.headers.get("Last-Event-ID"),
+        loop=asyncio.get_running_loop(),
+    )
+    if subscription is None:
+        return JsonResponse({"error": "Too many live subscriptions, poll instead"}, status=503)
+    return event_stream_response(async_sse_stream(subscription, missed))
+
+
+async def live_feed(request):
+    return await _live(request, "feed", live_feed_query)
+
+
+async def live_activities_by_tag(request):
+    tag = request.GET.get("tag")
+    if not tag:
+        return JsonResponse({"error": "Missing ?tag="}, status=400)
+    return await _live(request, f"tag:{tag}", lambda: live_tag_query(tag))
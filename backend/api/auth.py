@@ -1,13 +1,91 @@
-from firebase_admin import auth
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.http import JsonResponse
+from firebase_admin import auth
+
+from api.metrics import CACHE_STATS
+
+
+class VerifiedTokenCache:
+    """
+    Bounded in-process cache of verified Firebase ID tokens.
+
+    Entries are keyed by the SHA-256 of the raw token (the token itself is
+    never stored) and expire at the token's own `exp` claim, so a cached
+    token is never accepted for longer than Firebase would accept it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token hash -> decoded claims
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            decoded = self._entries.get(key)
+            if decoded is not None and decoded.get("exp", 0) > time.time():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return decoded
+
+            if decoded is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token, decoded):
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = decoded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+token_cache = VerifiedTokenCache(max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+CACHE_STATS.register("tokens", token_cache.stats)
+
+
+def verify_token(token):
+    decoded = token_cache.get(token)
+    if decoded is None:
+        decoded = auth.verify_id_token(token)
+        token_cache.put(token, decoded)
+    return decoded
+
 
 def get_uid_from_request(request):
-    header = request.headers.get("Authorization")
-    if not header:
-        return None, JsonResponse({"error":"No token"}, status=401)
+    """
+    Extract Firebase ID token from Authorization header.
+    Used only where the UID comes from token, not URL.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return None, JsonResponse({"error": "Missing Authorization header"}, status=401)
+
     try:
-        token = header.split(" ")[1]
-        decoded = auth.verify_id_token(token)
-        return decoded['uid'], None
-    except Exception as e:
-        return None, JsonResponse({"error": str(e)}, status=401)
+        token = auth_header.split(" ")[1]
+        decoded = verify_token(token)
+        return decoded["uid"], None
+    except Exception:
+        return None, JsonResponse({"error": "Invalid token"}, status=401)
@@ -0,0 +1,78 @@
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+# ============================================================
+# Conditional GET
+# ============================================================
+#
+# Listing endpoints (feed, comments, by-tag, by-user) derive their
+# validators from the page query alone, before any per-item sub-query
+# (likes lookups, display names) runs:
+#
+#   ETag          W/"<digest of the page's document ids + update_times,
+#                    their count, and the viewer>"
+#   Last-Modified newest update_time on the page
+#
+# A request whose If-None-Match matches gets a 304 straight after the
+# page query. Only If-None-Match is evaluated: when a row drops off a
+# page, the newest update_time on it can stay the same, so
+# If-Modified-Since alone cannot tell the page changed.
+#
+# Responses are private (user_liked differs per viewer) and marked
+# no-cache, so clients revalidate every time and pay for a body only
+# when the page actually changed.
+
+
+def page_version(docs, *extra):
+    """
+    (digest, last_modified) of the documents a page is built from.
+    Any edit, insert or removal changes the digest; `extra` folds in
+    anything else the body depends on (e.g. the next cursor).
+    last_modified is epoch seconds, None for an empty page.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    newest = None
+    count = 0
+
+    for doc in docs:
+        count += 1
+        update_time = getattr(doc, "update_time", None)
+        digest.update(f"{doc.id}@{update_time.isoformat() if update_time else ''}\n".encode())
+        if update_time is not None:
+            stamp = update_time.timestamp()
+            newest = stamp if newest is None else max(newest, stamp)
+
+    digest.update(f"#{count}".encode())
+    for part in extra:
+        digest.update(f"|{part}".encode())
+    return digest.hexdigest(), newest
+
+
+def page_validators(version, viewer=None):
+    """(ETag, Last-Modified timestamp) of one viewer's response for a page_version()."""
+    digest, last_modified = version
+    if viewer:
+        digest = hashlib.blake2b(f"{digest}:{viewer}".encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"', last_modified
+
+
+def not_modified(request, validators):
+    """A 304 response if the client's If-None-Match matches, else None."""
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag)
+    if isinstance(response, HttpResponseNotModified):
+        return with_validators(response, validators)
+    return None
+
+
+def with_validators(response, validators):
+    etag, last_modified = validators
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization"])
+    return response
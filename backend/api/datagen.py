@@ -0,0 +1,210 @@
+import bisect
+import math
+import random
+import string
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from api.geo import activity_geo_fields
+from api.tag_query import TAG_STATS, _is_stat_key
+from api.views import last_comment_summary, timeline_entry
+
+# ============================================================
+# Synthetic dataset
+# ============================================================
+#
+# Deterministic (seeded) generator for load tests and benchmarks. It
+# yields (document path, data) pairs in the shape the API writes:
+# users, activities with their denormalised summary and geohash fields,
+# likes, comments, per-participant timelines and tag_stats. Popularity
+# is skewed (a few users / tags / activities get most of the traffic),
+# which is what makes caches and indexes behave realistically.
+
+TAGS = [
+    "fun", "friends", "food", "culture", "fitness", "outdoor", "indoor", "health",
+    "city", "relax", "walking", "nature", "sport", "outside", "adventure", "cafe",
+    "gaming", "movie", "cinema", "dinner", "shopping", "boardgames", "gym", "run",
+    "coffee", "museum", "study", "music", "concert", "party", "books", "art",
+    "cycling", "swimming", "climbing", "yoga", "dance", "photography", "travel", "volunteering",
+]
+
+CITIES = {
+    "Warsaw": (52.2297, 21.0122),
+    "Kraków": (50.0647, 19.9450),
+    "Gdańsk": (54.3520, 18.6466),
+    "Wrocław": (51.1079, 17.0385),
+    "Poznań": (52.4064, 16.9252),
+}
+
+DESCRIPTIONS = [
+    "Going to the cinema", "Dinner at a restaurant", "Shopping time", "Board game evening",
+    "Strength workout", "Morning run", "Coffee meetup", "Visiting a museum",
+    "Group study session", "Walk around the city",
+]
+
+_ID_CHARS = string.ascii_letters + string.digits
+
+
+def _doc_id(rng):
+    return "".join(rng.choices(_ID_CHARS, k=20))
+
+
+def _skewed(rng, population, cum_weights, k):
+    """k distinct picks, weighted (cumulative weights, so each pick is O(log n))."""
+    picks = []
+    while len(picks) < min(k, len(population)):
+        pick = rng.choices(population, cum_weights=cum_weights)[0]
+        if pick not in picks:
+            picks.append(pick)
+    return picks
+
+
+def _long_tail(rng, mean, cap, alpha):
+    """Pareto count with roughly the given mean (heavier tail as alpha -> 1), capped."""
+    return min(int(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha), cap)
+
+
+def _scatter(rng, lat, lng, spread_km):
+    r = spread_km * math.sqrt(rng.random())
+    theta = rng.random() * 2 * math.pi
+    d_lat = r * math.cos(theta) / 111.32
+    d_lng = r * math.sin(theta) / (111.32 * math.cos(math.radians(lat)))
+    return round(lat + d_lat, 6), round(lng + d_lng, 6)
+
+
+def user_id(index):
+    return f"user{index:06d}"
+
+
+def user_city(index, city_names, city_weights):
+    """Weighted city of user `index`; a hash, so every worker agrees without sharing state."""
+    point = (index * 2654435761 % 2**32) / 2**32 * city_weights[-1]
+    return city_names[bisect.bisect_right(city_weights, point)]
+
+
+def parse_weights(raw, names):
+    """
+    "Warsaw=5,Kraków=2" -> weights for `names` (unlisted ones get 0).
+    Empty / None means equal weights. Raises ValueError on bad input.
+    """
+    if not raw:
+        return [1.0] * len(names)
+
+    weights = dict.fromkeys(names, 0.0)
+    for part in raw.split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if not sep or name not in weights:
+            raise ValueError(f"Expected NAME=WEIGHT with NAME in {', '.join(names)}: {part!r}")
+        weights[name] = float(value)
+    if not any(w > 0 for w in weights.values()):
+        raise ValueError("At least one weight must be positive")
+    return [weights[name] for name in names]
+
+
+def _part_range(total, part, parts):
+    """[start, stop) of the part-th of `parts` near-equal slices of range(total)."""
+    size, extra = divmod(total, parts)
+    start = part * size + min(part, extra)
+    return start, start + size + (part < extra)
+
+
+def generate(activities=10_000, users=1_000, likes_mean=3, comments_mean=2,
+             spread_km=15.0, days=60, days_ahead=7, tag_skew=1.0, city_weights=None,
+             engagement_skew=1.5, seed=42, now=None, part=0, parts=1):
+    """
+    Yield (path, data) for a dataset of `users` users and `activities`
+    activities (with likes, comments, timelines and tag_stats).
+
+    - tag_skew: Zipf exponent of tag popularity (0 = uniform)
+    - city_weights: weight per CITIES entry (default equal); activities
+      are placed around their first participant's city
+    - engagement_skew: Pareto shape of likes / comments per activity
+      (> 1; closer to 1 = a few activities get most of the engagement)
+    - days / days_ahead: time_start spans now - days .. now + days_ahead
+
+    With parts > 1 this yields only slice `part` of the users and
+    activities (its own random stream), so workers can generate a
+    dataset between them; each part's tag_stats count only its slice.
+    """
+    rng = random.Random(seed if parts == 1 else f"{seed}:{part}")
+    now = now or datetime.now(timezone.utc)
+
+    uids = [user_id(i) for i in range(users)]
+    user_weights = list(accumulate(1 / (i + 1) ** 0.8 for i in range(users)))
+    tag_weights = list(accumulate(1 / (i + 1) ** tag_skew for i in range(len(TAGS))))
+    city_names = list(CITIES)
+    city_cum_weights = list(accumulate(city_weights or [1.0] * len(city_names)))
+
+    first, last = _part_range(users, part, parts)
+    for i in range(first, last):
+        uid = uids[i]
+        yield f"users/{uid}", {
+            "uid": uid,
+            "tags": _skewed(rng, TAGS, tag_weights, rng.randint(2, 6)),
+            "description": "",
+            "city": user_city(i, city_names, city_cum_weights),
+            "display_name": f"User {i}",
+            "created_at": now - timedelta(days=days),
+        }
+
+    first, last = _part_range(activities, part, parts)
+    tag_counts = Counter()
+    for _ in range(first, last):
+        activity_id = _doc_id(rng)
+        participants = _skewed(rng, uids, user_weights, rng.choices([1, 2, 3], [6, 3, 1])[0])
+        tags = _skewed(rng, TAGS, tag_weights, rng.randint(1, 3))
+        city = user_city(int(participants[0][4:]), city_names, city_cum_weights)
+        lat, lng = _scatter(rng, *CITIES[city], spread_km)
+        time_start = now - timedelta(seconds=rng.uniform(-days_ahead * 86400, days * 86400))
+
+        activity = {
+            "user_id": participants[0],
+            "participants": participants,
+            "tags": tags,
+            "description": rng.choice(DESCRIPTIONS),
+            "location": {"lat": lat, "lng": lng},
+            "time_start": time_start,
+            "time_end": time_start + timedelta(hours=rng.randint(1, 4)),
+            "created_at": time_start,
+            "likes_count": 0,
+            "comments_count": 0,
+            "last_comment": None,
+            **activity_geo_fields(lat, lng),
+        }
+        path = f"activities/{activity_id}"
+
+        likers = _skewed(rng, uids, user_weights, _long_tail(rng, likes_mean, 200, engagement_skew))
+        for uid in likers:
+            yield f"{path}/likes/{uid}", {
+                "user_id": uid,
+                "user_display_name": f"User {int(uid[4:])}",
+                "timestamp": time_start,
+            }
+        activity["likes_count"] = len(likers)
+
+        comment_count = _long_tail(rng, comments_mean, 100, engagement_skew)
+        for n in range(comment_count):
+            uid = rng.choices(uids, cum_weights=user_weights)[0]
+            comment_id = _doc_id(rng)
+            comment = {
+                "user_id": uid,
+                "user_display_name": f"User {int(uid[4:])}",
+                "text": f"Comment {n} on {activity['description'].lower()}",
+                "timestamp": time_start + timedelta(minutes=n + 1),
+            }
+            yield f"{path}/comments/{comment_id}", comment
+            activity["last_comment"] = last_comment_summary(comment_id, comment)
+        activity["comments_count"] = comment_count
+
+        yield path, activity
+
+        entry = timeline_entry(activity_id, activity)
+        for uid in participants:
+            yield f"users/{uid}/timeline/{activity_id}", entry
+
+        tag_counts.update(t for t in set(tags) if _is_stat_key(t))
+
+    for tag, count in tag_counts.items():
+        yield f"{TAG_STATS}/{tag}", {"tag": tag, "count": count}
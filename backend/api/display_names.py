@@ -0,0 +1,102 @@
+import threading
+import time
+
+from django.conf import settings
+from firebase_admin import auth
+
+from api.metrics import timed_http
+
+DEFAULT_DISPLAY_NAME = "User"
+GET_USERS_BATCH_SIZE = 100  # Admin SDK limit for auth.get_users()
+
+
+class DisplayNameCache:
+    """
+    TTL cache of Firebase Auth display names.
+
+    Unknown users (deleted accounts, seed-data UIDs) are cached as None
+    for a shorter negative TTL so they do not hit Auth on every request.
+    """
+
+    def __init__(self, ttl, negative_ttl, max_entries):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}  # uid -> (display_name or None, expires_at)
+        self._lock = threading.Lock()
+
+    def get_many(self, uids):
+        """Return ({uid: name_or_None} for cached uids, [missing uids])."""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for uid in uids:
+                entry = self._entries.get(uid)
+                if entry and entry[1] > now:
+                    found[uid] = entry[0]
+                else:
+                    missing.append(uid)
+        return found, missing
+
+    def put_many(self, names):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) + len(names) > self.max_entries:
+                self._entries = {
+                    uid: entry for uid, entry in self._entries.items() if entry[1] > now
+                }
+                if len(self._entries) + len(names) > self.max_entries:
+                    self._entries.clear()
+
+            for uid, name in names.items():
+                ttl = self.ttl if name is not None else self.negative_ttl
+                self._entries[uid] = (name, now + ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+display_name_cache = DisplayNameCache(
+    ttl=settings.DISPLAY_NAME_CACHE_TTL,
+    negative_ttl=settings.DISPLAY_NAME_NEGATIVE_TTL,
+    max_entries=settings.DISPLAY_NAME_CACHE_MAX_ENTRIES,
+)
+
+
+def _fetch_display_names(uids):
+    """Resolve uids through auth.get_users(), 100 per RPC."""
+    names = {}
+    for i in range(0, len(uids), GET_USERS_BATCH_SIZE):
+        chunk = uids[i:i + GET_USERS_BATCH_SIZE]
+        with timed_http("firebase_auth"):
+            result = auth.get_users([auth.UidIdentifier(uid) for uid in chunk])
+        for user in result.users:
+            names[user.uid] = user.display_name or ""
+        for uid in chunk:
+            names.setdefault(uid, None)
+    return names
+
+
+def get_display_names(uids):
+    """
+    Map every uid to a display name ("User" when unknown / unset).
+    Cached names are served from memory; the rest are fetched in batches.
+    """
+    uids = list(dict.fromkeys(uid for uid in uids if uid))
+    names, missing = display_name_cache.get_many(uids)
+
+    if missing:
+        try:
+            fetched = _fetch_display_names(missing)
+            display_name_cache.put_many(fetched)
+            names.update(fetched)
+        except Exception as e:
+            print("[ERROR get_display_names]", e)
+
+    return {uid: names.get(uid) or DEFAULT_DISPLAY_NAME for uid in uids}
+
+
+def get_display_name(uid):
+    return get_display_names([uid]).get(uid, DEFAULT_DISPLAY_NAME)
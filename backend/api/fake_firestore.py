@@ -0,0 +1,1047 @@
+import copy
+import datetime
+import itertools
+import random
+import string
+import threading
+from collections import Counter, OrderedDict
+from itertools import islice
+
+from google.api_core.exceptions import (
+    Aborted,
+    AlreadyExists,
+    GoogleAPICallError,
+    InvalidArgument,
+    NotFound,
+)
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.bulk_writer import BulkWriteFailure
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+# ============================================================
+# In-memory Firestore stand-in
+# ============================================================
+#
+# A process-local implementation of the subset of the google-cloud-
+# firestore client API this project uses, selected with
+# FIRESTORE_BACKEND=memory (see api/__init__.py). It exists so the views
+# can be exercised and benchmarked without a Firebase project:
+#
+#   * documents / collections / subcollections, auto ids
+#   * get / set (merge) / create / update / delete, write batches,
+#     bulk writers, get_all, transactions usable with @firestore.transactional
+#     (optimistic: a commit aborts if a document it read has changed)
+#   * queries: where (==, !=, <, <=, >, >=, in, not-in, array_contains,
+#     array_contains_any), order_by, limit, start_after, select, count()
+#   * field transforms: SERVER_TIMESTAMP, DELETE_FIELD, Increment,
+#     ArrayUnion, ArrayRemove
+#   * query listeners (on_snapshot): a background thread per listener
+#     re-runs the query after writes to its collection and reports the
+#     differences, like Watch does
+#
+# Every call that would be a round trip to Firestore is counted in
+# `rpc_counts`, which is what the benchmark reports per request.
+# Ordering follows Firestore's cross-type value order; a document that
+# lacks an order_by field is left out of the results, as in Firestore.
+#
+# Queries walk a per-(collection, order_by) sorted index and apply their
+# filters on the way, stopping at the limit, so a page costs roughly what
+# it returns. An index is rebuilt only after a write adds / removes a
+# document or changes one of its order fields; a counter update does not
+# make the next feed read re-sort the whole collection.
+
+MAX_BATCH_WRITES = 500
+INDEX_CACHE_SIZE = 128
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+def _auto_id():
+    return "".join(random.choices(_AUTO_ID_CHARS, k=20))
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# ---------------- values ----------------
+
+def _type_rank(value):
+    # Firestore's order across types
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime.datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 6
+
+
+def _sort_value(value):
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    if rank == 8:
+        value = [_sort_value(v) for v in value]
+    elif rank == 9:
+        value = sorted((k, _sort_value(v)) for k, v in value.items())
+    elif rank == 6:
+        value = repr(value)
+    return (rank, value)
+
+
+def _get_path(data, field_path):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(field_path)
+        value = value[part]
+    return value
+
+
+def _set_path(data, field_path, value):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    data[parts[-1]] = value
+
+
+def _delete_path(data, field_path):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _resolve(value, existing, now):
+    """Apply a field transform / sentinel against the current value."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        base = existing if isinstance(existing, (int, float)) and not isinstance(existing, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if not isinstance(existing, (int, float)) else max(existing, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if not isinstance(existing, (int, float)) else min(existing, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(existing) if isinstance(existing, list) else []
+        result.extend(v for v in value.values if v not in result)
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        result = list(existing) if isinstance(existing, list) else []
+        return [v for v in result if v not in value.values]
+    if isinstance(value, dict):
+        existing = existing if isinstance(existing, dict) else {}
+        return {k: _resolve(v, existing.get(k), now) for k, v in value.items()
+                if v is not transforms.DELETE_FIELD}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(v, None, now) for v in value]
+    return copy.deepcopy(value)
+
+
+def _merge(target, data, now):
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            target[key] = _resolve(value, target.get(key), now)
+
+
+def _project(data, field_paths):
+    if field_paths is None:
+        return copy.deepcopy(data)
+
+    projected = {}
+    for path in field_paths:
+        if path == "__name__":
+            continue
+        try:
+            _set_path(projected, path, copy.deepcopy(_get_path(data, path)))
+        except KeyError:
+            pass
+    return projected
+
+
+# ---------------- filters ----------------
+
+def _matches(data, field, op, value):
+    try:
+        actual = _get_path(data, field)
+    except KeyError:
+        return False
+
+    if op == "==":
+        return _sort_value(actual) == _sort_value(value)
+    if op == "!=":
+        return actual is not None and _sort_value(actual) != _sort_value(value)
+    if op in ("<", "<=", ">", ">="):
+        if _type_rank(actual) != _type_rank(value):
+            return False
+        a, b = _sort_value(actual), _sort_value(value)
+        return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+    if op == "in":
+        return any(_sort_value(actual) == _sort_value(v) for v in value)
+    if op == "not-in":
+        return actual is not None and all(_sort_value(actual) != _sort_value(v) for v in value)
+    if op == "array_contains":
+        return isinstance(actual, list) and value in actual
+    if op == "array_contains_any":
+        return isinstance(actual, list) and any(v in actual for v in value)
+    raise InvalidArgument(f"Unsupported operator: {op}")
+
+
+# ============================================================
+# Store
+# ============================================================
+
+class _Store:
+    """Documents by collection path, per-document versions and update times, RPC counters."""
+
+    def __init__(self):
+        self.collections = {}  # "a/b/c" -> {doc_id: data}
+        self.versions = {}  # document path -> write counter
+        self.update_times = {}  # document path -> datetime of the last write
+        self.lock = threading.RLock()
+        self.rpc_counts = Counter()
+        self._indexes = OrderedDict()  # (collection, orders) -> _Index
+        self.watches = set()
+
+    def count(self, kind):
+        with self.lock:
+            self.rpc_counts[kind] += 1
+
+    def read(self, path):
+        collection, _, doc_id = path.rpartition("/")
+        return self.collections.get(collection, {}).get(doc_id)
+
+    def write(self, path, data, update_time=None):
+        collection, _, doc_id = path.rpartition("/")
+        docs = self.collections.setdefault(collection, {})
+        old = docs.get(doc_id)
+        if data is None:
+            docs.pop(doc_id, None)
+            self.update_times.pop(path, None)
+        else:
+            docs[doc_id] = data
+            self.update_times[path] = update_time or _now()
+        self.versions[path] = self.versions.get(path, 0) + 1
+        for watch in self.watches:
+            watch.poke(collection)
+
+        if old is None or data is None:
+            changed = None  # membership changed
+        else:
+            changed = {k for k in old.keys() | data.keys() if old.get(k, _MISSING) != data.get(k, _MISSING)}
+        self._invalidate(collection, changed)
+
+    def _invalidate(self, collection, changed):
+        stale = [
+            key for key, index in self._indexes.items()
+            if key[0] == collection and (changed is None or index.fields & changed)
+        ]
+        for key in stale:
+            del self._indexes[key]
+
+    def apply(self, writes):
+        """
+        Validate then apply [(op, path, data, merge)] atomically.
+        Raises AlreadyExists / NotFound without applying anything.
+        """
+        now = _now()
+        with self.lock:
+            staged = {}
+
+            def current(path):
+                return staged[path] if path in staged else self.read(path)
+
+            for op, path, data, merge in writes:
+                existing = current(path)
+                if op == "create":
+                    if existing is not None:
+                        raise AlreadyExists(f"Document already exists: {path}")
+                    staged[path] = _resolve(data, None, now)
+                elif op == "set":
+                    if merge and existing is not None:
+                        merged = copy.deepcopy(existing)
+                        _merge(merged, data, now)
+                        staged[path] = merged
+                    else:
+                        staged[path] = _resolve(data, None, now)
+                elif op == "update":
+                    if existing is None:
+                        raise NotFound(f"No document to update: {path}")
+                    updated = copy.deepcopy(existing)
+                    for field, value in data.items():
+                        if value is transforms.DELETE_FIELD:
+                            _delete_path(updated, field)
+                            continue
+                        try:
+                            old = _get_path(updated, field)
+                        except KeyError:
+                            old = None
+                        _set_path(updated, field, _resolve(value, old, now))
+                    staged[path] = updated
+                elif op == "delete":
+                    staged[path] = None
+
+            for path, data in staged.items():
+                self.write(path, data, now)
+
+        return now
+
+    # ---------------- queries ----------------
+
+    def run_query(self, query):
+        with self.lock:
+            docs = self.collections.get(query._path, {})
+            index = self._index(query._path, query._orders, docs)
+
+            start = 0
+            if query._start_after is not None:
+                start = self._position_after(docs, index, query)
+
+            # Walk the index in result order, filtering as we go, and stop
+            # as soon as the limit is reached
+            rows = []
+            for doc_id in islice(index.ids, start, None):
+                data = docs[doc_id]
+                if all(_matches(data, field, op, value) for field, op, value in query._filters):
+                    rows.append((doc_id, data))
+                    if query._limit is not None and len(rows) >= query._limit:
+                        break
+            return rows
+
+    def _index(self, path, orders, docs):
+        key = (path, orders)
+        index = self._indexes.get(key)
+        if index is not None:
+            self._indexes.move_to_end(key)
+            return index
+
+        index = _Index(_sorted_ids(docs, orders), orders)
+        self._indexes[key] = index
+        while len(self._indexes) > INDEX_CACHE_SIZE:
+            self._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _position_after(docs, index, query):
+        cursor_id, cursor_data = query._start_after
+        key = _cursor_key(cursor_data, cursor_id, query._orders)
+
+        # Common case: the cursor document is in the index, unchanged
+        position = index.position(cursor_id)
+        if position is not None and _cursor_key(docs[cursor_id], cursor_id, query._orders) == key:
+            return position + 1
+
+        for position, doc_id in enumerate(index.ids):
+            if _compare(_cursor_key(docs[doc_id], doc_id, query._orders), key, query._orders) > 0:
+                return position
+        return len(index.ids)
+
+
+_MISSING = object()
+
+
+def _sorted_ids(docs, orders):
+    """Ids of the documents having every order field, in result order."""
+    ids = [d for d in docs if all(_has_path(docs[d], field) for field, _ in orders)]
+
+    # Stable sorts, least significant key first; the document name is the
+    # implicit last key and follows the last order's direction
+    ids.sort(reverse=bool(orders) and orders[-1][1] == DESCENDING)
+    for field, direction in reversed(orders):
+        ids.sort(
+            key=lambda d: _sort_value(_get_path(docs[d], field)),
+            reverse=direction == DESCENDING,
+        )
+    return ids
+
+
+class _Index:
+    """One collection's ids sorted by an order_by list, like a Firestore index."""
+
+    def __init__(self, ids, orders):
+        self.ids = ids
+        self.fields = {field.split(".")[0] for field, _ in orders}
+        self._positions = None
+
+    def position(self, doc_id):
+        if self._positions is None:
+            self._positions = {d: i for i, d in enumerate(self.ids)}
+        return self._positions.get(doc_id)
+
+
+def _has_path(data, field):
+    try:
+        _get_path(data, field)
+        return True
+    except KeyError:
+        return False
+
+
+def _cursor_key(data, doc_id, orders):
+    values = []
+    for field, _ in orders:
+        try:
+            values.append(_sort_value(_get_path(data, field)))
+        except KeyError:
+            values.append((-1, None))
+    values.append(doc_id)
+    return values
+
+
+def _compare(a, b, orders):
+    """Compare two cursor keys in result order (-1 / 0 / 1)."""
+    directions = [d for _, d in orders]
+    directions.append(directions[-1] if directions else ASCENDING)
+    for x, y, direction in zip(a, b, directions):
+        if x == y:
+            continue
+        result = -1 if x < y else 1
+        return -result if direction == DESCENDING else result
+    return 0
+
+
+# ============================================================
+# Snapshots / references
+# ============================================================
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, read_time=None, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time
+        self.update_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        return copy.deepcopy(_get_path(self._data, field_path))
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<DocumentReference {self.path}>"
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rpartition("/")[0])
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def _snapshot(self, field_paths=None):
+        store = self._client._store
+        with store.lock:
+            data = store.read(self.path)
+            version = store.versions.get(self.path, 0)
+            update_time = store.update_times.get(self.path)
+        if data is not None:
+            data = _project(data, field_paths)
+        return DocumentSnapshot(self, data, _now(), update_time), version
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        self._client._store.count("get")
+        snapshot, version = self._snapshot(field_paths)
+        if transaction is not None:
+            transaction._record_read(self.path, version)
+        return snapshot
+
+    def _write(self, op, data=None, merge=False):
+        self._client._store.count("commit")
+        update_time = self._client._store.apply([(op, self.path, data, merge)])
+        return WriteResult(update_time)
+
+    def set(self, document_data, merge=False):
+        return self._write("set", document_data, merge)
+
+    def create(self, document_data):
+        return self._write("create", document_data)
+
+    def update(self, field_updates, option=None):
+        return self._write("update", field_updates)
+
+    def delete(self, option=None):
+        return self._write("delete")
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+# ============================================================
+# Queries
+# ============================================================
+
+class Query:
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    def __init__(self, client, path, filters=(), orders=(), limit=None,
+                 start_after=None, projection=None):
+        self._client = client
+        self._path = path
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._start_after = start_after
+        self._projection = projection
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "start_after": self._start_after,
+            "projection": self._projection,
+        }
+        state.update(changes)
+        return Query(self._client, self._path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, _freeze_filter(value)),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        cursor = document_fields_or_snapshot
+        if isinstance(cursor, DocumentSnapshot):
+            # Cursors take the snapshot's full document, as the real client does
+            data = self._client._store.read(cursor.reference.path) or cursor._data or {}
+            return self._copy(start_after=(cursor.id, data))
+        return self._copy(start_after=("", dict(cursor)))
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def _results(self):
+        store = self._client._store
+        rows = store.run_query(self)
+        read_time = _now()
+        projection = self._projection
+        return [
+            DocumentSnapshot(
+                DocumentReference(self._client, f"{self._path}/{doc_id}"),
+                _project(data, projection),
+                read_time,
+                store.update_times.get(f"{self._path}/{doc_id}"),
+            )
+            for doc_id, data in rows
+        ]
+
+    def stream(self, transaction=None, **kwargs):
+        self._client._store.count("query")
+        yield from self._results()
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream(transaction=transaction))
+
+    def count(self, alias=None):
+        return CountQuery(self, alias or "count")
+
+    def on_snapshot(self, callback):
+        return Watch(self, callback)
+
+
+def _freeze_filter(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        parent = self._path.rpartition("/")[0]
+        return DocumentReference(self._client, parent) if parent else None
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f"{self._path}/{document_id or _auto_id()}")
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self, page_size=None):
+        self._client._store.count("query")
+        with self._client._store.lock:
+            ids = list(self._client._store.collections.get(self._path, {}))
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class AggregationResult:
+    def __init__(self, alias, value, read_time=None):
+        self.alias = alias
+        self.value = value
+        self.read_time = read_time
+
+
+class CountQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None, **kwargs):
+        self._query._client._store.count("aggregate")
+        count = len(self._query._client._store.run_query(self._query))
+        return [[AggregationResult(self._alias, count, _now())]]
+
+
+# ============================================================
+# Listeners
+# ============================================================
+
+class Watch:
+    """
+    on_snapshot() handle. Calls back with (docs, changes, read_time) once
+    with the initial results, then after writes to the query's collection
+    whenever the results differ; bursts of writes coalesce into one call.
+    """
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._dirty = threading.Event()
+        self._closed = False
+        self._previous = {}  # doc id -> (index, data)
+
+        store = query._client._store
+        with store.lock:
+            store.watches.add(self)
+        self._dirty.set()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def poke(self, collection):
+        if collection == self._query._path:
+            self._dirty.set()
+
+    def _run(self):
+        first = True
+        while True:
+            self._dirty.wait()
+            if self._closed:
+                return
+            self._dirty.clear()
+
+            docs = self._query._results()
+            changes = self._diff(docs)
+            if changes or first:
+                first = False
+                try:
+                    self._callback(docs, changes, _now())
+                except Exception as e:
+                    print("[Watch ERROR]", e)
+
+    def _diff(self, docs):
+        current = {doc.id: (i, doc) for i, doc in enumerate(docs)}
+        changes = []
+        for doc_id, (old_index, old_doc) in self._previous.items():
+            if doc_id not in current:
+                changes.append(DocumentChange(ChangeType.REMOVED, old_doc, old_index, -1))
+        for doc_id, (new_index, doc) in current.items():
+            previous = self._previous.get(doc_id)
+            if previous is None:
+                changes.append(DocumentChange(ChangeType.ADDED, doc, -1, new_index))
+            elif previous[1]._data != doc._data:
+                changes.append(DocumentChange(ChangeType.MODIFIED, doc, previous[0], new_index))
+        self._previous = current
+        return changes
+
+    def unsubscribe(self):
+        store = self._query._client._store
+        with store.lock:
+            store.watches.discard(self)
+        self._closed = True
+        self._dirty.set()
+
+
+# ============================================================
+# Writes
+# ============================================================
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _add(self, op, reference, data=None, merge=False):
+        self._writes.append((op, reference.path, data, merge))
+        return self
+
+    def set(self, reference, document_data, merge=False):
+        return self._add("set", reference, document_data, merge)
+
+    def create(self, reference, document_data):
+        return self._add("create", reference, document_data)
+
+    def update(self, reference, field_updates, option=None):
+        return self._add("update", reference, field_updates)
+
+    def delete(self, reference, option=None):
+        return self._add("delete", reference)
+
+    def commit(self, **kwargs):
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise InvalidArgument(f"A write batch can contain at most {MAX_BATCH_WRITES} writes")
+
+        self._client._store.count("commit")
+        update_time = self._client._store.apply(self._writes)
+        results = [WriteResult(update_time) for _ in self._writes]
+        self._writes = []
+        return results
+
+
+class Transaction(WriteBatch):
+    """
+    Optimistic transaction with the private surface that
+    firestore.transactional drives (_begin / _commit / _rollback ...).
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}  # document path -> version seen
+        self._ids = itertools.count(1)
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        if self.in_progress:
+            raise ValueError("Transaction already in progress")
+        self._client._store.count("begin")
+        self._id = f"txn-{next(self._ids)}".encode()
+
+    def _rollback(self):
+        if not self.in_progress:
+            return
+        self._client._store.count("rollback")
+        self._clean_up()
+
+    def _commit(self):
+        if not self.in_progress:
+            raise ValueError("Transaction not in progress")
+
+        store = self._client._store
+        store.count("commit")
+        with store.lock:
+            for path, version in self._reads.items():
+                if store.versions.get(path, 0) != version:
+                    self._clean_up()
+                    raise Aborted(f"Document changed during transaction: {path}")
+            if self._read_only and self._writes:
+                raise InvalidArgument("Cannot write in a read-only transaction")
+            store.apply(self._writes)
+
+        results = [WriteResult(_now()) for _ in self._writes]
+        self._clean_up()
+        return results
+
+    def _record_read(self, path, version):
+        self._reads.setdefault(path, version)
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, DocumentReference):
+            return ref_or_query.get(transaction=self)
+
+        results = list(ref_or_query.stream())
+        store = self._client._store
+        with store.lock:
+            for snapshot in results:
+                self._record_read(snapshot.reference.path, store.versions.get(snapshot.reference.path, 0))
+        return iter(results)
+
+    def get_all(self, references, **kwargs):
+        return self._client.get_all(references, transaction=self)
+
+
+class _BulkOperation:
+    def __init__(self, op, reference, data, merge):
+        self.op = op
+        self.reference = reference
+        self.data = data
+        self.merge = merge
+        self.attempts = 0
+
+
+class BulkWriter:
+    """
+    BulkWriter with the real one's callbacks, sent synchronously: writes
+    go out BATCH_SIZE at a time and, unlike a WriteBatch, each succeeds or
+    fails on its own (on_write_error decides whether a failure is retried).
+    """
+
+    BATCH_SIZE = 20
+
+    def __init__(self, client, options=None):
+        self._client = client
+        self._operations = []
+        self._is_open = True
+        self._on_result = lambda reference, result, bulk_writer: None
+        self._on_error = lambda failure, bulk_writer: failure.attempts < 15
+
+    def on_write_result(self, callback):
+        self._on_result = callback or (lambda reference, result, bulk_writer: None)
+
+    def on_write_error(self, callback):
+        self._on_error = callback or (lambda failure, bulk_writer: failure.attempts < 15)
+
+    def _add(self, op, reference, data=None, merge=False):
+        if not self._is_open:
+            raise Exception("BulkWriter is closed and cannot accept new operations")
+        self._operations.append(_BulkOperation(op, reference, data, merge))
+        if len(self._operations) >= self.BATCH_SIZE:
+            self._send()
+
+    def set(self, reference, document_data, merge=False):
+        self._add("set", reference, document_data, merge)
+
+    def create(self, reference, document_data):
+        self._add("create", reference, document_data)
+
+    def update(self, reference, field_updates, option=None):
+        self._add("update", reference, field_updates)
+
+    def delete(self, reference, option=None):
+        self._add("delete", reference)
+
+    def _send(self):
+        operations, self._operations = self._operations, []
+        store = self._client._store
+        store.count("batch_write")
+
+        for operation in operations:
+            while True:
+                operation.attempts += 1
+                try:
+                    update_time = store.apply(
+                        [(operation.op, operation.reference.path, operation.data, operation.merge)]
+                    )
+                except GoogleAPICallError as e:
+                    failure = BulkWriteFailure(operation, e.grpc_status_code.value[0], e.message)
+                    if self._on_error(failure, self):
+                        continue
+                else:
+                    self._on_result(operation.reference, WriteResult(update_time), self)
+                break
+
+    def flush(self):
+        while self._operations:
+            self._send()
+
+    def close(self):
+        self._is_open = False
+        self.flush()
+
+
+# ============================================================
+# Client
+# ============================================================
+
+class FakeClient:
+    """Drop-in for firestore.Client over an in-memory store."""
+
+    project = "in-memory"
+
+    def __init__(self):
+        self._store = _Store()
+
+    def collection(self, *collection_path):
+        return CollectionReference(self, "/".join(collection_path))
+
+    def document(self, *document_path):
+        return DocumentReference(self, "/".join(document_path))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def bulk_writer(self, options=None):
+        return BulkWriter(self, options)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        self._store.count("get_all")
+        for ref in references:
+            snapshot, version = ref._snapshot(field_paths)
+            if transaction is not None:
+                transaction._record_read(ref.path, version)
+            yield snapshot
+
+    # ---------------- harness helpers ----------------
+
+    @property
+    def rpc_counts(self):
+        with self._store.lock:
+            return dict(self._store.rpc_counts)
+
+    def reset_rpc_counts(self):
+        with self._store.lock:
+            self._store.rpc_counts.clear()
+
+    def load(self, path, data):
+        """Write a document directly, bypassing RPC accounting (data generators)."""
+        with self._store.lock:
+            self._store.write(path, data)
+
+    def clear(self):
+        with self._store.lock:
+            self._store.collections.clear()
+            self._store.versions.clear()
+            self._store.update_times.clear()
+            self._store._indexes.clear()
+            self._store.rpc_counts.clear()
+
+
+# ============================================================
+# Async facade (for api.async_views)
+# ============================================================
+
+class AsyncDocumentReference:
+    def __init__(self, ref):
+        self._ref = ref
+
+    @property
+    def id(self):
+        return self._ref.id
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    @property
+    def parent(self):
+        return AsyncQuery(self._ref.parent)
+
+    def collection(self, collection_id):
+        return AsyncQuery(self._ref.collection(collection_id))
+
+    async def get(self, field_paths=None, transaction=None, **kwargs):
+        return self._ref.get(field_paths=field_paths)
+
+
+class AsyncQuery:
+    def __init__(self, query):
+        self._query = query
+
+    @property
+    def id(self):
+        return self._query.id
+
+    def document(self, document_id=None):
+        return AsyncDocumentReference(self._query.document(document_id))
+
+    def where(self, *args, **kwargs):
+        return AsyncQuery(self._query.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return AsyncQuery(self._query.order_by(*args, **kwargs))
+
+    def limit(self, count):
+        return AsyncQuery(self._query.limit(count))
+
+    def start_after(self, cursor):
+        return AsyncQuery(self._query.start_after(cursor))
+
+    def select(self, field_paths):
+        return AsyncQuery(self._query.select(field_paths))
+
+    async def stream(self, transaction=None, **kwargs):
+        for snapshot in self._query.stream():
+            yield snapshot
+
+    async def get(self, transaction=None, **kwargs):
+        return self._query.get()
+
+
+class FakeAsyncClient:
+    """Drop-in for firestore.AsyncClient sharing a FakeClient's store."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def collection(self, *collection_path):
+        return AsyncQuery(self._client.collection(*collection_path))
+
+    def document(self, *document_path):
+        return AsyncDocumentReference(self._client.document(*document_path))
+
+    async def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        refs = [r._ref if isinstance(r, AsyncDocumentReference) else r for r in references]
+        for snapshot in self._client.get_all(refs, field_paths=field_paths):
+            yield snapshot
@@ -0,0 +1,203 @@
+import math
+
+# ============================================================
+# Geohash
+# ============================================================
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def geohash_encode(lat, lng, precision=9):
+    """Standard base32 geohash of a WGS84 point."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits encode longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_lo = mid
+            else:
+                bits <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """Return (lat_lo, lat_hi, lng_lo, lng_hi) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+
+    for c in geohash:
+        value = _BASE32_INDEX[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+
+    return lat_lo, lat_hi, lng_lo, lng_hi
+
+
+def geohash_decode(geohash):
+    """Centre point (lat, lng) of a geohash cell."""
+    lat_lo, lat_hi, lng_lo, lng_hi = geohash_bounds(geohash)
+    return (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+
+
+def geohash_neighbors(geohash):
+    """The 8 cells surrounding `geohash` (same precision)."""
+    lat_lo, lat_hi, lng_lo, lng_hi = geohash_bounds(geohash)
+    lat_c, lng_c = (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+    d_lat, d_lng = lat_hi - lat_lo, lng_hi - lng_lo
+
+    neighbors = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue
+            lat = lat_c + dy * d_lat
+            if not -90 <= lat <= 90:
+                continue
+            lng = (lng_c + dx * d_lng + 180) % 360 - 180
+            neighbors.append(geohash_encode(lat, lng, len(geohash)))
+    return neighbors
+
+
+# Precision stored on activity documents (~5 m cells)
+ACTIVITY_GEOHASH_PRECISION = 9
+
+# Firestore's array_contains_any limit; a covering never needs more cells
+MAX_COVER_CELLS = 30
+
+
+def _cell_degrees(precision):
+    """(height, width) in degrees of the cells at `precision`."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _cells_in_box(lat_lo, lat_hi, lng_lo, lng_hi, precision, max_cells):
+    """Cells at `precision` tiling the box, or None when more than max_cells are needed."""
+    height, width = _cell_degrees(precision)
+    rows = range(math.floor((lat_lo + 90) / height), math.floor((min(lat_hi, 89.999999) + 90) / height) + 1)
+    cols = range(math.floor((lng_lo + 180) / width), math.floor((lng_hi + 180) / width) + 1)
+    if len(rows) * len(cols) > max_cells:
+        return None
+
+    cells = []
+    for row in rows:
+        cell_lat = -90 + (row + 0.5) * height
+        for col in cols:
+            cell_lng = (-180 + (col + 0.5) * width + 180) % 360 - 180
+            cells.append(geohash_encode(cell_lat, cell_lng, precision))
+    return list(dict.fromkeys(cells))
+
+
+def _distance_to_cell_km(lat, lng, cell):
+    """Distance from (lat, lng) to the nearest point of `cell` (0 inside it)."""
+    lat_lo, lat_hi, lng_lo, lng_hi = geohash_bounds(cell)
+    near_lat = min(max(lat, lat_lo), lat_hi)
+    near_lng = min(max(lng, lng_lo), lng_hi)
+    return haversine_km(lat, lng, near_lat, near_lng)
+
+
+def covering_geohashes(lat, lng, radius_km, max_cells=MAX_COVER_CELLS):
+    """
+    Cells that together cover the circle around (lat, lng): the finest
+    precision whose tiling of the circle's bounding box fits in
+    `max_cells`, minus the cells that lie wholly outside the circle.
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    d_lng = min(180.0, d_lat / max(math.cos(math.radians(lat)), 0.01))  # cells narrow towards the poles
+    box = (max(-90.0, lat - d_lat), min(90.0, lat + d_lat), lng - d_lng, lng + d_lng)
+
+    for precision in range(ACTIVITY_GEOHASH_PRECISION, 0, -1):
+        cells = _cells_in_box(*box, precision, max_cells)
+        if cells is not None:
+            # Small slack: the rectangle's nearest point is not exact on the sphere
+            return [c for c in cells if _distance_to_cell_km(lat, lng, c) <= radius_km * 1.001 + 0.001]
+    return list(_BASE32)
+
+
+def activity_geo_fields(lat, lng):
+    """
+    Geohash fields stored on activity documents. `geohash_prefixes` holds
+    every prefix so a proximity query is a single array_contains_any.
+    """
+    lat, lng = parse_lat_lng(lat, lng)
+    if lat is None:
+        return {}
+
+    geohash = geohash_encode(lat, lng, ACTIVITY_GEOHASH_PRECISION)
+    return {
+        "geohash": geohash,
+        "geohash_prefixes": [geohash[:i] for i in range(1, len(geohash) + 1)],
+    }
+
+
+def parse_lat_lng(lat, lng):
+    """
+    Coerce query-string coordinates to floats.
+    Returns (lat, lng) or (None, None) when missing / out of range.
+    """
+    try:
+        lat = float(lat)
+        lng = float(lng)
+    except (TypeError, ValueError):
+        return None, None
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, None
+    return lat, lng
+
+
+# ============================================================
+# Distance
+# ============================================================
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
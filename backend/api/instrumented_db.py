@@ -0,0 +1,163 @@
+import inspect
+import time
+
+from api.metrics import record_documents, record_rpc
+
+# ============================================================
+# Instrumented Firestore client
+# ============================================================
+#
+# A thin proxy around the client exported as api.db (and the async one
+# from api.get_async_db). Every Firestore object reached through it —
+# collections, documents, queries, batches, transactions — is wrapped as
+# well, and the methods that are a round trip to Firestore are timed and
+# recorded in api.metrics. Arguments are unwrapped before being passed
+# on, so the client library only ever sees its own objects.
+
+# Object kind -> {method: RPC kind}. Batch / transaction set/update/...
+# only queue writes; their commit is the round trip.
+RPC_METHODS = {
+    "Client": {"get_all": "read"},
+    "DocumentReference": {
+        "get": "read", "set": "write", "create": "write", "update": "write", "delete": "write",
+    },
+    "CollectionReference": {
+        "get": "query", "stream": "query", "add": "write", "list_documents": "query",
+    },
+    "Query": {"get": "query", "stream": "query"},
+    "CollectionGroup": {"get": "query", "stream": "query"},
+    "AggregationQuery": {"get": "query", "stream": "query"},
+    "CountQuery": {"get": "query"},
+    "WriteBatch": {"commit": "write"},
+    # Sends in the background; flush() / close() wait for the queued writes
+    "BulkWriter": {"flush": "write", "close": "write"},
+    "Transaction": {
+        "get": "read", "get_all": "read",
+        "_begin": "transaction", "_commit": "write", "_rollback": "transaction",
+    },
+}
+
+# Kinds of object worth wrapping: everything that can reach an RPC
+_WRAPPED = set(RPC_METHODS)
+
+
+def _kind(obj):
+    name = type(obj).__name__
+    for prefix in ("Fake", "Async"):
+        name = name.removeprefix(prefix)
+    return name
+
+
+def _unwrap(value):
+    if isinstance(value, Instrumented):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+
+def instrument(obj):
+    return Instrumented(obj) if _kind(obj) in _WRAPPED else obj
+
+
+def _count_documents(kind, result):
+    if kind not in ("read", "query"):
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1 if getattr(result, "exists", False) else 0
+
+
+class Instrumented:
+    __slots__ = ("_target", "_rpcs")
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_rpcs", RPC_METHODS[_kind(target)])
+
+    def __repr__(self):
+        return f"Instrumented({self._target!r})"
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return instrument(value)
+
+        rpc_kind = self._rpcs.get(name)
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            if rpc_kind is None:
+                return instrument(value(*args, **kwargs))
+
+            started = time.perf_counter()
+            result = value(*args, **kwargs)
+            # stream() / get_all() hand back (async) iterators, not lists
+            if hasattr(result, "__anext__"):
+                return _timed_astream(result, rpc_kind)
+            if hasattr(result, "__next__"):
+                return _timed_stream(result, rpc_kind)
+            if inspect.isawaitable(result):
+                return _timed_await(result, rpc_kind)
+
+            record_rpc(rpc_kind, time.perf_counter() - started, _count_documents(rpc_kind, result))
+            return instrument(result)
+
+        return call
+
+
+def _timed_stream(stream, kind):
+    # One RPC; its time is what the caller spends waiting on the stream
+    seconds = 0.0
+    documents = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(stream)
+            except StopIteration:
+                seconds += time.perf_counter() - started
+                return
+            seconds += time.perf_counter() - started
+            documents += 1
+            yield item
+    finally:
+        if hasattr(stream, "close"):
+            stream.close()
+        record_rpc(kind, seconds)
+        record_documents(documents)
+
+
+async def _timed_astream(stream, kind):
+    seconds = 0.0
+    documents = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = await stream.__anext__()
+            except StopAsyncIteration:
+                seconds += time.perf_counter() - started
+                return
+            seconds += time.perf_counter() - started
+            documents += 1
+            yield item
+    finally:
+        if hasattr(stream, "aclose"):
+            await stream.aclose()
+        record_rpc(kind, seconds)
+        record_documents(documents)
+
+
+async def _timed_await(awaitable, kind):
+    started = time.perf_counter()
+    result = await awaitable
+    record_rpc(kind, time.perf_counter() - started, _count_documents(kind, result))
+    return instrument(result)
@@ -0,0 +1,308 @@
+import asyncio
+import secrets
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from firebase_admin import firestore
+
+from api import db
+from api.serializers import dumps, feed_item, serialize_last_comment
+
+# ============================================================
+# Live updates (Server-Sent Events)
+# ============================================================
+#
+# Clients used to re-poll the feed / by-tag listings to notice new
+# activities, likes and comments. Instead, /api/live/... keeps an SSE
+# stream open per client, fed by ONE Firestore on_snapshot listener per
+# query shape ("feed", "tag:<tag>") shared by all of that shape's
+# subscribers. Each snapshot is diffed against the previous one and only
+# deltas are sent:
+#
+#   activity_added    {"activity": <feed row>}
+#   activity_removed  {"id"}                         (deleted / left the window)
+#   likes             {"id", "likes_count"}
+#   comment           {"id", "comments_count", "last_comment"}
+#   activity_updated  {"activity": <feed row>}       (any other change)
+#
+# Likes and comments arrive through the activity documents' denormalised
+# summary (likes_count / comments_count / last_comment), so one listener
+# on the activities query covers all three.
+#
+# Event ids are "<listener epoch>-<seq>". A reconnecting EventSource
+# sends the last one as Last-Event-ID; missed events still in the
+# listener's replay buffer are re-sent, otherwise the client gets a
+# `resync` event and should refetch the listing. Listeners linger for
+# LIVE_LISTENER_LINGER seconds after their last subscriber leaves, so
+# reconnects reuse them.
+#
+# Streams are served only under ASGI (core.asgi, e.g. uvicorn/daphne),
+# by the /api/async/live/... views: an open stream is then a coroutine
+# waiting on its queue. Under WSGI every subscriber would hold a worker
+# thread for up to LIVE_MAX_STREAM_SECONDS, so there the live views answer
+# 503 and clients keep polling; /api/live/... redirects to the async views.
+
+ASGI_REQUIRED = "Live updates are only served over ASGI, poll instead"
+
+
+def served_over_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+RESYNC = object()  # queued to a subscriber that fell too far behind
+
+
+def format_event(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {dumps(data).decode()}\n\n"
+
+
+SUMMARY_FIELDS = ("likes_count", "comments_count", "last_comment")
+
+
+def activity_deltas(activity_id, old, new):
+    """SSE (type, data) events for one modified activity document."""
+    events = []
+    if old.get("likes_count") != new.get("likes_count"):
+        events.append(("likes", {"id": activity_id, "likes_count": new.get("likes_count", 0)}))
+
+    if (old.get("comments_count") != new.get("comments_count")
+            or old.get("last_comment") != new.get("last_comment")):
+        events.append(("comment", {
+            "id": activity_id,
+            "comments_count": new.get("comments_count", 0),
+            "last_comment": serialize_last_comment(new.get("last_comment")),
+        }))
+
+    if any(old.get(k) != new.get(k) for k in old.keys() | new.keys() if k not in SUMMARY_FIELDS):
+        events.append(("activity_updated", {"activity": feed_item(activity_id, new, False)}))
+    return events
+
+
+class Subscription:
+    """
+    One client's event queue: an asyncio.Queue on the stream's event loop,
+    filled through call_soon_threadsafe (listener callbacks run on
+    Firestore's thread).
+    """
+
+    def __init__(self, listener, loop):
+        self.listener = listener
+        self.loop = loop
+        self._queue = asyncio.Queue(settings.LIVE_QUEUE_SIZE)
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop what is queued and ask for a resync
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed; the stream's finally detaches us
+
+    async def aget(self, timeout):
+        """Next event, or None after `timeout` seconds (heartbeat time)."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveQuery:
+    """One on_snapshot listener and the subscribers it fans out to."""
+
+    def __init__(self, key, query):
+        self.key = key
+        self.epoch = secrets.token_hex(4)
+        self.subscribers = set()
+        self.idle_since = time.monotonic()  # until the first attach()
+
+        self._lock = threading.Lock()
+        self._known = None  # doc id -> data, set by the first snapshot
+        self._seq = 0
+        self._replay = deque(maxlen=settings.LIVE_REPLAY_EVENTS)  # (seq, event_id, type, data)
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            if self._known is None:
+                # Initial results: clients already have the listing
+                self._known = {doc.id: doc.to_dict() for doc in docs}
+                return
+
+            events = []
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self._known.pop(doc.id, None)
+                    events.append(("activity_removed", {"id": doc.id}))
+                    continue
+
+                data = doc.to_dict()
+                old = self._known.get(doc.id)
+                self._known[doc.id] = data
+                if change.type.name == "ADDED" or old is None:
+                    events.append(("activity_added", {"activity": feed_item(doc.id, data, False)}))
+                else:
+                    events.extend(activity_deltas(doc.id, old, data))
+
+            for event_type, data in events:
+                self._seq += 1
+                event = (self._seq, f"{self.epoch}-{self._seq}", event_type, data)
+                self._replay.append(event)
+                for subscription in self.subscribers:
+                    subscription.push(event)
+
+    def attach(self, subscription, last_event_id):
+        """Add a subscriber; returns the events it missed (or [RESYNC])."""
+        with self._lock:
+            self.subscribers.add(subscription)
+            self.idle_since = None
+            if not last_event_id:
+                return []
+
+            epoch, _, seq = last_event_id.partition("-")
+            if epoch != self.epoch or not seq.isdigit():
+                return [RESYNC]
+            seq = int(seq)
+            if seq >= self._seq:
+                return []
+            if not self._replay or self._replay[0][0] > seq + 1:
+                return [RESYNC]
+            return [event for event in self._replay if event[0] > seq]
+
+    def detach(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+            if not self.subscribers:
+                self.idle_since = time.monotonic()
+
+    def close(self):
+        self._watch.unsubscribe()
+
+
+class LiveRegistry:
+    """Live queries by shape key; idle ones are closed after LIVE_LISTENER_LINGER."""
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, make_query, loop, last_event_id=None):
+        """
+        Subscribe to shape `key`, starting its listener with make_query()
+        if needed. Returns (subscription, missed events), or (None, None)
+        when the LIVE_MAX_LISTENERS / LIVE_MAX_SUBSCRIBERS limits are hit.
+        """
+        self._close_idle()
+        with self._lock:
+            live = self._queries.get(key)
+            if live is None:
+                if len(self._queries) >= settings.LIVE_MAX_LISTENERS:
+                    return None, None
+                live = self._queries[key] = LiveQuery(key, make_query())
+            if sum(len(q.subscribers) for q in self._queries.values()) >= settings.LIVE_MAX_SUBSCRIBERS:
+                return None, None
+
+            subscription = Subscription(live, loop)
+            return subscription, live.attach(subscription, last_event_id)
+
+    def unsubscribe(self, subscription):
+        subscription.listener.detach(subscription)
+        self._close_idle()
+
+    def _close_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                key for key, live in self._queries.items()
+                if live.idle_since is not None and now - live.idle_since >= settings.LIVE_LISTENER_LINGER
+            ]
+            closing = [self._queries.pop(key) for key in idle]
+        for live in closing:
+            live.close()
+
+    def stats(self):
+        with self._lock:
+            return {key: len(live.subscribers) for key, live in self._queries.items()}
+
+
+live_registry = LiveRegistry()
+
+
+# ============================================================
+# Query shapes
+# ============================================================
+#
+# Listeners always run on the sync client (AsyncClient has no
+# on_snapshot).
+
+def live_feed_query():
+    return (
+        db.collection("activities")
+        .order_by("time_start", direction=firestore.Query.DESCENDING)
+        .limit(settings.LIVE_WINDOW)
+    )
+
+
+def live_tag_query(tag):
+    return (
+        db.collection("activities")
+        .where("tags", "array_contains", tag)
+        .order_by("time_start", direction=firestore.Query.DESCENDING)
+        .limit(settings.LIVE_WINDOW)
+    )
+
+
+# ============================================================
+# Streams
+# ============================================================
+
+def _stream_event(event):
+    if event is RESYNC:
+        return format_event("", "resync", {}), True
+    _, event_id, event_type, data = event
+    return format_event(event_id, event_type, data), False
+
+
+async def async_sse_stream(subscription, missed):
+    """
+    SSE body: missed events, then live ones with heartbeats, until
+    LIVE_MAX_STREAM_SECONDS; the client reconnects (Last-Event-ID) when it ends.
+    """
+    deadline = time.monotonic() + settings.LIVE_MAX_STREAM_SECONDS
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        for event in missed:
+            chunk, done = _stream_event(event)
+            yield chunk
+            if done:
+                return
+
+        while time.monotonic() < deadline:
+            event = await subscription.aget(settings.LIVE_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            chunk, done = _stream_event(event)
+            yield chunk
+            if done:
+                return
+    finally:
+        live_registry.unsubscribe(subscription)
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Let nginx & co. pass events through as they are written
+    response["X-Accel-Buffering"] = "no"
+    return response
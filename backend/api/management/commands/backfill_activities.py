@@ -0,0 +1,121 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from firebase_admin import firestore
+
+from api import db
+from api.geo import activity_geo_fields
+from api.tag_query import TAG_STATS, _is_stat_key
+from api.views import last_comment_summary, timeline_entry
+
+STEPS = ("summary", "geohash", "tag_counts", "timelines")
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill denormalised fields on existing activities: "
+        "summary (likes_count, comments_count, last_comment), geohash, "
+        "tag_counts (tag_stats/{tag}), timelines (users/{uid}/timeline)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--steps",
+            default=",".join(STEPS),
+            help=f"Comma-separated subset of: {', '.join(STEPS)}",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Compute the values but do not write them",
+        )
+
+    def handle(self, *args, **options):
+        steps = [s.strip() for s in options["steps"].split(",") if s.strip()]
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise CommandError(f"Unknown steps: {', '.join(sorted(unknown))}")
+
+        dry_run = options["dry_run"]
+        updated = 0
+        tag_counts = Counter()
+
+        for doc in db.collection("activities").stream():
+            act = doc.to_dict()
+            updates = {}
+
+            if "tag_counts" in steps:
+                tag_counts.update(set(filter(_is_stat_key, act.get("tags") or [])))
+            if "timelines" in steps and not dry_run:
+                self._write_timeline(doc.id, act)
+
+            if "summary" in steps:
+                updates.update(self._summary(doc.reference))
+            if "geohash" in steps:
+                loc = act.get("location") or {}
+                updates.update(activity_geo_fields(loc.get("lat"), loc.get("lng")))
+
+            if not updates:
+                continue
+
+            if not dry_run:
+                doc.reference.update(updates)
+
+            updated += 1
+            self.stdout.write(f"Activity {doc.id}: {', '.join(sorted(updates))}")
+
+        verb = "Checked" if dry_run else "Backfilled"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {updated} activities"))
+
+        if "tag_counts" in steps:
+            if not dry_run:
+                self._write_tag_counts(tag_counts)
+            self.stdout.write(self.style.SUCCESS(f"{verb} counts for {len(tag_counts)} tags"))
+
+    def _write_timeline(self, activity_id, act):
+        participants = act.get("participants") or []
+        if not participants:
+            return
+
+        entry = timeline_entry(activity_id, act)
+        batch = db.batch()
+        for participant in participants:
+            batch.set(
+                db.collection("users").document(participant)
+                .collection("timeline").document(activity_id),
+                entry,
+            )
+        batch.commit()
+
+    def _write_tag_counts(self, tag_counts):
+        items = list(tag_counts.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            batch = db.batch()
+            for tag, count in items[i:i + BATCH_SIZE]:
+                batch.set(db.collection(TAG_STATS).document(tag), {"tag": tag, "count": count})
+            batch.commit()
+
+    def _summary(self, activity_ref):
+        comments_ref = activity_ref.collection("comments")
+
+        last_comment = None
+        last_docs = list(
+            comments_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(1)
+            .stream()
+        )
+        if last_docs:
+            last_comment = last_comment_summary(last_docs[0].id, last_docs[0].to_dict())
+
+        return {
+            "likes_count": self._count(activity_ref.collection("likes")),
+            "comments_count": self._count(comments_ref),
+            "last_comment": last_comment,
+        }
+
+    @staticmethod
+    def _count(collection_ref):
+        # Server-side aggregation: one RPC, no documents transferred
+        result = collection_ref.count().get()
+        return int(result[0][0].value)
@@ -0,0 +1,336 @@
+import json
+import random
+import re
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import URLPattern, get_resolver
+
+import api
+from api import async_views, personalize, views
+from api.auth import token_cache
+from api.datagen import CITIES, TAGS, generate, user_id
+from api.display_names import display_name_cache
+from api.metrics import metrics_view
+from api.partners import partner_index
+from api.ranking import candidate_pool_cache
+from api.management.commands.weather_stub import make_server
+from api.response_cache import response_cache
+from api.weather import weather_cache
+
+# ============================================================
+# Endpoint benchmark
+# ============================================================
+#
+# FIRESTORE_BACKEND=memory python manage.py bench_endpoints
+#
+# Loads a synthetic dataset (api.datagen) into the in-memory Firestore
+# stand-in, starts the weather stub on a free port, then drives every
+# URL in core/urls.py through Django's test client and reports latency
+# percentiles, throughput and Firestore RPCs per request. Requests run
+# one at a time so each RPC count belongs to exactly one request.
+#
+# Auth tokens and display names are pre-seeded into their in-process
+# caches (steady state), since Firebase Auth is not part of the stand-in.
+
+
+def _scatter(rng, spread_km=10):
+    lat, lng = rng.choice(list(CITIES.values()))
+    return (
+        round(lat + rng.uniform(-spread_km, spread_km) / 111.32, 5),
+        round(lng + rng.uniform(-spread_km, spread_km) / 70.0, 5),
+    )
+
+
+class Bench:
+    """Dataset handles shared by the request scenarios."""
+
+    def __init__(self, rng, users, activity_ids):
+        self.rng = rng
+        self.users = users
+        self.activity_ids = activity_ids
+        self.tag_weights = [1 / (i + 1) for i in range(len(TAGS))]
+        self.sequence = 0
+
+    def uid(self):
+        return user_id(int(self.rng.paretovariate(1.2)) % self.users)
+
+    def auth(self, uid=None):
+        return {"HTTP_AUTHORIZATION": f"Bearer bench-{uid or self.uid()}"}
+
+    def activity(self):
+        return self.rng.choice(self.activity_ids)
+
+    def tags(self, k):
+        picks = set()
+        while len(picks) < k:
+            picks.add(self.rng.choices(TAGS, self.tag_weights)[0])
+        return sorted(picks)
+
+    def next_key(self):
+        self.sequence += 1
+        return f"bench-{self.sequence}"
+
+    def activity_payload(self):
+        lat, lng = _scatter(self.rng)
+        return {
+            "tags": self.tags(self.rng.randint(1, 3)),
+            "description": "Benchmark activity",
+            "lat": lat,
+            "lng": lng,
+            "client_id": self.next_key(),
+        }
+
+
+# Scenario: bench -> (method, url kwargs, query params, json body, headers)
+
+def _get(params=None, **kwargs):
+    return "get", kwargs, params or {}, None, {}
+
+
+def _scenario_delete_comment(bench):
+    uid = bench.uid()
+    activity_id = bench.activity()
+    comment_id = bench.next_key()
+    # Setup write, not counted: the comment the request deletes
+    api.db.load(f"activities/{activity_id}/comments/{comment_id}", {
+        "user_id": uid, "user_display_name": "Bench", "text": "to delete", "timestamp": None,
+    })
+    return "delete", {"activity_id": activity_id, "comment_id": comment_id}, {}, None, bench.auth(uid)
+
+
+def _feed_ai(bench):
+    lat, lng = _scatter(bench.rng)
+    return _get({"lat": lat, "lng": lng})
+
+
+def _by_tag(bench):
+    return _get({"tag": bench.tags(1)[0]})
+
+
+def _by_tags_any(bench):
+    return _get({"tags": ",".join(bench.tags(3))})
+
+
+def _by_tags_all(bench):
+    return _get({"tags": ",".join(bench.tags(2))})
+
+
+def _comments(bench):
+    return _get(activity_id=bench.activity())
+
+
+def _partners(bench):
+    city = bench.rng.choice([None, *CITIES])
+    return "get", {}, {"city": city} if city else {}, None, bench.auth()
+
+
+SCENARIOS = {
+    views.sync_offline_activity: lambda b: (
+        "post", {}, {}, b.activity_payload(), b.auth()),
+    views.sync_offline_activities_bulk: lambda b: (
+        "post", {}, {}, {"activities": [b.activity_payload() for _ in range(20)]}, b.auth()),
+    views.get_feed: lambda b: (
+        "get", {}, {"limit": 20}, None, b.auth()),
+    views.get_feed_ai: _feed_ai,
+    views.test_firestore: lambda b: _get(),
+    views.activities_nearby: lambda b: _get(
+        dict(zip(("lat", "lng"), _scatter(b.rng)), radius_km=3)),
+    views.like_activity: lambda b: (
+        "post", {"activity_id": b.activity()}, {}, None, b.auth()),
+    views.unlike_activity: lambda b: (
+        "post", {"activity_id": b.activity()}, {}, None, b.auth()),
+    views.comment_activity: lambda b: (
+        "post", {"activity_id": b.activity()}, {}, {"text": "Benchmark comment"}, b.auth()),
+    views.list_comments: _comments,
+    views.delete_comment: _scenario_delete_comment,
+    views.activities_by_tag: _by_tag,
+    views.activities_by_tags_any: _by_tags_any,
+    views.activities_by_tags_all: _by_tags_all,
+    views.get_activities_by_user: lambda b: _get(uid=b.uid()),
+    views.user_add_tag: lambda b: (
+        "post", {"uid": b.uid(), "tag": b.tags(1)[0]}, {}, None, {}),
+    views.user_add_tags: lambda b: (
+        "post", {"uid": b.uid(), "tags": ",".join(b.tags(2))}, {}, None, {}),
+    views.user_remove_tag: lambda b: (
+        "post", {"uid": b.uid(), "tag": b.tags(1)[0]}, {}, None, {}),
+    views.suggest_partners: _partners,
+    async_views.get_feed: lambda b: _get({"limit": 20}),
+    async_views.get_feed_ai: _feed_ai,
+    async_views.list_comments: _comments,
+    async_views.activities_by_tag: _by_tag,
+    async_views.activities_by_tags_any: _by_tags_any,
+    async_views.activities_by_tags_all: _by_tags_all,
+    metrics_view: lambda b: _get(),
+}
+
+
+# Open-ended SSE streams (ASGI only) and their redirects; latency
+# percentiles do not apply
+STREAMING = {
+    views.live_feed, views.live_activities_by_tag,
+    async_views.live_feed, async_views.live_activities_by_tag,
+}
+
+
+def _routes(resolver=None, prefix=""):
+    """(route, callback) for every non-admin URL, in urls.py order."""
+    resolver = resolver or get_resolver()
+    for entry in resolver.url_patterns:
+        route = prefix + str(entry.pattern)
+        if isinstance(entry, URLPattern):
+            yield route, entry.callback
+        elif not route.startswith("admin/"):
+            yield from _routes(entry, route)
+
+
+def _path(route, kwargs):
+    return "/" + re.sub(r"<(?:\w+:)?(\w+)>", lambda m: str(kwargs[m.group(1)]), route)
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API URL against the in-memory Firestore stand-in "
+        "(run with FIRESTORE_BACKEND=memory): p50/p95/p99 latency, throughput, RPCs per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--activities", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per URL")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per URL")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--weather-latency-ms", type=float, default=50.0)
+        parser.add_argument("--cold", action="store_true",
+                            help="Clear the response, weather and AI candidate caches before every request")
+        parser.add_argument("--only", default="", help="Only routes containing this substring")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+
+    def handle(self, *args, **options):
+        if not api.USE_FAKE_FIRESTORE:
+            raise CommandError("Refusing to benchmark live Firestore; set FIRESTORE_BACKEND=memory")
+
+        rng = random.Random(options["seed"])
+        bench = Bench(rng, options["users"], self._load(options))
+        self._prime_caches(options["users"])
+
+        server = make_server(port=0, latency_ms=options["weather_latency_ms"])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+        client = Client(HTTP_HOST="localhost")
+        results = []
+        try:
+            with override_settings(WEATHER_API_URL=f"http://{host}:{port}/timeline"):
+                for route, callback in _routes():
+                    if options["only"] not in route or callback in STREAMING:
+                        continue
+                    scenario = SCENARIOS.get(callback)
+                    if scenario is None:
+                        self.stdout.write(self.style.WARNING(f"no scenario for /{route}"))
+                        continue
+                    results.append(self._run(client, bench, route, scenario, options))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self._report(results, server.requests)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def _load(self, options):
+        started = time.perf_counter()
+        api.db.clear()
+        activity_ids = []
+        documents = 0
+        for path, data in generate(
+            activities=options["activities"], users=options["users"], seed=options["seed"]
+        ):
+            api.db.load(path, data)
+            documents += 1
+            if path.count("/") == 1 and path.startswith("activities/"):
+                activity_ids.append(path.split("/", 1)[1])
+
+        self.stdout.write(
+            f"Loaded {documents} documents ({len(activity_ids)} activities) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return activity_ids
+
+    def _prime_caches(self, users):
+        expires = time.time() + 24 * 3600
+        for i in range(users):
+            uid = user_id(i)
+            token_cache.put(f"bench-{uid}", {"uid": uid, "exp": expires})
+        display_name_cache.put_many({user_id(i): f"User {i}" for i in range(users)})
+
+    def _clear_caches(self):
+        response_cache.local.clear()
+        if response_cache.shared_alias:
+            caches[response_cache.shared_alias].clear()
+        weather_cache.clear()
+        candidate_pool_cache.clear()
+        partner_index.clear()
+        personalize.clear()
+
+    def _request(self, client, bench, route, scenario):
+        method, kwargs, params, body, headers = scenario(bench)
+        path = _path(route, kwargs)
+        if body is not None:
+            return getattr(client, method)(path, data=json.dumps(body), content_type="application/json", **headers)
+        return getattr(client, method)(path, params, **headers)
+
+    def _run(self, client, bench, route, scenario, options):
+        for _ in range(options["warmup"]):
+            self._request(client, bench, route, scenario)
+
+        latencies = []
+        rpcs = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(options["requests"]):
+            if options["cold"]:
+                self._clear_caches()
+            api.db.reset_rpc_counts()
+
+            t0 = time.perf_counter()
+            response = self._request(client, bench, route, scenario)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+            rpcs.append(sum(api.db.rpc_counts.values()))
+            if response.status_code >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        return {
+            "route": f"/{route}",
+            "requests": len(latencies),
+            "errors": errors,
+            "p50_ms": round(_percentile(latencies, 50), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "p99_ms": round(_percentile(latencies, 99), 2),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "rpc_mean": round(sum(rpcs) / len(rpcs), 2),
+            "rpc_max": max(rpcs),
+        }
+
+    def _report(self, results, weather_requests):
+        header = f"{'route':<58} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'rpc':>6} {'max':>4} {'err':>4}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for r in results:
+            line = (
+                f"{r['route']:<58} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                f"{r['throughput_rps']:>8.1f} {r['rpc_mean']:>6.2f} {r['rpc_max']:>4} {r['errors']:>4}"
+            )
+            self.stdout.write(self.style.ERROR(line) if r["errors"] else line)
+        self.stdout.write(f"Weather upstream requests: {weather_requests}")
@@ -1,155 +1,261 @@
-from django.core.management.base import BaseCommand
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
 from firebase_admin import firestore
-from datetime import datetime
-import calendar
-import random
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+import api
+from api.datagen import CITIES, generate, parse_weights
+from api.tag_query import TAG_STATS
+
+# ============================================================
+# Synthetic data seeding
+# ============================================================
+#
+# FIRESTORE_EMULATOR_HOST=localhost:8080 \
+#     python manage.py seed_data --users 100000 --activities 1000000 --workers 8
+#
+# Writes an api.datagen dataset (users, activities, likes, comments,
+# timelines, tag_stats) through BulkWriter. Each worker process
+# generates and writes its own slice of the dataset with its own
+# BulkWriter; the parent prints the acknowledged write rate as they go.
+# Workers flush every --flush-every documents so generation cannot run
+# arbitrarily far ahead of what Firestore has accepted.
+#
+# tag_stats are summed over the workers and written last with
+# Increment, so seeding on top of existing data keeps the counts right.
+
+MAX_WRITE_ATTEMPTS = 10
+
+_progress = None  # per worker: queue of (documents, activities) deltas
+
+
+def _init_worker(progress):
+    global _progress
+    django.setup()
+    _progress = progress
+
+
+def _write_part(part, parts, spec, ops_per_second, max_ops_per_second, flush_every):
+    """Generate and write slice `part` of the dataset. Returns (tag_counts, failed_writes)."""
+    db = api.db
+    lock = threading.Lock()
+    acked = {"documents": 0, "failed": 0}
+
+    def on_result(reference, result, bulk_writer):
+        with lock:
+            acked["documents"] += 1
+
+    def on_error(failure, bulk_writer):
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        with lock:
+            acked["failed"] += 1
+        print(f"[seed_data ERROR] {failure.operation.reference.path}: {failure.message}")
+        return False
+
+    writer = db.bulk_writer(options=BulkWriterOptions(
+        initial_ops_per_second=ops_per_second,
+        max_ops_per_second=max_ops_per_second,
+    ))
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+
+    tag_counts = Counter()
+    queued = 0
+    reported = 0
+    activities = 0
+
+    def report():
+        nonlocal reported, activities
+        with lock:
+            documents = acked["documents"]
+        _progress.put((documents - reported, activities))
+        reported = documents
+        activities = 0
+
+    for path, data in generate(**spec, part=part, parts=parts):
+        if path.startswith(f"{TAG_STATS}/"):
+            tag_counts[data["tag"]] += data["count"]
+            continue
+
+        writer.set(db.document(path), data)
+        queued += 1
+        if path.startswith("activities/") and path.count("/") == 1:
+            activities += 1
+
+        if queued % flush_every == 0:
+            writer.flush()
+            report()
+
+    writer.close()
+    report()
+    return tag_counts, acked["failed"]
 
-db = firestore.client()
 
 class Command(BaseCommand):
-    help = "Generate sample activities using EXISTING users from Firestore"
-
-    def handle(self, *args, **kwargs):
-
-        # ============================================================
-        # 1️⃣ Read existing users from Firestore
-        # ============================================================
-
-        real_uids = [
-            "93Lmo6O8xsc7jyCrjSOl2Bul3mP2",
-            "Y9oxKb9Vi9YE3C0K2m1gbIywYPj1",
-            "vyF9RLrDMUNGn3GWb3QE6Q3YXJo1",
-        ]
-
-        real_users = []
-
-        for uid in real_uids:
-            doc = db.collection("users").document(uid).get()
-
-            if not doc.exists:
-                self.stdout.write(self.style.ERROR(f"USER NOT FOUND: {uid}"))
-                continue
-
-            data = doc.to_dict()
-
-            # ---- SAFE LOCATION HANDLING ----
-            location_field = data.get("location")
-
-            if isinstance(location_field, dict):
-                city = location_field.get("city", "Warsaw")
-            elif isinstance(location_field, str):
-                city = location_field
-            else:
-                city = "Warsaw"
-
-            real_users.append({
-                "uid": uid,
-                "display_name": data.get("displayName") or "",
-                "city": city,
-            })
-
-        if not real_users:
-            self.stdout.write(self.style.ERROR("No existing users found."))
-            return
-
-        self.stdout.write(self.style.SUCCESS("Loaded existing users!"))
-
-
-        # ============================================================
-        # 2️⃣ NEW Activity templates
-        # ============================================================
-
-        sample_activity_templates = [
-            {"type": "cinema", "description": "Going to the cinema 🎬"},
-            {"type": "dinner", "description": "Dinner at a restaurant 🍽️"},
-            {"type": "shopping", "description": "Shopping time 🛍️"},
-            {"type": "boardgames", "description": "Board game evening 🎲"},
-            {"type": "gym", "description": "Strength workout 💪"},
-            {"type": "run", "description": "Morning run 🏃‍♀️"},
-            {"type": "coffee", "description": "Coffee meetup ☕"},
-            {"type": "museum", "description": "Visiting a museum 🖼️"},
-            {"type": "study", "description": "Group study session 📚"},
-            {"type": "walk", "description": "Walk around the city 🌆"},
-        ]
-
-        example_tags = [
-            "fun", "friends", "food", "culture", "fitness",
-            "outdoor", "indoor", "health", "city", "relax",
-        ]
-
-        # NEW cities + real coordinates
-        city_locations = {
-            "Warsaw": {"lat": 52.2297, "lng": 21.0122},
-            "Kraków": {"lat": 50.0647, "lng": 19.9450},
-            "Gdańsk": {"lat": 54.3520, "lng": 18.6466},
-            "Wrocław": {"lat": 51.1079, "lng": 17.0385},
-            "Poznań": {"lat": 52.4064, "lng": 16.9252},
+    help = (
+        "Seed a synthetic dataset (users, activities, likes, comments, timelines, tag_stats) "
+        "through BulkWriter with parallel workers. Meant for the Firestore emulator "
+        "(FIRESTORE_EMULATOR_HOST) or FIRESTORE_BACKEND=memory; pass --live for a real project."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--activities", type=int, default=10_000)
+        parser.add_argument("--likes-mean", type=float, default=3)
+        parser.add_argument("--comments-mean", type=float, default=2)
+        parser.add_argument("--engagement-skew", type=float, default=1.5,
+                            help="Pareto shape of likes/comments per activity (> 1; lower = more skewed)")
+        parser.add_argument("--tag-skew", type=float, default=1.0,
+                            help="Zipf exponent of tag popularity (0 = uniform)")
+        parser.add_argument("--cities", default="",
+                            help=f"City weights, e.g. 'Warsaw=5,Kraków=2' (of: {', '.join(CITIES)})")
+        parser.add_argument("--spread-km", type=float, default=15.0)
+        parser.add_argument("--days", type=int, default=60, help="time_start reaches this far back")
+        parser.add_argument("--days-ahead", type=int, default=7, help="... and this far ahead")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1))
+        parser.add_argument("--ops-per-second", type=int, default=500,
+                            help="Initial write rate, shared by all workers (BulkWriter ramps up from it)")
+        parser.add_argument("--max-ops-per-second", type=int, default=10_000,
+                            help="Write rate ceiling, shared by all workers")
+        parser.add_argument("--flush-every", type=int, default=5_000,
+                            help="Documents a worker queues before waiting for them to be written")
+        parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+        parser.add_argument("--live", action="store_true",
+                            help="Allow writing to a real Firestore project")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        self._check_target(options, workers)
+
+        if options["engagement_skew"] <= 1:
+            raise CommandError("--engagement-skew must be > 1")
+        if workers < 1 or options["flush_every"] < 1:
+            raise CommandError("--workers and --flush-every must be positive")
+        try:
+            city_weights = parse_weights(options["cities"], list(CITIES))
+        except ValueError as e:
+            raise CommandError(f"--cities: {e}")
+
+        spec = {
+            "activities": options["activities"],
+            "users": options["users"],
+            "likes_mean": options["likes_mean"],
+            "comments_mean": options["comments_mean"],
+            "spread_km": options["spread_km"],
+            "days": options["days"],
+            "days_ahead": options["days_ahead"],
+            "tag_skew": options["tag_skew"],
+            "city_weights": city_weights,
+            "engagement_skew": options["engagement_skew"],
+            "seed": options["seed"],
         }
+        rates = (
+            max(1, options["ops_per_second"] // workers),
+            max(1, options["max_ops_per_second"] // workers),
+        )
+
+        if workers == 1:
+            progress = queue.Queue()
+            executor = ThreadPoolExecutor(1, initializer=_init_worker, initargs=(progress,))
+        else:
+            # gRPC channels do not survive fork(); every worker starts clean
+            context = multiprocessing.get_context("spawn")
+            progress = context.Queue()
+            executor = ProcessPoolExecutor(
+                workers, mp_context=context, initializer=_init_worker, initargs=(progress,)
+            )
 
-
-        # ============================================================
-        # 3️⃣ Generate activities in random days of CURRENT MONTH
-        # ============================================================
-
-        now = datetime.now()
-        year = now.year
-        month = now.month
-        days_in_month = calendar.monthrange(year, month)[1]
-
-        for _ in range(20):  # generate 20 activities
-
-            selected_users = random.sample(real_users, random.randint(1, len(real_users)))
-            participants = [u["uid"] for u in selected_users]
-
-            template = random.choice(sample_activity_templates)
-            tags = random.sample(example_tags, random.randint(1, 3))
-
-            # city of first user
-            first_city = selected_users[0]["city"]
-            location = city_locations.get(first_city, city_locations["Warsaw"])
-
-            # ---------- RANDOM DATE ----------
-            random_day = random.randint(1, days_in_month)
-            random_hour = random.randint(8, 22)
-            random_minute = random.randint(0, 59)
-
-            time_start = datetime(year, month, random_day, random_hour, random_minute)
-
-            activity_ref = db.collection("activities").document()
-            activity_ref.set({
-                "type": template["type"],
-                "participants": participants,
-                "tags": tags,
-                "description": template["description"],
-                "location": location,
-                "time_start": time_start,
-                "time_end": None
-            })
-
-            # ---------- Likes ----------
-            like_users = random.sample(real_users, random.randint(0, len(real_users)))
-            for u in like_users:
-                activity_ref.collection("likes").document(u["uid"]).set({
-                    "user_id": u["uid"],
-                    "user_display_name": u["display_name"],
-                    "timestamp": time_start
-                })
-
-            # ---------- Comments ----------
-            comment_users = random.sample(real_users, random.randint(0, len(real_users)))
-            for u in comment_users:
-                activity_ref.collection("comments").add({
-                    "user_id": u["uid"],
-                    "user_display_name": u["display_name"],
-                    "text": f"{u['display_name']} joins the activity!",
-                    "timestamp": time_start
-                })
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Activity {activity_id}: {len(participants)} participants on {time_start}"
-                )
+        started = time.perf_counter()
+        with executor:
+            futures = [
+                executor.submit(_write_part, part, workers, spec, *rates, options["flush_every"])
+                for part in range(workers)
+            ]
+            documents, activities = self._follow(futures, progress, options, started)
+
+            tag_counts = Counter()
+            failed = 0
+            for future in futures:
+                counts, part_failed = future.result()
+                tag_counts.update(counts)
+                failed += part_failed
+
+        documents += self._write_tag_stats(tag_counts)
+        elapsed = time.perf_counter() - started
+        summary = (
+            f"Seeded {documents:,} documents ({activities:,} activities) in {elapsed:.1f}s "
+            f"({documents / elapsed:,.0f} docs/s) with {workers} worker(s)"
+        )
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{summary}; {failed:,} writes failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def _check_target(self, options, workers):
+        if api.USE_FAKE_FIRESTORE:
+            if workers != 1:
+                raise CommandError("The in-memory backend lives in one process; use --workers 1")
+        elif not os.environ.get("FIRESTORE_EMULATOR_HOST") and not options["live"]:
+            raise CommandError(
+                "Refusing to bulk-write to a live Firestore project; "
+                "set FIRESTORE_EMULATOR_HOST or pass --live"
             )
 
-        self.stdout.write(self.style.SUCCESS("Sample activity generation complete!"))
+    def _follow(self, futures, progress, options, started):
+        """Print progress until every worker is done. Returns (documents, activities)."""
+        documents = activities = 0
+        last_report = started
+        pending = futures
+
+        while pending:
+            _, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+            if any(f.done() and f.exception() for f in futures):
+                break
+
+            while True:
+                try:
+                    docs_delta, activities_delta = progress.get_nowait()
+                except queue.Empty:
+                    break
+                documents += docs_delta
+                activities += activities_delta
+
+            now = time.perf_counter()
+            if now - last_report >= options["report_every"]:
+                last_report = now
+                self.stdout.write(
+                    f"{documents:,} documents, {activities:,}/{options['activities']:,} activities "
+                    f"({documents / (now - started):,.0f} docs/s)"
+                )
 
+        # Late deltas from the workers' final reports
+        time.sleep(0.1)
+        while True:
+            try:
+                docs_delta, activities_delta = progress.get_nowait()
+            except queue.Empty:
+                break
+            documents += docs_delta
+            activities += activities_delta
+        return documents, activities
+
+    def _write_tag_stats(self, tag_counts):
+        writer = api.db.bulk_writer()
+        for tag, count in tag_counts.items():
+            writer.set(
+                api.db.collection(TAG_STATS).document(tag),
+                {"tag": tag, "count": firestore.Increment(count)},
+                merge=True,
+            )
+        writer.close()
+        return len(tag_counts)
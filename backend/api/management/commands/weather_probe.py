@@ -0,0 +1,56 @@
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.weather import fetch_weather_ai, weather_cache
+
+
+class Command(BaseCommand):
+    help = "Fire weather lookups around a point and report cache hit ratio and latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--lat", type=float, default=52.2297)
+        parser.add_argument("--lng", type=float, default=21.0122)
+        parser.add_argument("--spread-km", type=float, default=5.0,
+                            help="Callers are scattered uniformly within this radius")
+
+    def handle(self, *args, **options):
+        weather_cache.clear()
+        rng = random.Random(42)
+        spread = options["spread_km"]
+
+        points = []
+        for _ in range(options["requests"]):
+            r = spread * math.sqrt(rng.random())
+            theta = rng.random() * 2 * math.pi
+            d_lat = (r * math.cos(theta)) / 111.32
+            d_lng = (r * math.sin(theta)) / (111.32 * math.cos(math.radians(options["lat"])))
+            points.append((options["lat"] + d_lat, options["lng"] + d_lng))
+
+        def timed(point):
+            started = time.perf_counter()
+            fetch_weather_ai(*point)
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            latencies = sorted(pool.map(timed, points))
+        elapsed = time.perf_counter() - started
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        stats = weather_cache.stats()
+        self.stdout.write(
+            f"lookups={len(latencies)} cells={stats['entries']} "
+            f"hit_ratio={stats['hit_ratio']:.3f} upstream_errors={stats['upstream_errors']}"
+        )
+        self.stdout.write(
+            f"p50={pct(50):.1f}ms p95={pct(95):.1f}ms p99={pct(99):.1f}ms "
+            f"throughput={len(latencies) / elapsed:.0f} req/s"
+        )
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+from django.core.management.base import BaseCommand
+
+
+def fake_timeline(lat, lng, now=None):
+    """Deterministic Visual Crossing-shaped timeline payload for a point."""
+    now = now or datetime.now()
+    seed = int(abs(lat * 1000) + abs(lng * 1000))
+    conditions = ["Clear", "Partially cloudy", "Rain", "Overcast", "Snow"]
+
+    def hour(offset):
+        t = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=offset)
+        return {
+            "datetime": t.strftime("%H:%M:%S"),
+            "datetimeEpoch": int(t.timestamp()),
+            "temp": round(4 + (seed + offset * 7) % 24 + 0.5, 1),
+            "conditions": conditions[(seed + offset) // 6 % len(conditions)],
+        }
+
+    # Visual Crossing's default timeline: today + 14 days, hourly
+    hours = [hour(h) for h in range(0, 15 * 24)]
+    days = []
+    for d in range(15):
+        day_hours = hours[d * 24:(d + 1) * 24]
+        day = (now + timedelta(days=d)).strftime("%Y-%m-%d")
+        days.append({"datetime": day, "hours": day_hours})
+
+    return {
+        "latitude": lat,
+        "longitude": lng,
+        "currentConditions": {**hours[0], "datetime": now.strftime("%H:%M:%S")},
+        "days": days,
+    }
+
+
+def make_server(host="127.0.0.1", port=8765, latency_ms=150.0):
+    """
+    ThreadingHTTPServer answering /timeline/{lat},{lng} with fake_timeline().
+    Port 0 picks a free port; upstream requests served are counted in
+    `server.requests`.
+    """
+    latency = latency_ms / 1000
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = unquote(urlparse(self.path).path)
+            try:
+                lat, lng = (float(v) for v in path.rsplit("/", 1)[1].split(","))
+            except ValueError:
+                self.send_error(400, "Expected /timeline/{lat},{lng}")
+                return
+
+            with lock:
+                server.requests += 1
+
+            time.sleep(latency)
+            body = json.dumps(fake_timeline(lat, lng)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests = 0
+    return server
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the Visual Crossing timeline API (set WEATHER_API_URL=http://HOST:PORT/timeline)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency-ms", type=float, default=150.0,
+                            help="Artificial upstream latency per request")
+
+    def handle(self, *args, **options):
+        server = make_server(options["host"], options["port"], options["latency_ms"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Weather stub on http://{options['host']}:{options['port']}/timeline "
+            f"({options['latency_ms']:.0f} ms latency)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Served {server.requests} upstream requests")
@@ -0,0 +1,264 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.http import HttpResponse
+
+# ============================================================
+# Request metrics
+# ============================================================
+#
+# Every Firestore RPC (see api.instrumented_db) and every upstream HTTP
+# call is recorded twice: into process-wide Prometheus histograms, and
+# into the RequestMetrics of the request being served (a ContextVar, so
+# it follows sync_to_async threads and asyncio tasks). The middleware in
+# api.middleware turns the per-request totals into a Server-Timing header
+# and into per-route histograms; GET /metrics exposes them all.
+#
+# Work done after the response has been handed to the server (streamed
+# bodies, background cache refreshes) is counted in the process-wide
+# metrics only.
+#
+# The in-process caches (verified tokens, response pages, weather, the
+# partner index) publish their stats() as cache_* gauges on the same page.
+
+RPC_KINDS = ("read", "query", "write", "transaction")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rpcs = dict.fromkeys(RPC_KINDS, 0)
+        self.documents = 0
+        self.firestore_seconds = 0.0
+        self.http_calls = {}  # upstream -> count
+        self.http_seconds = {}  # upstream -> seconds
+
+    @property
+    def rpc_total(self):
+        return sum(self.rpcs.values())
+
+    def server_timing(self, total_seconds):
+        """Server-Timing header value (durations in ms)."""
+        counts = [f"{kind}={n}" for kind, n in self.rpcs.items() if n]
+        counts.append(f"docs={self.documents}")
+        parts = [f'firestore;dur={self.firestore_seconds * 1000:.1f};desc="{" ".join(counts)}"']
+        for upstream, seconds in self.http_seconds.items():
+            parts.append(
+                f'{upstream};dur={seconds * 1000:.1f};desc="calls={self.http_calls[upstream]}"'
+            )
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+# ============================================================
+# Prometheus registry
+# ============================================================
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = _labels(self.label_names, labels, [f'le="{bound}"'])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _labels(self.label_names, labels, ['le="+Inf"'])
+                lines.append(f"{self.name}_bucket{le} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class StatsGauges:
+    """
+    Gauges read at scrape time from the stats() of the in-process caches
+    (register() them next to the cache): every stats key becomes a family
+    <prefix>_<key>{cache="..."}.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._sources = {}  # cache name -> stats()
+        self._lock = threading.Lock()
+
+    def register(self, name, stats):
+        with self._lock:
+            self._sources[name] = stats
+
+    def render(self):
+        with self._lock:
+            sources = sorted(self._sources.items())
+        families = {}
+        for name, stats in sources:
+            for key, value in stats().items():
+                families.setdefault(key, []).append((name, value))
+
+        lines = []
+        for key, series in sorted(families.items()):
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {key} reported by the cache", f"# TYPE {name} gauge"]
+            for cache, value in series:
+                lines.append(f"{name}{_labels(('cache',), (cache,))} {value}")
+        return lines
+
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests served", ("route", "method", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "View time per request", ("route", "method"),
+)
+REQUEST_RPCS = Histogram(
+    "firestore_rpcs_per_request", "Firestore RPCs issued by one request",
+    ("route", "kind"), buckets=COUNT_BUCKETS,
+)
+REQUEST_FIRESTORE_SECONDS = Histogram(
+    "firestore_time_per_request_seconds", "Time spent in Firestore RPCs per request", ("route",),
+)
+DOCUMENTS_READ = Counter(
+    "firestore_documents_read_total", "Documents returned by Firestore", ("route",),
+)
+RPC_SECONDS = Histogram(
+    "firestore_rpc_duration_seconds", "Latency of individual Firestore RPCs", ("kind",),
+)
+UPSTREAM_SECONDS = Histogram(
+    "upstream_http_duration_seconds", "Latency of outgoing HTTP calls", ("upstream",),
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_http_requests_total", "Outgoing HTTP calls", ("upstream", "outcome"),
+)
+CACHE_STATS = StatsGauges("cache")
+
+REGISTRY = (
+    REQUESTS, REQUEST_SECONDS, REQUEST_RPCS, REQUEST_FIRESTORE_SECONDS, DOCUMENTS_READ,
+    RPC_SECONDS, UPSTREAM_SECONDS, UPSTREAM_REQUESTS, CACHE_STATS,
+)
+
+
+# ============================================================
+# Recording
+# ============================================================
+
+def record_rpc(kind, seconds, documents=0):
+    RPC_SECONDS.observe(seconds, (kind,))
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.rpcs[kind] += 1
+        metrics.documents += documents
+        metrics.firestore_seconds += seconds
+
+
+def record_documents(count):
+    """Documents yielded by a stream after its RPC was recorded."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.documents += count
+
+
+@contextmanager
+def timed_http(upstream):
+    """Time an outgoing HTTP call: `with timed_http("weather"): ...`."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        seconds = time.perf_counter() - started
+        UPSTREAM_SECONDS.observe(seconds, (upstream,))
+        UPSTREAM_REQUESTS.inc((upstream, outcome))
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.http_calls[upstream] = metrics.http_calls.get(upstream, 0) + 1
+            metrics.http_seconds[upstream] = metrics.http_seconds.get(upstream, 0.0) + seconds
+
+
+def observe_request(route, method, status, metrics, seconds):
+    REQUESTS.inc((route, method, str(status)))
+    REQUEST_SECONDS.observe(seconds, (route, method))
+    REQUEST_FIRESTORE_SECONDS.observe(metrics.firestore_seconds, (route,))
+    for kind, count in metrics.rpcs.items():
+        REQUEST_RPCS.observe(count, (route, kind))
+    if metrics.documents:
+        DOCUMENTS_READ.inc((route,), metrics.documents)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the registry above."""
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,69 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+from api.metrics import end_request, observe_request, start_request
+
+
+class RequestMetricsMiddleware:
+    """
+    Collect Firestore / upstream HTTP usage for each request (api.metrics),
+    report it in a Server-Timing header and feed the per-route histograms
+    behind /metrics. Works for both the sync and the async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self._finish(request, response, metrics)
+
+    @staticmethod
+    def _finish(request, response, metrics):
+        seconds = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"
+
+        observe_request(route, request.method, response.status_code, metrics, seconds)
+        response["Server-Timing"] = metrics.server_timing(seconds)
+        return response
+
+
+class JsonGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware for JSON bodies of at least GZIP_MIN_BYTES. Small
+    bodies are not worth the CPU, and streams (NDJSON pages, SSE) are left
+    alone so rows / events are not held back by the compressor.
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or not response.get("Content-Type", "").startswith("application/json")
+            or len(response.content) < settings.GZIP_MIN_BYTES
+        ):
+            return response
+        return super().process_response(request, response)
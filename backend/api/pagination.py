@@ -0,0 +1,153 @@
+import base64
+import json
+import math
+from collections import namedtuple
+
+from django.http import JsonResponse
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc_id):
+    """Opaque cursor for the document a page ended on."""
+    raw = json.dumps({"id": doc_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        doc_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(doc_id, str) or not doc_id or "/" in doc_id:
+        raise InvalidCursor("Invalid cursor")
+    return doc_id
+
+
+# Cursor of a ranked page (AI and personal feeds): the sort key of the
+# last row, so the next page resumes after that value even when the
+# ranking was rebuilt in between. `score` and `time_start` are None in
+# plain id cursors, which are resolved against the current ranking.
+RankCursor = namedtuple("RankCursor", ["score", "time_start", "id"])
+
+
+def encode_rank_cursor(score, time_start, doc_id):
+    raw = json.dumps(
+        {"id": doc_id, "score": score, "start": time_start}, separators=(",", ":")
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor):
+    doc_id = decode_cursor(cursor)
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded))
+    score, time_start = data.get("score"), data.get("start")
+    if score is None and time_start is None:
+        return RankCursor(None, None, doc_id)
+
+    for value in (score, time_start):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise InvalidCursor("Invalid cursor")
+    return RankCursor(float(score), float(time_start), doc_id)
+
+
+def get_page_params(request, default_limit=DEFAULT_PAGE_SIZE, max_limit=MAX_PAGE_SIZE, decode=decode_cursor):
+    """
+    Parse ?limit=&cursor= from the query string; `decode` turns the cursor
+    into what the pager takes (a document id by default).
+    Returns (limit, cursor, error_response).
+    """
+    raw_limit = request.GET.get("limit")
+    try:
+        limit = int(raw_limit) if raw_limit else default_limit
+    except ValueError:
+        return None, None, JsonResponse({"error": "Invalid ?limit="}, status=400)
+
+    if limit < 1:
+        return None, None, JsonResponse({"error": "Invalid ?limit="}, status=400)
+    limit = min(limit, max_limit)
+
+    cursor = request.GET.get("cursor")
+    if not cursor:
+        return limit, None, None
+
+    try:
+        return limit, decode(cursor), None
+    except InvalidCursor as e:
+        return None, None, JsonResponse({"error": str(e)}, status=400)
+
+
+def paginate(query, collection_ref, cursor_id, limit):
+    """
+    Run one page of an ordered query.
+
+    The cursor names the last document of the previous page; its snapshot
+    is handed to start_after() so Firestore resumes exactly after it
+    (ties on the order-by field are broken by document name). One extra
+    row is fetched to tell whether another page exists.
+
+    Returns (docs, next_cursor).
+    """
+    if cursor_id:
+        snapshot = collection_ref.document(cursor_id).get()
+        if not snapshot.exists:
+            raise InvalidCursor("Cursor document no longer exists")
+        query = query.start_after(snapshot)
+
+    docs = list(query.limit(limit + 1).stream())
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1].id)
+    return docs, None
+
+
+class PageStream:
+    """
+    paginate() as an iterator: documents are yielded as Firestore streams
+    them instead of being collected into a list first. `next_cursor` is
+    set once iteration is done. The cursor snapshot is resolved up front,
+    so InvalidCursor is raised before any response is started.
+    """
+
+    def __init__(self, query, collection_ref, cursor_id, limit):
+        if cursor_id:
+            snapshot = collection_ref.document(cursor_id).get()
+            if not snapshot.exists:
+                raise InvalidCursor("Cursor document no longer exists")
+            query = query.start_after(snapshot)
+
+        self.query = query
+        self.limit = limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, doc in enumerate(self.query.limit(self.limit + 1).stream()):
+            if count == self.limit:
+                self.next_cursor = encode_cursor(last.id)
+                return
+            last = doc
+            yield doc
+
+
+async def apaginate(query, collection_ref, cursor_id, limit):
+    """paginate() for AsyncQuery / AsyncCollectionReference."""
+    if cursor_id:
+        snapshot = await collection_ref.document(cursor_id).get()
+        if not snapshot.exists:
+            raise InvalidCursor("Cursor document no longer exists")
+        query = query.start_after(snapshot)
+
+    docs = [doc async for doc in query.limit(limit + 1).stream()]
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1].id)
+    return docs, None
@@ -0,0 +1,282 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from api.metrics import CACHE_STATS
+
+# ============================================================
+# Partner matching (MinHash / LSH over profile tags)
+# ============================================================
+#
+# "People like me" compares the caller's users/{uid}.tags with everyone
+# else's by Jaccard similarity. Comparing against every user is linear,
+# so each tag set is summarised by a MinHash signature
+# (PARTNER_MINHASH_PERMUTATIONS values; two signatures agree on a value
+# with probability = Jaccard) and the signature is cut into
+# PARTNER_LSH_BANDS bands. Users sharing any whole band land in the same
+# bucket, so a lookup only visits the caller's buckets:
+#
+#   P(candidate) = 1 - (1 - J ** rows) ** bands
+#
+# With 64 permutations in 32 bands of 2 rows, pairs at J = 0.5 are found
+# > 99.9% of the time and pairs at J = 0.2 about 73%. Candidates (at most
+# PARTNER_MAX_CANDIDATES) are then ranked by their exact Jaccard.
+#
+# Buckets are split by city so ?city= narrows the lookup rather than
+# filtering it afterwards. The index is built from users/ in a background
+# thread on first use, rebuilt the same way after PARTNER_INDEX_TTL (other
+# workers' tag changes) while the stale one keeps serving, and kept up to
+# date in between by the tag endpoints (update_tags). Nothing is built at
+# import time: a build thread does not survive fork (gunicorn --preload),
+# and a forked child drops any build state it inherited.
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+Profile = namedtuple("Profile", ["tags", "city", "band_keys"])
+
+
+def _tag_hash(tag):
+    # Stable across processes (unlike hash())
+    return int.from_bytes(hashlib.blake2b(tag.encode(), digest_size=4).digest(), "little")
+
+
+class MinHasher:
+    """Universal hashes (a * x + b) mod p over 32-bit tag hashes."""
+
+    def __init__(self, num_perm, seed=1):
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and x < 2**32 keep a * x + b inside uint64
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._columns = {}  # tag -> its hash under every permutation; the vocabulary is small
+
+    def _column(self, tag):
+        column = self._columns.get(tag)
+        if column is None:
+            x = np.uint64(_tag_hash(tag))
+            column = self._columns[tag] = (self.a * x + self.b) % MERSENNE_PRIME
+        return column
+
+    def signature(self, tags):
+        columns = [self._column(tag) for tag in tags]
+        return np.minimum.reduce(columns) if len(columns) > 1 else columns[0].copy()
+
+
+def jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+class LSHIndex:
+    """Profiles and LSH buckets of one build; callers hold PartnerIndex's lock."""
+
+    def __init__(self, hasher, bands):
+        self.hasher = hasher
+        self.bands = bands
+        self.profiles = {}  # uid -> Profile
+        self.buckets = {}   # (band, band values) -> {city: set(uid)}
+
+    def _band_keys(self, tags):
+        signature = self.hasher.signature(tags)
+        return list(enumerate(map(tuple, signature.reshape(self.bands, -1).tolist())))
+
+    def put(self, uid, tags, city):
+        self.remove(uid)
+        tags = frozenset(tags)
+        if not tags:
+            return
+
+        band_keys = self._band_keys(tags)
+        self.profiles[uid] = Profile(tags, city or "", band_keys)
+        for key in band_keys:
+            self.buckets.setdefault(key, {}).setdefault(city or "", set()).add(uid)
+
+    def remove(self, uid):
+        profile = self.profiles.pop(uid, None)
+        if profile is None:
+            return
+        for key in profile.band_keys:
+            by_city = self.buckets[key]
+            members = by_city[profile.city]
+            members.discard(uid)
+            if not members:
+                del by_city[profile.city]
+                if not by_city:
+                    del self.buckets[key]
+
+    def similar(self, tags, city=None, exclude=None, limit=20, max_candidates=None):
+        """
+        Up to `limit` (uid, similarity, Profile) sharing a bucket with
+        `tags`, best exact Jaccard first.
+        """
+        tags = frozenset(tags)
+        if not tags:
+            return []
+        max_candidates = max_candidates or settings.PARTNER_MAX_CANDIDATES
+
+        candidates = set()
+        for key in self._band_keys(tags):
+            by_city = self.buckets.get(key)
+            if not by_city:
+                continue
+            groups = [by_city.get(city, ())] if city is not None else by_city.values()
+            for members in groups:
+                room = max_candidates - len(candidates)
+                candidates.update(islice((uid for uid in members if uid != exclude), room))
+            if len(candidates) >= max_candidates:
+                break
+
+        scored = []
+        for uid in candidates:
+            profile = self.profiles[uid]
+            scored.append((jaccard(tags, profile.tags), uid, profile))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [(uid, similarity, profile) for similarity, uid, profile in scored[:limit]]
+
+
+def _load_index(client, hasher):
+    index = LSHIndex(hasher, settings.PARTNER_LSH_BANDS)
+    for doc in client.collection("users").select(["tags", "city"]).stream():
+        data = doc.to_dict() or {}
+        index.put(doc.id, data.get("tags") or [], data.get("city") or "")
+    return index
+
+
+class PartnerIndex:
+    """
+    The current LSHIndex, rebuilt in the background after `ttl` seconds
+    while the old one keeps serving. Tag changes are applied to it as they
+    happen; changes made while a build is streaming users/ are replayed
+    onto the new index before it is swapped in.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        if settings.PARTNER_MINHASH_PERMUTATIONS % settings.PARTNER_LSH_BANDS:
+            raise ValueError("PARTNER_MINHASH_PERMUTATIONS must be a multiple of PARTNER_LSH_BANDS")
+        self.hasher = MinHasher(settings.PARTNER_MINHASH_PERMUTATIONS)
+        self._index = None
+        self._built_at = 0.0
+        self._changes = None   # list of (uid, tags, city) while a build runs
+        self._building = None  # Event set when the running build ends
+        self._lock = threading.Lock()
+        self.builds = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The build thread (and whoever held the lock) stayed in the parent;
+        # a child keeps a finished index but must start its own builds.
+        self._lock = threading.Lock()
+        self._changes = None
+        self._building = None
+
+    def _fresh(self):
+        return self._index is not None and time.monotonic() - self._built_at < self.ttl
+
+    def start(self, client):
+        """Start a background build unless one is running; returns its Event."""
+        with self._lock:
+            if self._building is None:
+                self._building = threading.Event()
+                self._changes = []
+                threading.Thread(
+                    target=self._build, args=(client, self._building), daemon=True
+                ).start()
+            return self._building
+
+    def _build(self, client, done):
+        try:
+            index = _load_index(client, self.hasher)
+        except Exception as e:
+            print("[Partners ERROR] build failed:", e)
+            index = None
+
+        with self._lock:
+            # A build started before a fork no longer owns the state
+            if self._building is done:
+                if index is not None:
+                    for uid, tags, city in self._changes:
+                        index.put(uid, tags, city)
+                    self._index = index
+                    self._built_at = time.monotonic()
+                    self.builds += 1
+                self._changes = None
+                self._building = None
+        done.set()
+
+    def ensure(self, client, wait=None):
+        """
+        True when an index can serve lookups. A stale index keeps serving
+        while start() replaces it; before the first build completes this
+        waits up to `wait` seconds (PARTNER_INDEX_WARMUP_WAIT) for it.
+        """
+        if self._fresh():
+            return True
+
+        done = self.start(client)
+        if self._index is None:
+            done.wait(settings.PARTNER_INDEX_WARMUP_WAIT if wait is None else wait)
+        return self._index is not None
+
+    def profile(self, uid):
+        """(tags, city) of an indexed user, else None."""
+        with self._lock:
+            profile = self._index.profiles.get(uid) if self._index is not None else None
+        return None if profile is None else (profile.tags, profile.city)
+
+    def put(self, uid, tags, city):
+        with self._lock:
+            if self._index is not None:
+                self._index.put(uid, tags, city)
+            if self._changes is not None:
+                self._changes.append((uid, frozenset(tags), city))
+
+    def update_tags(self, uid, added=(), removed=(), load=None):
+        """
+        Apply a tag change made by the tag endpoints. Indexed users are
+        updated in place; others are read with load() -> users/{uid} data
+        (already including the change). Nothing to do before the first
+        build starts; the build reads the change from users/.
+        """
+        if self._index is None and self._changes is None:
+            return
+
+        current = self.profile(uid)
+        if current is not None:
+            tags, city = current
+            tags = (tags | set(added)) - set(removed)
+        else:
+            data = (load() if load else None) or {}
+            tags, city = data.get("tags") or [], data.get("city") or ""
+        self.put(uid, tags, city)
+
+    def similar(self, tags, city=None, exclude=None, limit=20):
+        """LSHIndex.similar() on the current index; [] before the first build."""
+        with self._lock:
+            if self._index is None:
+                return []
+            return self._index.similar(tags, city, exclude, limit)
+
+    def stats(self):
+        with self._lock:
+            index = self._index
+            return {
+                "users": len(index.profiles) if index else 0,
+                "buckets": len(index.buckets) if index else 0,
+                "builds": self.builds,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+
+
+partner_index = PartnerIndex(ttl=settings.PARTNER_INDEX_TTL)
+CACHE_STATS.register("partners", partner_index.stats)
@@ -0,0 +1,271 @@
+import bisect
+import math
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition
+
+from api.pagination import InvalidCursor, encode_rank_cursor
+from api.partners import partner_index
+from api.response_cache import CANDIDATES, LocalLRU, response_cache
+from api.serializers import FEED_FIELDS, projection
+from api.tag_query import ANY_CHUNK_SIZE, query_tags_any
+
+# ============================================================
+# Personalized feed
+# ============================================================
+#
+# get_feed?mode=personal ranks a per-user candidate set instead of
+# returning the newest page:
+#
+#   candidates = activities carrying any of the caller's profile tags
+#                (tag index, api.tag_query)
+#              + the newest activities
+#              + the newest activities of the caller's co-participants
+#                (people in the last PERSONAL_TIMELINE_DEPTH timeline entries)
+#
+# and scores every candidate with PIPELINE:
+#
+#   score = TAG_WEIGHT        * share of the activity's tags in the profile
+#         + SOCIAL_WEIGHT     * co-participation count of its participants
+#         + RECENCY_WEIGHT    * 0.5 ** (|time_start - now| / half-life)
+#         + POPULARITY_WEIGHT * log1p(likes + 2 * comments)
+#
+# (social and popularity scaled to [0, 1] over the candidates).
+#
+# Profiles (tags + co-participants) are cached per user for
+# PERSONAL_PROFILE_TTL. Candidate lists are cached for
+# PERSONAL_CANDIDATES_TTL under the CANDIDATES generation, so new
+# activities drop them (likes and comments only move popularity, which
+# waits for the TTL); tag and newest lists are shared
+# by every user with the same tags. The ranked order is cached per user,
+# so further pages are slices of it.
+
+TAG_WEIGHT = 0.40
+SOCIAL_WEIGHT = 0.25
+RECENCY_WEIGHT = 0.20
+POPULARITY_WEIGHT = 0.15
+
+UserProfile = namedtuple("UserProfile", ["tags", "co_participants"])
+
+_profiles = LocalLRU(settings.PERSONAL_PROFILE_TTL, settings.PERSONAL_CACHE_MAX_ENTRIES)
+_candidates = LocalLRU(settings.PERSONAL_CANDIDATES_TTL, settings.PERSONAL_CACHE_MAX_ENTRIES)
+
+
+def _timestamp(value):
+    try:
+        return value.timestamp()
+    except AttributeError:
+        return math.nan
+
+
+def _start_key(act):
+    start = _timestamp(act.get("time_start"))
+    return 0.0 if math.isnan(start) else start
+
+
+# ============================================================
+# Profile and candidates
+# ============================================================
+
+def get_profile(client, uid):
+    """The caller's UserProfile: profile tags and {co-participant: shared activities}."""
+    profile = _profiles.get(uid)
+    if profile is not None:
+        return profile
+
+    indexed = partner_index.profile(uid)
+    if indexed is not None:
+        tags = indexed[0]
+    else:
+        user_doc = client.collection("users").document(uid).get(["tags"])
+        tags = frozenset((user_doc.to_dict() or {}).get("tags") or [])
+
+    co_participants = Counter()
+    entries = (
+        client.collection("users").document(uid).collection("timeline")
+        .select(["participants"])
+        .order_by("time_start", direction=firestore.Query.DESCENDING)
+        .limit(settings.PERSONAL_TIMELINE_DEPTH)
+        .stream()
+    )
+    for entry in entries:
+        co_participants.update(p for p in (entry.to_dict() or {}).get("participants") or [] if p != uid)
+
+    profile = UserProfile(tags, co_participants)
+    _profiles.set(uid, profile)
+    return profile
+
+
+def _cached(name, params, load):
+    key = response_cache.make_key(CANDIDATES, f"personal/{name}", params)
+    rows = _candidates.get(key)
+    if rows is None:
+        rows = [(doc.id, doc.to_dict()) for doc in load()]
+        _candidates.set(key, rows)
+    return rows
+
+
+def tag_candidates(tags):
+    tags = sorted(tags)
+    if not tags:
+        return []
+    return _cached("tags", {"tags": ",".join(tags)}, lambda: query_tags_any(
+        tags, None, settings.PERSONAL_TAG_CANDIDATES, select=projection(FEED_FIELDS)
+    )[0])
+
+
+def recent_candidates(client):
+    return _cached("recent", {}, lambda: (
+        client.collection("activities")
+        .select(projection(FEED_FIELDS))
+        .order_by("time_start", direction=firestore.Query.DESCENDING)
+        .limit(settings.PERSONAL_RECENT_CANDIDATES)
+        .stream()
+    ))
+
+
+def social_candidates(client, co_participants):
+    # array_contains_any takes at most ANY_CHUNK_SIZE values; keep the closest people
+    people = sorted(uid for uid, _ in co_participants.most_common(ANY_CHUNK_SIZE))
+    if not people:
+        return []
+    try:
+        # Needs the (participants CONTAINS, time_start DESC) composite index
+        # from firestore.indexes.json
+        return _cached("social", {"people": ",".join(people)}, lambda: (
+            client.collection("activities")
+            .where("participants", "array_contains_any", people)
+            .select(projection(FEED_FIELDS))
+            .order_by("time_start", direction=firestore.Query.DESCENDING)
+            .limit(settings.PERSONAL_SOCIAL_CANDIDATES)
+            .stream()
+        ))
+    except FailedPrecondition as e:
+        # Rank without co-participants' activities rather than failing the feed
+        print("[Personal ERROR] social candidates need a composite index:", e)
+        return []
+
+
+# ============================================================
+# Scoring pipeline
+# ============================================================
+#
+# Stages: (name, weight, score(act, profile, now), scaled). Scaled stages
+# are divided by their largest value over the candidate set.
+
+def tag_affinity(act, profile, now):
+    tags = set(act.get("tags") or [])
+    return len(tags & profile.tags) / len(tags) if tags else 0.0
+
+
+def social_affinity(act, profile, now):
+    return sum(profile.co_participants.get(p, 0) for p in act.get("participants") or [])
+
+
+def recency(act, profile, now):
+    start = _timestamp(act.get("time_start"))
+    if math.isnan(start):
+        return 0.0
+    return 0.5 ** (abs(start - now) / (settings.PERSONAL_RECENCY_HALF_LIFE_HOURS * 3600))
+
+
+def popularity(act, profile, now):
+    return math.log1p((act.get("likes_count") or 0) + 2 * (act.get("comments_count") or 0))
+
+
+PIPELINE = (
+    ("tags", TAG_WEIGHT, tag_affinity, False),
+    ("social", SOCIAL_WEIGHT, social_affinity, True),
+    ("recency", RECENCY_WEIGHT, recency, False),
+    ("popularity", POPULARITY_WEIGHT, popularity, True),
+)
+
+
+def rank_candidates(candidates, profile, now=None):
+    """
+    Score {activity_id: act} with PIPELINE.
+    Returns [(activity_id, act, score)], best first (ties: later time_start,
+    then activity id); scores are rounded before sorting so the order
+    matches the rank cursors built from them.
+    """
+    now = time.time() if now is None else now
+    ids = list(candidates)
+    scores = [0.0] * len(ids)
+
+    for _, weight, stage, scaled in PIPELINE:
+        values = [stage(candidates[activity_id], profile, now) for activity_id in ids]
+        top = max(values, default=0.0) if scaled else 1.0
+        if top <= 0:
+            continue
+        for i, value in enumerate(values):
+            scores[i] += weight * value / top
+
+    ranked = [(activity_id, candidates[activity_id], round(scores[i], 4)) for i, activity_id in enumerate(ids)]
+    ranked.sort(key=_rank_key)
+    return ranked
+
+
+def _rank_key(row):
+    activity_id, act, score = row
+    return (-score, -_start_key(act), activity_id)
+
+
+def personal_ranking(client, uid):
+    """The caller's ranked candidates, their positions and sort keys, cached per user."""
+    key = response_cache.make_key(CANDIDATES, "personal/ranked", {"uid": uid})
+    ranking = _candidates.get(key)
+    if ranking is not None:
+        return ranking
+
+    profile = get_profile(client, uid)
+    candidates = {}
+    for source in (
+        tag_candidates(profile.tags),
+        social_candidates(client, profile.co_participants),
+        recent_candidates(client),
+    ):
+        for activity_id, act in source:
+            candidates.setdefault(activity_id, act)
+
+    # Recency from the hour, so a rebuilt ranking keeps the scores the
+    # caller's rank cursors were built from
+    ranked = rank_candidates(candidates, profile, now=time.time() // 3600 * 3600)
+    ranking = (profile, ranked, {row[0]: i for i, row in enumerate(ranked)}, [_rank_key(row) for row in ranked])
+    _candidates.set(key, ranking)
+    return ranking
+
+
+def personal_page(client, uid, cursor, limit):
+    """
+    One page of the caller's personalized feed; the cursor (a RankCursor)
+    holds the sort key of the previous page's last row, so paging resumes
+    after it even when the ranking was rebuilt in between.
+    Returns (profile, [(activity_id, act, score)], next_cursor).
+    """
+    profile, ranked, positions, keys = personal_ranking(client, uid)
+
+    start = 0
+    if cursor:
+        score, time_start, activity_id = cursor
+        if score is None:
+            index = positions.get(activity_id)
+            if index is None:
+                raise InvalidCursor("Cursor activity is no longer ranked")
+            start = index + 1
+        else:
+            start = bisect.bisect_right(keys, (-score, -time_start, activity_id))
+
+    rows = ranked[start:start + limit]
+    next_cursor = None
+    if rows and start + limit < len(ranked):
+        activity_id, act, score = rows[-1]
+        next_cursor = encode_rank_cursor(score, _start_key(act), activity_id)
+    return profile, rows, next_cursor
+
+
+def clear():
+    _profiles.clear()
+    _candidates.clear()
@@ -0,0 +1,302 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+from firebase_admin import firestore
+
+from api.geo import EARTH_RADIUS_KM, parse_lat_lng
+from api.pagination import InvalidCursor, encode_rank_cursor
+from api.serializers import FEED_FIELDS, projection
+
+# ============================================================
+# AI feed ranking
+# ============================================================
+#
+# get_feed_ai ranks a candidate pool (AI_CANDIDATE_POOL_SIZE activities,
+# upcoming ones first, see candidate_queries) instead of a single page. The
+# pool's features — coordinates, start times, popularity and the tag
+# groups the weather score looks at — are extracted once into NumPy
+# arrays and shared by every request until AI_CANDIDATE_POOL_TTL runs
+# out; each request is then one vectorized pass over the pool:
+#
+#   rank = WEATHER_WEIGHT    * weather score / 100   (score_activity_weather,
+#                                                      at the forecast for time_start)
+#        + DISTANCE_WEIGHT   * exp(-distance / AI_DISTANCE_SCALE_KM)
+#        + RECENCY_WEIGHT    * 0.5 ** (|time_start - now| / half-life)
+#        + POPULARITY_WEIGHT * log1p(likes + 2 * comments), scaled to [0, 1]
+
+# Tag groups of the weather score (shared with views.score_activity_weather)
+RAIN_AVOID_TAGS = frozenset(["outside", "walking", "sport", "adventure"])
+RAIN_FRIENDLY_TAGS = frozenset(["indoor", "cafe", "gaming", "movie"])
+SUN_FRIENDLY_TAGS = frozenset(["walking", "nature", "sport", "outside"])
+
+WEATHER_WEIGHT = 0.35
+DISTANCE_WEIGHT = 0.30
+RECENCY_WEIGHT = 0.20
+POPULARITY_WEIGHT = 0.15
+
+
+def _timestamp(value):
+    try:
+        return value.timestamp()
+    except AttributeError:
+        return math.nan
+
+
+class CandidatePool:
+    """Candidate activities and their ranking features, as parallel arrays."""
+
+    def __init__(self, docs):
+        self.ids = []
+        self.positions = {}  # activity id -> index into the arrays
+        self.activities = []
+        lat, lng, starts, popularity = [], [], [], []
+        rain_avoid, rain_friendly, sun_friendly = [], [], []
+
+        for doc in docs:
+            act = doc.to_dict()
+            self.positions[doc.id] = len(self.ids)
+            self.ids.append(doc.id)
+            self.activities.append(act)
+
+            loc = act.get("location") or {}
+            a_lat, a_lng = parse_lat_lng(loc.get("lat"), loc.get("lng"))
+            lat.append(math.nan if a_lat is None else a_lat)
+            lng.append(math.nan if a_lng is None else a_lng)
+            starts.append(_timestamp(act.get("time_start")))
+            popularity.append(
+                math.log1p((act.get("likes_count") or 0) + 2 * (act.get("comments_count") or 0))
+            )
+
+            tags = set(act.get("tags") or [])
+            rain_avoid.append(not tags.isdisjoint(RAIN_AVOID_TAGS))
+            rain_friendly.append(not tags.isdisjoint(RAIN_FRIENDLY_TAGS))
+            sun_friendly.append(not tags.isdisjoint(SUN_FRIENDLY_TAGS))
+
+        self.lat = np.radians(np.array(lat, dtype=np.float64))
+        self.lng = np.radians(np.array(lng, dtype=np.float64))
+        self.cos_lat = np.cos(self.lat)
+        self.time_start = np.array(starts, dtype=np.float64)
+        # Tie-breakers of the rank order (and of rank cursors)
+        self.start_keys = np.nan_to_num(self.time_start)
+        self.id_keys = np.array(self.ids, dtype=str)
+
+        popularity = np.array(popularity, dtype=np.float64)
+        top = popularity.max(initial=0.0)
+        self.popularity = popularity / top if top > 0 else popularity
+
+        self.rain_avoid = np.array(rain_avoid, dtype=bool)
+        self.rain_friendly = np.array(rain_friendly, dtype=bool)
+        self.sun_friendly = np.array(sun_friendly, dtype=bool)
+
+        self.built_at = time.monotonic()
+        # Recency is measured from the hour (the forecast's resolution)
+        # rather than from each request, so scores, and the rank cursors
+        # built from them, hold across requests and pool rebuilds
+        self.ranked_at = time.time() // 3600 * 3600
+
+    def __len__(self):
+        return len(self.ids)
+
+    def weather_scores(self, timeline):
+        """score_activity_weather() for every candidate at once."""
+        slots = timeline.slots(self.time_start)
+        scores = timeline.base_scores[slots]
+        scores += np.where(timeline.wet[slots], 10 * self.rain_friendly - 20 * self.rain_avoid, 0)
+        scores += 15 * (timeline.sunny[slots] & self.sun_friendly)
+        return np.clip(scores, 1, 100)
+
+    def distances_km(self, lat, lng):
+        """Haversine distance from (lat, lng) to every candidate (NaN without a location)."""
+        phi = math.radians(lat)
+        d_phi = self.lat - phi
+        d_lambda = self.lng - math.radians(lng)
+        a = np.sin(d_phi / 2) ** 2 + math.cos(phi) * self.cos_lat * np.sin(d_lambda / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    def rank(self, lat, lng, timeline, now=None):
+        """
+        Score every candidate for a caller at (lat, lng).
+        Returns (order, rank_scores, weather_scores, distances_km);
+        `order` indexes the pool from best to worst.
+        """
+        now = self.ranked_at if now is None else now
+
+        weather_scores = self.weather_scores(timeline)
+        distances = self.distances_km(lat, lng)
+
+        distance_decay = np.nan_to_num(np.exp(-distances / settings.AI_DISTANCE_SCALE_KM))
+        half_life = settings.AI_RECENCY_HALF_LIFE_HOURS * 3600
+        recency = np.nan_to_num(0.5 ** (np.abs(self.time_start - now) / half_life))
+
+        scores = (
+            WEATHER_WEIGHT * weather_scores / 100
+            + DISTANCE_WEIGHT * distance_decay
+            + RECENCY_WEIGHT * recency
+            + POPULARITY_WEIGHT * self.popularity
+        )
+
+        # Best score first; ties go to the later time_start, then the id
+        order = np.lexsort((self.id_keys, -self.start_keys, -scores))
+        return order, scores, weather_scores, distances
+
+
+# ============================================================
+# Pool cache
+# ============================================================
+
+def candidate_queries(client, now=None):
+    """
+    (upcoming, past): activities from AI_CANDIDATE_LOOKBACK_HOURS ago
+    onwards, soonest first — the span the hourly forecast covers — and,
+    to fill the pool when there are not enough of those, the most recent
+    earlier ones.
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(hours=settings.AI_CANDIDATE_LOOKBACK_HOURS)
+    activities = client.collection("activities")
+    fields = projection(FEED_FIELDS)
+
+    upcoming = (
+        activities.where("time_start", ">=", since)
+        .order_by("time_start")
+        .select(fields)
+    )
+    past = (
+        activities.where("time_start", "<", since)
+        .order_by("time_start", direction=firestore.Query.DESCENDING)
+        .select(fields)
+    )
+    return upcoming, past
+
+
+def _load_candidates(client):
+    upcoming, past = candidate_queries(client)
+    size = settings.AI_CANDIDATE_POOL_SIZE
+    docs = list(upcoming.limit(size).stream())
+    if len(docs) < size:
+        docs.extend(past.limit(size - len(docs)).stream())
+    return CandidatePool(docs)
+
+
+async def _aload_candidates(client):
+    upcoming, past = candidate_queries(client)
+    size = settings.AI_CANDIDATE_POOL_SIZE
+    docs = [doc async for doc in upcoming.limit(size).stream()]
+    if len(docs) < size:
+        docs.extend([doc async for doc in past.limit(size - len(docs)).stream()])
+    return CandidatePool(docs)
+
+
+class CandidatePoolCache:
+    """
+    The current CandidatePool, rebuilt after `ttl` seconds. Sync callers
+    rebuild it one at a time (the others wait for that rebuild); async
+    callers build with their own client and store() the result.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._pool = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _fresh(self, pool):
+        return pool is not None and time.monotonic() - pool.built_at < self.ttl
+
+    def get(self, build):
+        pool = self._pool
+        if self._fresh(pool):
+            return pool
+
+        with self._lock:
+            pool = self._pool
+            if not self._fresh(pool):
+                pool = self._pool = build()
+                self.builds += 1
+            return pool
+
+    def peek(self):
+        """The pool if it is still fresh, else None."""
+        pool = self._pool
+        return pool if self._fresh(pool) else None
+
+    def store(self, pool):
+        with self._lock:
+            self._pool = pool
+            self.builds += 1
+
+    def clear(self):
+        with self._lock:
+            self._pool = None
+
+
+candidate_pool_cache = CandidatePoolCache(ttl=settings.AI_CANDIDATE_POOL_TTL)
+
+
+def get_candidate_pool(client):
+    return candidate_pool_cache.get(lambda: _load_candidates(client))
+
+
+async def async_get_candidate_pool(client):
+    pool = candidate_pool_cache.peek()
+    if pool is None:
+        pool = await _aload_candidates(client)
+        candidate_pool_cache.store(pool)
+    return pool
+
+
+def _resume_position(pool, order, scores, cursor):
+    """Position in `order` of the first candidate ranked after `cursor`."""
+    score, time_start, activity_id = cursor
+    if score is None:
+        index = pool.positions.get(activity_id)
+        if index is None:
+            raise InvalidCursor("Cursor activity is no longer ranked")
+        return int(np.flatnonzero(order == index)[0]) + 1
+
+    # Resume by value: the pool may have been rebuilt (or scores moved on)
+    # since the cursor was issued, so its activity may rank elsewhere or not
+    # at all
+    ranked_scores = scores[order]
+    starts = pool.start_keys[order]
+    ids = pool.id_keys[order]
+    after = (ranked_scores < score) | (
+        (ranked_scores == score)
+        & ((starts < time_start) | ((starts == time_start) & (ids > activity_id)))
+    )
+    return int(np.argmax(after)) if after.any() else len(order)
+
+
+def ranked_page(pool, lat, lng, timeline, cursor, limit):
+    """
+    One page of the pool in rank order for a caller at (lat, lng); the
+    cursor (a RankCursor) holds the sort key of the previous page's last row.
+    Returns ([(activity_id, act, ai_score, rank_score, distance_km)], next_cursor).
+    """
+    order, scores, weather_scores, distances = pool.rank(lat, lng, timeline)
+
+    start = _resume_position(pool, order, scores, cursor) if cursor else 0
+
+    page = order[start:start + limit].tolist()
+    rows = []
+    for index in page:
+        distance = float(distances[index])
+        rows.append((
+            pool.ids[index],
+            pool.activities[index],
+            int(weather_scores[index]),
+            round(float(scores[index]), 4),
+            None if math.isnan(distance) else round(distance, 3),
+        ))
+
+    next_cursor = None
+    if rows and start + limit < len(order):
+        last = page[-1]
+        next_cursor = encode_rank_cursor(
+            float(scores[last]), float(pool.start_keys[last]), pool.ids[last]
+        )
+    return rows, next_cursor
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.metrics import CACHE_STATS
+
+# ============================================================
+# Response cache for listing endpoints
+# ============================================================
+#
+# Two tiers:
+#   1. an in-process LRU with TTL (always on, no serialisation cost)
+#   2. an optional shared Django cache (settings.RESPONSE_CACHE_BACKEND),
+#      e.g. Redis/Memcached in production or LocMemCache locally
+#
+# Only the anonymous part of a response is cached under the page key.
+# The per-user part (which activities the caller liked) is cached
+# separately under page key + uid, so one popular page is stored once
+# and every user only adds a small set of ids.
+#
+# Invalidation is generational: each namespace has a counter that write
+# endpoints bump; keys embed the counter, so old entries simply stop
+# being addressed and age out. Namespaces are scoped to what a write can
+# change:
+#
+#   ACTIVITIES          feed pages; bumped when an activity is added or
+#                       its summary (likes, comments) changes
+#   tag_namespace(tag)  by-tag pages; bumped by the same writes, for the
+#                       tags of the activity they touch
+#   CANDIDATES          personal-feed candidate lists (api.personalize);
+#                       bumped only when activities are added
+
+
+class LocalLRU:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    def __init__(self, ttl, max_entries, shared_alias=None):
+        self.ttl = ttl
+        self.local = LocalLRU(ttl, max_entries)
+        self.shared_alias = shared_alias
+        self._generations = {}  # used when there is no shared tier
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    # ---------------- generations ----------------
+
+    def _generation(self, namespace):
+        if self.shared is not None:
+            return self.shared.get_or_set(f"resp-gen:{namespace}", 1, timeout=None)
+        return self._generations.get(namespace, 1)
+
+    def invalidate(self, namespace):
+        """Bump `namespace`'s generation so every cached page in it misses."""
+        if self.shared is not None:
+            key = f"resp-gen:{namespace}"
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.set(key, 2, timeout=None)
+        else:
+            with self._lock:
+                self._generations[namespace] = self._generations.get(namespace, 1) + 1
+
+    # ---------------- keys ----------------
+
+    def make_key(self, namespace, path, params):
+        query = urlencode(sorted((k, v) for k, v in params.items() if v is not None))
+        return f"resp:{namespace}:{self._generation(namespace)}:{path}?{query}"
+
+    # ---------------- get / set ----------------
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, timeout=self.ttl)
+
+    def get_user_part(self, key, uid):
+        return self.get(f"{key}#u={uid}")
+
+    def set_user_part(self, key, uid, value):
+        self.set(f"{key}#u={uid}", value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    ttl=settings.RESPONSE_CACHE_TTL,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    shared_alias=settings.RESPONSE_CACHE_BACKEND or None,
+)
+CACHE_STATS.register("responses", response_cache.stats)
+
+# Namespaces
+ACTIVITIES = "activities"
+CANDIDATES = "candidates"
+
+
+def tag_namespace(tag):
+    return f"tag:{tag}"
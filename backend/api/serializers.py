@@ -0,0 +1,189 @@
+from itertools import islice
+
+import orjson
+from django.http import JsonResponse, StreamingHttpResponse
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# ============================================================
+# Values
+# ============================================================
+
+NDJSON = "application/x-ndjson"
+
+
+def iso(value):
+    """Firestore timestamps (datetime) as ISO 8601; anything else unchanged."""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):  # GeoPoint
+        return {"lat": value.latitude, "lng": value.longitude}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode `obj` to compact JSON bytes."""
+    return orjson.dumps(obj, default=_default)
+
+
+# ============================================================
+# Response rows (shared by api.views and api.async_views)
+# ============================================================
+
+def serialize_last_comment(last_comment):
+    if not last_comment:
+        return None
+
+    return {
+        "user_id": last_comment.get("user_id"),
+        "user_display_name": last_comment.get("user_display_name"),
+        "text": last_comment.get("text"),
+        "timestamp": iso(last_comment.get("timestamp")),
+    }
+
+
+# Document fields each response field is built from; a ?fields= request
+# projects the query onto these with select()
+ACTIVITY_FIELD_SOURCES = {
+    "id": (),
+    "participants": ("participants",),
+    "tags": ("tags",),
+    "description": ("description",),
+    "location": ("location",),
+    "time_start": ("time_start",),
+    "time_end": ("time_end",),
+    "likes_count": ("likes_count",),
+    "comments_count": ("comments_count",),
+    "user_liked": (),
+    "last_comment": ("last_comment",),
+}
+
+# Default row shapes
+FEED_FIELDS = (
+    "id", "tags", "description", "location", "participants", "time_start", "time_end",
+    "likes_count", "comments_count", "user_liked", "last_comment",
+)
+TAG_FIELDS = (
+    "id", "participants", "tags", "description", "location", "time_start", "time_end",
+    "user_liked",
+)
+
+
+def activity_row(activity_id, act, user_liked, fields=FEED_FIELDS):
+    """One activity as a response row, restricted to `fields`."""
+    row = {
+        "id": activity_id,
+        "participants": act.get("participants"),
+        "tags": act.get("tags"),
+        "description": act.get("description"),
+        "location": act.get("location"),
+        "time_start": iso(act.get("time_start")),
+        "time_end": iso(act.get("time_end")),
+        "likes_count": act.get("likes_count", 0),
+        "comments_count": act.get("comments_count", 0),
+        "user_liked": user_liked,
+        "last_comment": serialize_last_comment(act.get("last_comment")),
+    }
+    return {name: row[name] for name in fields}
+
+
+def feed_item(activity_id, act, user_liked):
+    return activity_row(activity_id, act, user_liked, FEED_FIELDS)
+
+
+def get_fields_param(request, default):
+    """
+    Parse ?fields=a,b into a subset of the endpoint's `default` row shape
+    (kept in default order; `id` is always included).
+    Returns (fields, error_response).
+    """
+    raw = request.GET.get("fields")
+    if not raw:
+        return default, None
+
+    requested = {f.strip() for f in raw.split(",") if f.strip()}
+    unknown = requested - set(default)
+    if unknown:
+        return None, JsonResponse(
+            {"error": f"Unknown ?fields=: {', '.join(sorted(unknown))}"}, status=400
+        )
+
+    requested.add("id")
+    return tuple(f for f in default if f in requested), None
+
+
+def projection(fields, *required):
+    """
+    Document field paths for select(): what `fields` are built from plus
+    any `required` by the caller (e.g. fields a query filters or sorts on).
+    """
+    paths = {path for name in fields for path in ACTIVITY_FIELD_SOURCES[name]}
+    # An empty projection means "all fields" to Firestore; ask for the
+    # document name only instead
+    return sorted(paths.union(required)) or [FieldPath.document_id()]
+
+
+def comment_item(comment_id, c):
+    return {
+        "id": comment_id,
+        "user_id": c.get("user_id"),
+        "user_display_name": c.get("user_display_name"),
+        "text": c.get("text"),
+        "timestamp": iso(c.get("timestamp")),
+    }
+
+
+def apply_comment_display_names(comments, display_names):
+    """
+    Names stored on older comments may be stale ("User"); overwrite them
+    with the freshly resolved ones.
+    """
+    for c in comments:
+        if c["user_id"] in display_names:
+            c["user_display_name"] = display_names[c["user_id"]]
+
+
+# ============================================================
+# NDJSON streaming
+# ============================================================
+#
+# Listing endpoints switch to a streamed body when the client sends
+# `Accept: application/x-ndjson` or `?stream=1`: one JSON row per line,
+# written as Firestore hands documents over, followed by a final
+# {"next_cursor": ...} line. Rows are built in small chunks so per-page
+# lookups (likes, display names) stay one batched read per chunk.
+
+STREAM_CHUNK_SIZE = 50
+
+
+def wants_ndjson(request):
+    return (
+        request.GET.get("stream") in ("1", "true")
+        or NDJSON in request.headers.get("Accept", "")
+    )
+
+
+def chunked(iterable, size=STREAM_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def ndjson_response(docs, build_rows, trailer):
+    """
+    Stream `docs` as NDJSON. `build_rows(chunk)` turns a list of snapshots
+    into response rows; `trailer()` is called once the rows are written
+    and returns the closing object (e.g. the next cursor).
+    """
+    def body():
+        for chunk in chunked(docs):
+            for row in build_rows(chunk):
+                yield dumps(row) + b"\n"
+        yield dumps(trailer()) + b"\n"
+
+    response = StreamingHttpResponse(body(), content_type=NDJSON)
+    response["X-Accel-Buffering"] = "no"  # let proxies pass lines through
+    return response
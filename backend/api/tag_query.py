@@ -0,0 +1,149 @@
+from firebase_admin import firestore
+
+from api import db
+from api.pagination import InvalidCursor, encode_cursor
+
+# ============================================================
+# Multi-tag query planner
+# ============================================================
+#
+# "any": Firestore's array_contains_any takes at most 10 values per
+#        query here, so the (deduplicated) tags are split into chunks of
+#        10, each chunk is queried with the same ordering + limit, and the
+#        ordered streams are merged and de-duplicated in memory.
+#
+# "all": Firestore allows a single array-membership filter per query,
+#        so the plan starts from the most selective tag (smallest count in
+#        tag_stats/{tag}) and checks the remaining tags on the rows it
+#        reads. The scan is capped at MAX_ALL_SCAN rows per page.
+#
+# Both keep ordering (time_start DESC) and limits inside Firestore and
+# resume from a document-snapshot cursor, so cost is bounded by the page.
+# `select` projects the scans onto the fields the response needs; the
+# fields the planner itself sorts / filters on are always added.
+
+ANY_CHUNK_SIZE = 10
+MAX_ALL_SCAN = 1000
+
+TAG_STATS = "tag_stats"
+
+
+def _is_stat_key(tag):
+    # Tags become document IDs in tag_stats
+    return isinstance(tag, str) and tag not in ("", ".", "..") and "/" not in tag
+
+
+def tag_count_updates(batch, tags):
+    """Queue tag_stats increments for a new activity onto `batch`."""
+    tag_count_increments(batch, {tag: 1 for tag in set(tags or [])})
+
+
+def tag_count_increments(batch, counts):
+    """Queue one tag_stats increment per tag ({tag: n}) onto `batch`."""
+    for tag, n in counts.items():
+        if not _is_stat_key(tag) or not n:
+            continue
+        batch.set(
+            db.collection(TAG_STATS).document(tag),
+            {"tag": tag, "count": firestore.Increment(n)},
+            merge=True,
+        )
+
+
+def get_tag_counts(tags):
+    """{tag: count} for tags that have stats; one batched read."""
+    refs = [db.collection(TAG_STATS).document(tag) for tag in tags if _is_stat_key(tag)]
+    if not refs:
+        return {}
+    return {
+        snap.id: (snap.to_dict() or {}).get("count", 0)
+        for snap in db.get_all(refs)
+        if snap.exists
+    }
+
+
+def _ordered(query, select=None):
+    if select is not None:
+        query = query.select(sorted(set(select) | {"time_start", "tags"}))
+    return query.order_by("time_start", direction=firestore.Query.DESCENDING)
+
+
+def _cursor_snapshot(cursor_id):
+    if not cursor_id:
+        return None
+    snapshot = db.collection("activities").document(cursor_id).get()
+    if not snapshot.exists:
+        raise InvalidCursor("Cursor document no longer exists")
+    return snapshot
+
+
+def _sort_key(doc):
+    # Mirrors Firestore's order: time_start DESC, then document name DESC
+    ts = (doc.to_dict() or {}).get("time_start")
+    return (ts.timestamp() if hasattr(ts, "timestamp") else float("-inf"), doc.id)
+
+
+def query_tags_any(tags, cursor_id, limit, select=None):
+    """Activities carrying at least one of `tags`. Returns (docs, next_cursor)."""
+    tags = list(dict.fromkeys(tags))
+    start_after = _cursor_snapshot(cursor_id)
+
+    merged = {}
+    for i in range(0, len(tags), ANY_CHUNK_SIZE):
+        chunk = tags[i:i + ANY_CHUNK_SIZE]
+        query = _ordered(
+            db.collection("activities").where("tags", "array_contains_any", chunk), select
+        )
+        if start_after is not None:
+            query = query.start_after(start_after)
+
+        for doc in query.limit(limit + 1).stream():
+            merged.setdefault(doc.id, doc)
+
+    docs = sorted(merged.values(), key=_sort_key, reverse=True)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1].id)
+    return docs, None
+
+
+def query_tags_all(tags, cursor_id, limit, select=None):
+    """Activities carrying every one of `tags`. Returns (docs, next_cursor)."""
+    tags = list(dict.fromkeys(tags))
+    counts = get_tag_counts(tags)
+
+    # A tag with known zero count means nothing can match
+    if any(counts.get(tag) == 0 for tag in tags):
+        return [], None
+
+    # Unknown counts (no stats yet) sort last so they never drive the plan
+    driver = min(tags, key=lambda t: (t not in counts, counts.get(t, 0)))
+    rest = [t for t in tags if t != driver]
+
+    query = _ordered(db.collection("activities").where("tags", "array_contains", driver), select)
+    start_after = _cursor_snapshot(cursor_id)
+
+    batch_size = min(max(limit * 2, 20), MAX_ALL_SCAN)
+    scanned = 0
+    matches = []
+
+    while scanned < MAX_ALL_SCAN:
+        page = query if start_after is None else query.start_after(start_after)
+        batch = list(page.limit(batch_size).stream())
+        if not batch:
+            return matches, None
+
+        for doc in batch:
+            scanned += 1
+            start_after = doc
+            doc_tags = (doc.to_dict() or {}).get("tags", [])
+            if all(t in doc_tags for t in rest):
+                matches.append(doc)
+                if len(matches) == limit:
+                    return matches, encode_cursor(doc.id)
+
+        if len(batch) < batch_size:
+            return matches, None
+
+    # Scan budget spent: hand back what we have and resume after the last row read
+    return matches, encode_cursor(start_after.id)
@@ -1,3 +1,635 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import AsyncClient, SimpleTestCase
+
+import api
+from api import db, personalize, views
+from api.auth import token_cache, verify_token
+from api.display_names import display_name_cache, get_display_names
+from api.geo import activity_geo_fields, haversine_km
+from api.live import ASGI_REQUIRED
+from api.management.commands.weather_stub import fake_timeline
+from api.pagination import decode_cursor
+from api.partners import partner_index
+from api.ranking import candidate_pool_cache
+from api.response_cache import response_cache
+from api.tag_query import query_tags_all, query_tags_any
+from api.weather import WeatherCache, WeatherTimeline, weather_cache, weather_cell
+
+# Regression tests against the in-memory Firestore stand-in:
+#
+#   FIRESTORE_BACKEND=memory python manage.py test api
+
+USER = "user-a"
+OTHER = "user-b"
+EPOCH = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def activity_doc(minutes, tags=(), lat=None, lng=None, participants=(USER,)):
+    return {
+        "participants": list(participants),
+        "tags": list(tags),
+        "description": "",
+        "location": {"lat": lat, "lng": lng},
+        "time_start": EPOCH + timedelta(minutes=minutes),
+        "time_end": None,
+        **activity_geo_fields(lat, lng),
+        **views.activity_summary_defaults(),
+    }
+
+
+@skipUnless(api.USE_FAKE_FIRESTORE, "needs FIRESTORE_BACKEND=memory")
+class FakeFirestoreTestCase(SimpleTestCase):
+    def setUp(self):
+        db.clear()
+        response_cache.local.clear()
+        personalize.clear()
+        views._known_profiles.clear()
+        partner_index.clear()
+        candidate_pool_cache.clear()
+        weather_cache.clear()
+        token_cache.clear()
+        display_name_cache.put_many({USER: "User A", OTHER: "User B"})
+        for uid in (USER, OTHER):
+            token_cache.put(f"token-{uid}", {"uid": uid, "exp": time.time() + 3600})
+
+    def auth(self, uid=USER):
+        return {"HTTP_AUTHORIZATION": f"Bearer token-{uid}"}
+
+    def post_json(self, path, body, uid=USER):
+        return self.client.post(path, data=json.dumps(body), content_type="application/json", **self.auth(uid))
+
+    def load_activity(self, activity_id, *args, **kwargs):
+        db.load(f"activities/{activity_id}", activity_doc(*args, **kwargs))
+
+    def activity(self, activity_id):
+        return db.collection("activities").document(activity_id).get().to_dict()
+
+
+class SummaryTests(FakeFirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.load_activity("act", 0)
+
+    def comment(self, text, uid=USER):
+        response = self.post_json("/api/activity/act/comment/", {"text": text}, uid)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["comment_id"]
+
+    def delete_comment(self, comment_id, uid=USER):
+        return self.client.delete(f"/api/activity/act/comment/{comment_id}/delete/", **self.auth(uid))
+
+    def test_like_and_unlike_keep_likes_count(self):
+        for uid in (USER, USER, OTHER):
+            self.assertEqual(self.client.post("/api/activity/act/like/", **self.auth(uid)).status_code, 200)
+        self.assertEqual(self.activity("act")["likes_count"], 2)
+
+        for _ in range(2):
+            self.client.post("/api/activity/act/unlike/", **self.auth(USER))
+        self.assertEqual(self.activity("act")["likes_count"], 1)
+
+    def test_like_unknown_activity_is_404(self):
+        self.assertEqual(self.client.post("/api/activity/missing/like/", **self.auth()).status_code, 404)
+
+    def test_comment_updates_count_and_last_comment(self):
+        self.comment("first")
+        self.comment("second", OTHER)
+
+        act = self.activity("act")
+        self.assertEqual(act["comments_count"], 2)
+        self.assertEqual(act["last_comment"]["text"], "second")
+        self.assertEqual(act["last_comment"]["user_id"], OTHER)
+
+    def test_deleting_last_comment_promotes_the_previous_one(self):
+        first = self.comment("first")
+        second = self.comment("second")
+
+        self.assertEqual(self.delete_comment(second).status_code, 200)
+        act = self.activity("act")
+        self.assertEqual(act["comments_count"], 1)
+        self.assertEqual(act["last_comment"]["id"], first)
+
+        self.delete_comment(first)
+        act = self.activity("act")
+        self.assertEqual(act["comments_count"], 0)
+        self.assertIsNone(act["last_comment"])
+
+    def test_deleting_an_older_comment_keeps_last_comment(self):
+        first = self.comment("first")
+        second = self.comment("second")
+
+        self.delete_comment(first)
+        act = self.activity("act")
+        self.assertEqual(act["comments_count"], 1)
+        self.assertEqual(act["last_comment"]["id"], second)
+
+    def test_only_the_author_deletes_a_comment(self):
+        comment_id = self.comment("mine")
+        self.assertEqual(self.delete_comment(comment_id, OTHER).status_code, 403)
+        self.assertEqual(self.delete_comment("missing").status_code, 404)
+        self.assertEqual(self.activity("act")["comments_count"], 1)
+
+
+class PaginationTests(FakeFirestoreTestCase):
+    def test_feed_cursor_walks_every_activity_once_newest_first(self):
+        for i in range(25):
+            self.load_activity(f"act{i:02d}", i)
+        # Same time_start: the tie is broken by document id
+        self.load_activity("act-tie", 10)
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/api/feed/", params).json()
+            self.assertLessEqual(len(page["feed"]), 7)
+            seen += [row["id"] for row in page["feed"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), 26)
+        self.assertEqual(len(set(seen)), 26)
+        starts = [self.activity(activity_id)["time_start"] for activity_id in seen]
+        self.assertEqual(starts, sorted(starts, reverse=True))
+
+    def test_invalid_cursor_is_400(self):
+        self.assertEqual(self.client.get("/api/feed/", {"cursor": "not-a-cursor"}).status_code, 400)
+
+
+class RankedCursorTests(FakeFirestoreTestCase):
+    CENTER = (52.2297, 21.0122)
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(5)
+        vocabulary = ["run", "yoga", "chess", "walking", "cafe"]
+        for i in range(30):
+            self.load_activity(
+                f"act{i:02d}", i * 90, rng.sample(vocabulary, rng.randint(1, 3)),
+                lat=self.CENTER[0] + rng.uniform(-0.05, 0.05),
+                lng=self.CENTER[1] + rng.uniform(-0.05, 0.05),
+            )
+        db.load(f"users/{USER}", {"tags": ["run", "yoga"]})
+        weather_cache.store(weather_cell(*self.CENTER), WeatherTimeline.from_payload(fake_timeline(*self.CENTER)))
+
+    def walk(self, path, params, between_pages=lambda seen: None):
+        seen, cursor = [], None
+        while True:
+            page = self.client.get(path, {**params, "limit": 7, **({"cursor": cursor} if cursor else {})}, **self.auth())
+            self.assertEqual(page.status_code, 200)
+            seen += [row["id"] for row in page.json()["feed"]]
+            cursor = page.json()["next_cursor"]
+            if not cursor:
+                return seen
+            between_pages(seen)
+
+    def assert_resumes_by_value(self, path, params, rebuild):
+        order = self.walk(path, params)
+        self.assertEqual(sorted(order), sorted(f"act{i:02d}" for i in range(30)))
+
+        # A rebuilt ranking resumes where the last page ended
+        self.assertEqual(self.walk(path, params, lambda seen: rebuild()), order)
+
+        # So does one where, after the first page, a row was added above the
+        # cursor (a copy of the top row ranks next to it) and the cursor row
+        # itself moved up (liked): nothing is repeated or skipped
+        def change_and_rebuild(seen):
+            if self.activity("aaa-clone") is None:
+                db.load("activities/aaa-clone", self.activity(order[0]))
+                self.client.post(f"/api/activity/{seen[-1]}/like/", **self.auth())
+            rebuild()
+
+        self.assertEqual(self.walk(path, params, change_and_rebuild), order)
+
+    def test_ai_feed(self):
+        params = {"lat": self.CENTER[0], "lng": self.CENTER[1]}
+        self.assert_resumes_by_value("/api/feed/ai/", params, candidate_pool_cache.clear)
+
+    def test_personal_feed(self):
+        self.assert_resumes_by_value("/api/feed/", {"mode": "personal"}, personalize.clear)
+
+        rows = self.client.get("/api/feed/", {"mode": "personal", "limit": 50}, **self.auth()).json()["feed"]
+        scores = [row["rank_score"] for row in rows]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_personal_feed_needs_auth(self):
+        self.assertEqual(self.client.get("/api/feed/", {"mode": "personal"}).status_code, 401)
+
+
+class ResponseCacheTests(FakeFirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.load_activity("act", 10, ["run"])
+        self.load_activity("other", 0, ["chess"])
+
+    def row(self, path, rows_key, params=None, uid=USER):
+        response = self.client.get(path, params or {}, **self.auth(uid))
+        return next(row for row in response.json()[rows_key] if row["id"] == "act")
+
+    def rows(self):
+        return (
+            self.row("/api/feed/", "feed"),
+            self.row("/api/activities/by-tag/", "activities", {"tag": "run"}),
+        )
+
+    def test_like_and_comment_show_up_on_cached_pages(self):
+        self.rows()  # cache both pages
+
+        self.client.post("/api/activity/act/like/", **self.auth())
+        self.post_json("/api/activity/act/comment/", {"text": "nice"})
+
+        feed_row, tag_row = self.rows()
+        self.assertEqual(feed_row["likes_count"], 1)
+        self.assertEqual(feed_row["comments_count"], 1)
+        self.assertEqual(feed_row["last_comment"]["text"], "nice")
+        # By-tag rows carry no summary, only user_liked
+        self.assertTrue(feed_row["user_liked"])
+        self.assertTrue(tag_row["user_liked"])
+
+        other_user = self.row("/api/feed/", "feed", uid=OTHER)
+        self.assertEqual(other_user["likes_count"], 1)
+        self.assertFalse(other_user["user_liked"])
+
+    def test_unlike_and_comment_delete_show_up_on_cached_pages(self):
+        self.client.post("/api/activity/act/like/", **self.auth())
+        comment_id = self.post_json("/api/activity/act/comment/", {"text": "nice"}).json()["comment_id"]
+        self.rows()
+
+        self.client.post("/api/activity/act/unlike/", **self.auth())
+        self.client.delete(f"/api/activity/act/comment/{comment_id}/delete/", **self.auth())
+
+        feed_row, tag_row = self.rows()
+        self.assertEqual(feed_row["likes_count"], 0)
+        self.assertEqual(feed_row["comments_count"], 0)
+        self.assertIsNone(feed_row["last_comment"])
+        self.assertFalse(feed_row["user_liked"])
+        self.assertFalse(tag_row["user_liked"])
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        self.client.get("/api/activities/by-tag/", {"tag": "chess"})
+        db.reset_rpc_counts()
+        self.client.get("/api/activities/by-tag/", {"tag": "chess"})
+        self.assertEqual(sum(db.rpc_counts.values()), 0)
+
+        # A write to a "run" activity leaves the "chess" page cached
+        self.client.post("/api/activity/act/like/", **self.auth())
+        db.reset_rpc_counts()
+        self.client.get("/api/activities/by-tag/", {"tag": "chess"})
+        self.assertEqual(sum(db.rpc_counts.values()), 0)
+
+    def test_hits_are_published_on_metrics(self):
+        def hits():
+            for line in self.client.get("/metrics").content.decode().splitlines():
+                if line.startswith('cache_hits{cache="responses"}'):
+                    return int(line.split()[-1])
+
+        before = hits()
+        self.client.get("/api/activities/by-tag/", {"tag": "chess"})
+        self.client.get("/api/activities/by-tag/", {"tag": "chess"})
+        self.assertEqual(hits(), before + 1)
+
+    def test_synced_activity_shows_up_on_cached_pages(self):
+        self.rows()
+        activity_id = self.post_json("/api/sync/", {"tags": ["run"], "client_id": "device-1:1"}).json()["activity_id"]
+
+        feed = self.client.get("/api/feed/").json()["feed"]
+        by_tag = self.client.get("/api/activities/by-tag/", {"tag": "run"}).json()["activities"]
+        self.assertIn(activity_id, [row["id"] for row in feed])
+        self.assertIn(activity_id, [row["id"] for row in by_tag])
+
+
+class ConditionalGetTests(FakeFirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.load_activity("act", 0)
+
+    def get(self, path, etag=None, uid=USER):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(path, **headers, **self.auth(uid))
+
+    def test_unchanged_feed_is_304_without_firestore(self):
+        etag = self.get("/api/feed/")["ETag"]
+
+        db.reset_rpc_counts()
+        response = self.get("/api/feed/", etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(sum(db.rpc_counts.values()), 0)
+
+    def test_etag_is_per_viewer(self):
+        etag = self.get("/api/feed/")["ETag"]
+        self.assertEqual(self.get("/api/feed/", etag, uid=OTHER).status_code, 200)
+
+    def test_like_and_comment_change_the_etag(self):
+        etag = self.get("/api/feed/")["ETag"]
+        self.client.post("/api/activity/act/like/", **self.auth())
+        response = self.get("/api/feed/", etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = self.get("/api/activity/act/comments/")["ETag"]
+        self.post_json("/api/activity/act/comment/", {"text": "nice"})
+        self.assertEqual(self.get("/api/activity/act/comments/", etag).status_code, 200)
+
+
+class StreamingTests(FakeFirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            self.load_activity(f"act{i}", i, ["run"])
+
+    def test_ndjson_matches_the_json_page(self):
+        params = {"tag": "run", "limit": 3}
+        page = self.client.get("/api/activities/by-tag/", params).json()
+
+        for extra, headers in (({"stream": 1}, {}), ({}, {"HTTP_ACCEPT": "application/x-ndjson"})):
+            response = self.client.get("/api/activities/by-tag/", {**params, **extra}, **headers)
+            self.assertTrue(response.streaming)
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+            self.assertEqual(lines[:-1], page["activities"])
+            self.assertEqual(lines[-1], {"next_cursor": page["next_cursor"]})
+
+    def test_fields_projects_rows(self):
+        feed = self.client.get("/api/feed/", {"fields": "likes_count,tags"}).json()["feed"]
+        self.assertEqual(len(feed), 5)
+        self.assertEqual({tuple(row) for row in feed}, {("id", "tags", "likes_count")})
+
+    def test_unknown_field_is_400(self):
+        response = self.client.get("/api/activities/by-tag/", {"tag": "run", "fields": "likes_count"})
+        self.assertEqual(response.status_code, 400)
+
+
+class LiveTests(FakeFirestoreTestCase):
+    def test_wsgi_is_told_to_poll(self):
+        for path in ("/api/live/feed/", "/api/async/live/feed/"):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["error"], ASGI_REQUIRED)
+
+    async def test_asgi_is_sent_to_the_async_stream(self):
+        response = await AsyncClient().get("/api/live/activities/by-tag/", {"tag": "run"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "/api/async/live/activities/by-tag/?tag=run")
+
+
+class SyncTests(FakeFirestoreTestCase):
+    def test_retried_sync_creates_one_activity(self):
+        body = {"tags": ["run", "park"], "client_id": "device-1:42", "lat": 52.23, "lng": 21.01}
+
+        first = self.post_json("/api/sync/", body).json()
+        retry = self.post_json("/api/sync/", body).json()
+
+        self.assertEqual(first["status"], "success")
+        self.assertTrue(retry["duplicate"])
+        self.assertEqual(retry["activity_id"], first["activity_id"])
+        self.assertEqual(len(list(db.collection("activities").stream())), 1)
+        self.assertEqual(db.collection("tag_stats").document("run").get().to_dict()["count"], 1)
+
+    def test_bulk_sync_skips_already_synced_keys(self):
+        items = [{"tags": ["run"], "client_id": f"device-1:{i}"} for i in range(3)]
+        self.post_json("/api/sync/bulk/", {"activities": items[:2]})
+        result = self.post_json("/api/sync/bulk/", {"activities": items}).json()
+
+        self.assertEqual(result["committed"], 1)
+        self.assertEqual(result["duplicates"], 2)
+        self.assertEqual(len(list(db.collection("activities").stream())), 3)
+        self.assertEqual(db.collection("tag_stats").document("run").get().to_dict()["count"], 3)
+
+    def test_malformed_payload_is_400(self):
+        response = self.post_json("/api/sync/", {"tags": "run"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(db.collection("activities").stream()), [])
+
+
+class TagPlannerTests(FakeFirestoreTestCase):
+    VOCABULARY = [f"tag{i}" for i in range(15)]
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(7)
+        self.tags = {}
+        batch = db.batch()
+        for i in range(120):
+            tags = rng.sample(self.VOCABULARY, rng.randint(1, 4))
+            self.tags[f"act{i:03d}"] = set(tags)
+            self.load_activity(f"act{i:03d}", rng.randint(0, 50), tags)
+            views.tag_count_updates(batch, tags)
+        batch.commit()
+
+    def walk(self, planner, tags, limit):
+        seen, cursor = [], None
+        while True:
+            docs, cursor = planner(tags, cursor and decode_cursor(cursor), limit)
+            seen += [doc.id for doc in docs]
+            if not cursor:
+                return seen
+
+    def newest_first(self, ids):
+        return sorted(ids, key=lambda i: (self.activity(i)["time_start"], i), reverse=True)
+
+    def test_any_matches_brute_force_across_chunks(self):
+        # More tags than one array_contains_any chunk
+        tags = self.VOCABULARY[:12]
+        expected = [i for i, t in self.tags.items() if t & set(tags)]
+        self.assertEqual(self.walk(query_tags_any, tags, 9), self.newest_first(expected))
+
+    def test_all_matches_brute_force(self):
+        tags = ["tag1", "tag2"]
+        expected = [i for i, t in self.tags.items() if t >= set(tags)]
+        self.assertTrue(expected)
+        self.assertEqual(self.walk(query_tags_all, tags, 3), self.newest_first(expected))
+
+    def test_all_with_an_unused_tag_is_empty(self):
+        self.assertEqual(query_tags_all(["tag1", "nobody-uses-this"], None, 10), ([], None))
+
+
+class NearbyTests(FakeFirestoreTestCase):
+    CENTER = (52.2297, 21.0122)
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(3)
+        self.distances = {}
+        for i in range(300):
+            lat = self.CENTER[0] + rng.uniform(-0.15, 0.15)
+            lng = self.CENTER[1] + rng.uniform(-0.25, 0.25)
+            self.distances[f"act{i:03d}"] = haversine_km(*self.CENTER, lat, lng)
+            self.load_activity(f"act{i:03d}", i, lat=lat, lng=lng)
+        self.load_activity("no-location", 0)
+
+    def test_returns_everything_inside_the_radius_nearest_first(self):
+        for radius_km in (0.5, 2, 5, 9):
+            response = self.client.get("/api/activities/nearby/", {
+                "lat": self.CENTER[0], "lng": self.CENTER[1], "radius_km": radius_km, "limit": 100,
+            }).json()
+
+            expected = sorted(
+                (d, i) for i, d in self.distances.items() if d <= radius_km
+            )[:100]
+            self.assertEqual([row["id"] for row in response["activities"]], [i for _, i in expected])
+            self.assertTrue(all(row["distance_km"] <= radius_km for row in response["activities"]))
+            self.assertFalse(response["truncated"])
+
+    def test_invalid_radius_is_400(self):
+        params = {"lat": self.CENTER[0], "lng": self.CENTER[1]}
+        self.assertEqual(self.client.get("/api/activities/nearby/", {**params, "radius_km": 0}).status_code, 400)
+        self.assertEqual(self.client.get("/api/activities/nearby/", {"lat": 91, "lng": 0}).status_code, 400)
+
+    def test_cursor_is_400(self):
+        params = {"lat": self.CENTER[0], "lng": self.CENTER[1], "cursor": "act000"}
+        self.assertEqual(self.client.get("/api/activities/nearby/", params).status_code, 400)
+
+
+class PartnerTests(FakeFirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        db.load(f"users/{USER}", {"tags": ["run", "yoga", "chess"], "city": "Warsaw"})
+        db.load(f"users/{OTHER}", {"tags": ["run", "yoga"], "city": "Warsaw"})
+        db.load("users/user-c", {"tags": ["opera"], "city": "Warsaw"})
+        display_name_cache.put_many({uid: uid for uid in ("user-c", "user-d", "user-e")})
+
+    def test_ranks_by_jaccard_within_the_city(self):
+        db.load("users/user-d", {"tags": ["run", "yoga", "chess"], "city": "Krakow"})
+        db.load("users/user-e", {"tags": ["run", "yoga", "chess", "opera"], "city": "Warsaw"})
+
+        partners = self.client.get("/api/partners/", **self.auth()).json()["partners"]
+        self.assertEqual([(p["uid"], p["similarity"]) for p in partners], [
+            ("user-d", 1.0), ("user-e", 0.75), (OTHER, 0.667),
+        ])
+
+        partners = self.client.get("/api/partners/", {"city": "Warsaw"}, **self.auth()).json()["partners"]
+        self.assertEqual([p["uid"] for p in partners], ["user-e", OTHER])
+
+    def test_tag_changes_apply_without_a_rebuild(self):
+        self.client.get("/api/partners/", **self.auth())
+        builds = partner_index.stats()["builds"]
+        self.client.post("/api/user/user-c/add-tags/run,yoga/")
+
+        partners = self.client.get("/api/partners/", **self.auth()).json()["partners"]
+        self.assertEqual({p["uid"] for p in partners}, {OTHER, "user-c"})
+        self.assertEqual(partner_index.stats()["builds"], builds)
+
+    def test_forked_worker_rebuilds_instead_of_waiting_on_the_parents_build(self):
+        class StalledClient:
+            """The parent's build: still streaming users/ when the worker forks."""
+            released = threading.Event()
+
+            def collection(self, name):
+                self.released.wait()
+                return db.collection(name)
+
+        partner_index.start(StalledClient())
+        # What os.register_at_fork runs in a gunicorn --preload worker
+        partner_index._after_fork()
+        response = self.client.get("/api/partners/", **self.auth())
+        StalledClient.released.set()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["uid"] for p in response.json()["partners"]], [OTHER])
+
+
+class VerifiedTokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        token_cache.clear()
+
+    def test_verified_tokens_are_reused_until_they_expire(self):
+        claims = {"uid": USER, "exp": time.time() + 60}
+        with mock.patch("api.auth.auth.verify_id_token", return_value=claims) as verify:
+            self.assertEqual(verify_token("token"), claims)
+            self.assertEqual(verify_token("token"), claims)
+            self.assertEqual(verify.call_count, 1)
+
+            claims["exp"] = time.time() - 1
+            verify_token("token")
+            self.assertEqual(verify.call_count, 2)
+
+    def test_rejected_tokens_are_not_cached(self):
+        with mock.patch("api.auth.auth.verify_id_token", side_effect=ValueError) as verify:
+            for _ in range(2):
+                response = self.client.get("/api/feed/", {"mode": "personal"}, HTTP_AUTHORIZATION="Bearer bad")
+                self.assertEqual(response.status_code, 401)
+            self.assertEqual(verify.call_count, 2)
+        self.assertEqual(token_cache.stats()["entries"], 0)
+
+
+class DisplayNameTests(SimpleTestCase):
+    def setUp(self):
+        display_name_cache.clear()
+
+    @staticmethod
+    def get_users(identifiers):
+        users = [
+            SimpleNamespace(uid=i.uid, display_name="" if i.uid == "unnamed" else f"Name {i.uid}")
+            for i in identifiers if i.uid != "deleted"
+        ]
+        return SimpleNamespace(users=users)
+
+    def test_names_are_fetched_in_batches_and_cached(self):
+        uids = [f"u{i:03d}" for i in range(150)] + ["unnamed", "deleted"]
+        with mock.patch("api.display_names.auth.get_users", side_effect=self.get_users) as get_users:
+            names = get_display_names(uids)
+            self.assertEqual(get_users.call_count, 2)
+
+            self.assertEqual(names["u007"], "Name u007")
+            self.assertEqual(names["unnamed"], "User")
+            self.assertEqual(names["deleted"], "User")
+
+            self.assertEqual(get_display_names(uids), names)
+            self.assertEqual(get_users.call_count, 2)
+
+
+class WeatherCacheTests(SimpleTestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        cache = WeatherCache(ttl=60, stale_ttl=60, max_entries=10)
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait()
+            return "timeline"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("cell", fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        self.wait_for(lambda: cache.stats()["misses"] == 8)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["timeline"] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_entries_are_served_while_they_refresh(self):
+        cache = WeatherCache(ttl=0, stale_ttl=60, max_entries=10)
+        cache.store("cell", "old")
+        calls = []
+
+        self.assertEqual(cache.get("cell", lambda: calls.append(1) or "new"), "old")
+        self.wait_for(lambda: cache.peek("cell")[0] == "new")
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_refresh_keeps_the_stale_entry(self):
+        cache = WeatherCache(ttl=0, stale_ttl=60, max_entries=10)
+        cache.store("cell", "old")
+
+        def fail():
+            raise ConnectionError("upstream down")
+
+        with mock.patch("builtins.print"):
+            self.assertEqual(cache.get("cell", fail), "old")
+            self.wait_for(lambda: cache.stats()["upstream_errors"] == 1)
+        self.assertEqual(cache.get("cell", lambda: "new"), "old")
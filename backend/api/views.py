@@ -1,37 +1,76 @@
+import hashlib
 import json
-import requests
-from django.http import JsonResponse
+from collections import Counter
+from django.http import HttpResponseRedirect, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from firebase_admin import auth, firestore
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, NotFound
 from api import db
-from django.conf import settings
+from api.auth import get_uid_from_request
+from api.conditional import not_modified, page_validators, page_version, with_validators
+from api.display_names import get_display_name, get_display_names
+from api.geo import activity_geo_fields, covering_geohashes, haversine_km, parse_lat_lng
+from api.live import ASGI_REQUIRED, served_over_asgi
+from api.pagination import (
+    InvalidCursor,
+    PageStream,
+    decode_cursor,
+    decode_rank_cursor,
+    get_page_params,
+    paginate,
+)
+from api.partners import partner_index
+from api.personalize import personal_page
+from api.ranking import (
+    RAIN_AVOID_TAGS,
+    RAIN_FRIENDLY_TAGS,
+    SUN_FRIENDLY_TAGS,
+    get_candidate_pool,
+    ranked_page,
+)
+from api.response_cache import ACTIVITIES, CANDIDATES, response_cache, tag_namespace
+from api.serializers import (
+    FEED_FIELDS,
+    TAG_FIELDS,
+    activity_row,
+    apply_comment_display_names,
+    comment_item,
+    feed_item,
+    get_fields_param,
+    ndjson_response,
+    projection,
+    wants_ndjson,
+)
+from api.tag_query import (
+    ANY_CHUNK_SIZE,
+    query_tags_all,
+    query_tags_any,
+    tag_count_increments,
+    tag_count_updates,
+)
+from api.weather import fetch_weather_timeline, weather_base_score, weather_flags
 
 # ============================================================
 # Helpers
 # ============================================================
 
-def get_uid_from_request(request):
+# UIDs whose users/{uid} document is known to exist in this process
+_known_profiles = set()
+KNOWN_PROFILES_MAX = 100_000
+
+
+def ensure_user_profile(uid):
     """
-    Extract Firebase ID token from Authorization header.
-    Used only where the UID comes from token, not URL.
+    Make sure users/{uid} exists without reading it first.
+    create() is a single write that fails with AlreadyExists when the
+    profile is there; after that the UID is remembered, so steady-state
+    writes cost no extra round trip at all.
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
-        return None, JsonResponse({"error": "Missing Authorization header"}, status=401)
+    if uid in _known_profiles:
+        return
 
     try:
-        token = auth_header.split(" ")[1]
-        decoded = auth.verify_id_token(token)
-        return decoded["uid"], None
-    except Exception:
-        return None, JsonResponse({"error": "Invalid token"}, status=401)
-
-
-def ensure_user_profile(uid):
-    user_ref = db.collection("users").document(uid)
-    doc = user_ref.get()
-    if not doc.exists:
-        user_ref.set({
+        db.collection("users").document(uid).create({
             "uid": uid,
             "tags": [],
             "description": "",
@@ -39,14 +78,203 @@ def ensure_user_profile(uid):
             "display_name": "",
             "created_at": firestore.SERVER_TIMESTAMP,
         })
+    except AlreadyExists:
+        pass
 
+    if len(_known_profiles) >= KNOWN_PROFILES_MAX:
+        _known_profiles.clear()
+    _known_profiles.add(uid)
+
+
+def get_liked_activity_ids(uid, activity_ids):
+    """
+    Return the subset of `activity_ids` the user has liked.
+    Resolved with a single batched get_all() over the likes/{uid} docs,
+    so a page costs one round trip regardless of its size.
+    """
+    if not uid or not activity_ids:
+        return set()
+
+    like_refs = [
+        db.collection("activities").document(activity_id).collection("likes").document(uid)
+        for activity_id in activity_ids
+    ]
+    return {
+        snap.reference.parent.parent.id
+        for snap in db.get_all(like_refs)
+        if snap.exists
+    }
+
+
+def invalidate_activity_pages(activities):
+    """Drop the cached pages that can show these activities: the feed and their tags."""
+    response_cache.invalidate(ACTIVITIES)
+    for tag in {tag for activity in activities for tag in activity.get("tags") or []}:
+        response_cache.invalidate(tag_namespace(tag))
+
+
+def invalidate_added_activities(activities):
+    """invalidate_activity_pages() for new activities, plus personal-feed candidates."""
+    response_cache.invalidate(CANDIDATES)
+    invalidate_activity_pages(activities)
+
+
+def invalidate_summary(activity_ref, activity=None):
+    """
+    A like or comment changed the activity's summary; drop the pages that
+    show it. `activity` (with its tags) is read when the caller has none.
+    """
+    if activity is None:
+        activity = activity_ref.get(["tags"]).to_dict() or {}
+    invalidate_activity_pages([activity])
+
+
+def with_user_liked(payload, rows_key, uid, cache_key):
+    """
+    Fill in the per-user part (user_liked) of a cached, anonymous payload.
+    The caller's liked set for this page is cached next to the page.
+    """
+    rows = payload[rows_key]
+    if not uid or not rows or "user_liked" not in rows[0]:
+        return payload
+
+    liked_ids = response_cache.get_user_part(cache_key, uid)
+    if liked_ids is None:
+        liked_ids = get_liked_activity_ids(uid, [row["id"] for row in rows])
+        response_cache.set_user_part(cache_key, uid, liked_ids)
+
+    return {**payload, rows_key: [{**row, "user_liked": row["id"] in liked_ids} for row in rows]}
 
-def get_display_name_or_default(uid):
-    try:
-        fb_user = auth.get_user(uid)
-        return fb_user.displayName or "User"
-    except Exception:
-        return "User"
+
+def feed_display_names(feed):
+    """Names of every participant and last commenter on a feed page."""
+    uids = []
+    for item in feed:
+        uids.extend(item.get("participants") or [])
+        if item.get("last_comment"):
+            uids.append(item["last_comment"].get("user_id"))
+    return get_display_names(uids)
+
+
+# ============================================================
+# Response rows (the shared row builders live in api.serializers)
+# ============================================================
+
+def ai_feed_item(activity_id, act, user_liked, timeline, ai_score, rank_score, distance_km):
+    item = feed_item(activity_id, act, user_liked)
+    item["ai_score"] = ai_score
+    item["rank_score"] = rank_score
+    item["distance_km"] = distance_km
+    item["weather_now"] = timeline.current
+    item["weather_at_start"] = timeline.at(act.get("time_start"))
+    return item
+
+
+def parse_tags(raw):
+    return [t.strip() for t in raw.split(",") if t.strip()]
+
+
+def activity_rows(docs, uid, fields):
+    """Rows for a page of activity snapshots; likes only when requested."""
+    liked_ids = set()
+    if "user_liked" in fields:
+        liked_ids = get_liked_activity_ids(uid, [doc.id for doc in docs])
+    return [activity_row(doc.id, doc.to_dict(), doc.id in liked_ids, fields) for doc in docs]
+
+
+def stream_activity_rows(docs, uid, fields, trailer):
+    """NDJSON activity rows; likes are resolved per streamed chunk."""
+    def build_rows(chunk):
+        return activity_rows(chunk, uid, fields)
+
+    return ndjson_response(docs, build_rows, trailer)
+
+
+# ============================================================
+# Activity summary (likes_count / comments_count / last_comment)
+# ============================================================
+#
+# Every activity document carries a small denormalised summary so the
+# feed can be rendered from the activity documents alone. The write
+# endpoints below keep it in sync atomically with the likes / comments
+# subcollections; `manage.py backfill_activities` rebuilds it.
+
+def activity_summary_defaults():
+    return {
+        "likes_count": 0,
+        "comments_count": 0,
+        "last_comment": None,
+    }
+
+
+def last_comment_summary(comment_id, comment):
+    return {
+        "id": comment_id,
+        "user_id": comment.get("user_id"),
+        "user_display_name": comment.get("user_display_name"),
+        "text": comment.get("text"),
+        "timestamp": comment.get("timestamp"),
+    }
+
+
+@firestore.transactional
+def _like_in_transaction(transaction, activity_ref, uid, display_name):
+    like_ref = activity_ref.collection("likes").document(uid)
+    if like_ref.get(transaction=transaction).exists:
+        return False
+
+    transaction.set(like_ref, {
+        "user_id": uid,
+        "user_display_name": display_name,
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    transaction.update(activity_ref, {"likes_count": firestore.Increment(1)})
+    return True
+
+
+@firestore.transactional
+def _unlike_in_transaction(transaction, activity_ref, uid):
+    like_ref = activity_ref.collection("likes").document(uid)
+    if not like_ref.get(transaction=transaction).exists:
+        return False
+
+    transaction.delete(like_ref)
+    transaction.update(activity_ref, {"likes_count": firestore.Increment(-1)})
+    return True
+
+
+@firestore.transactional
+def _delete_comment_in_transaction(transaction, activity_ref, comment_id, uid):
+    comment_ref = activity_ref.collection("comments").document(comment_id)
+    comment_doc = comment_ref.get(transaction=transaction)
+
+    if not comment_doc.exists:
+        return "not_found", None
+    if comment_doc.to_dict().get("user_id") != uid:
+        return "forbidden", None
+
+    updates = {"comments_count": firestore.Increment(-1)}
+
+    # Only look for a replacement when the deleted comment is the one
+    # embedded in the summary.
+    activity = activity_ref.get(transaction=transaction).to_dict() or {}
+    last_comment = activity.get("last_comment") or {}
+    if last_comment.get("id") == comment_id:
+        newest = (
+            activity_ref.collection("comments")
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .limit(2)
+        )
+        replacement = None
+        for d in transaction.get(newest):
+            if d.id != comment_id:
+                replacement = last_comment_summary(d.id, d.to_dict())
+                break
+        updates["last_comment"] = replacement
+
+    transaction.delete(comment_ref)
+    transaction.update(activity_ref, updates)
+    return "deleted", activity
 
 
 # ============================================================
@@ -66,20 +294,27 @@ def sync_offline_activity(request):
 
     try:
         data = json.loads(request.body)
-        friend_uid = data.get("friend_uid")
-
-        activity_ref = db.collection("activities").document()
-        activity_ref.set({
-            "participants": list(filter(None, [uid, friend_uid])),
-            "tags": data.get("tags", []),
-            "description": data.get("description", ""),
-            "location": {
-                "lat": data.get("lat"),
-                "lng": data.get("lng")
-            },
-            "time_start": firestore.SERVER_TIMESTAMP,
-            "time_end": data.get("time_end")
-        })
+        problem = validate_activity_payload(data)
+        if problem:
+            return JsonResponse({"error": problem}, status=400)
+
+        activity = build_activity(uid, data)
+
+        client_id = get_client_id(request, data)
+        if not is_valid_client_id(client_id):
+            return JsonResponse({"error": CLIENT_ID_ERROR}, status=400)
+
+        batch = db.batch()
+        activity_ref = activity_ref_for(uid, client_id)
+        queue_activity_writes(batch, activity_ref, activity)
+
+        try:
+            batch.commit()
+        except AlreadyExists:
+            # A retry of a request that already went through
+            return JsonResponse({"status": "success", "activity_id": activity_ref.id, "duplicate": True})
+
+        invalidate_added_activities([activity])
 
         return JsonResponse({"status": "success", "activity_id": activity_ref.id})
 
@@ -88,35 +323,295 @@ def sync_offline_activity(request):
 
 
 
+def build_activity(uid, data):
+    """Activity document for a synced encounter posted by `uid`."""
+    friend_uid = data.get("friend_uid")
+
+    return {
+        "participants": list(filter(None, [uid, friend_uid])),
+        "tags": data.get("tags", []),
+        "description": data.get("description", ""),
+        "location": {
+            "lat": data.get("lat"),
+            "lng": data.get("lng")
+        },
+        "time_start": firestore.SERVER_TIMESTAMP,
+        "time_end": data.get("time_end"),
+        **activity_geo_fields(data.get("lat"), data.get("lng")),
+        **activity_summary_defaults(),
+    }
+
+
+def timeline_entry(activity_id, act):
+    """Compact copy of an activity kept in users/{uid}/timeline/{activity_id}."""
+    return {
+        "activity_id": activity_id,
+        # Old seed data only has `timestamp`
+        "time_start": act.get("time_start") or act.get("timestamp"),
+        "time_end": act.get("time_end"),
+        "participants": act.get("participants", []),
+        "tags": act.get("tags", []),
+        "description": act.get("description") or act.get("user_comment", ""),
+        "location": act.get("location", {}),
+    }
+
+
+def queue_activity_writes(batch, activity_ref, activity, count_tags=True):
+    """
+    Everything a new activity writes, queued on one batch so it commits
+    atomically: the activity itself, a timeline entry per participant and
+    (unless the caller aggregates them itself) the tag_stats counters.
+    """
+    # create(): the whole batch fails with AlreadyExists if the activity is
+    # already there, which is what makes client-keyed retries idempotent
+    batch.create(activity_ref, activity)
+
+    entry = timeline_entry(activity_ref.id, activity)
+    for participant in activity["participants"]:
+        batch.set(
+            db.collection("users").document(participant).collection("timeline").document(activity_ref.id),
+            entry,
+        )
+
+    if count_tags:
+        tag_count_updates(batch, activity["tags"])
+
+
+def activity_ref_for(uid, client_id):
+    """
+    Document for a new activity. With a client-supplied idempotency key the
+    id is derived from (uid, key), so a retried request addresses the same
+    document and one user's keys can never collide with another's.
+    """
+    activities_ref = db.collection("activities")
+    if client_id is None:
+        return activities_ref.document()
+
+    digest = hashlib.sha256(f"{uid}:{client_id}".encode()).hexdigest()
+    return activities_ref.document(digest[:20])
+
+
+CLIENT_ID_ERROR = "client_id must be a string of 1-128 characters"
+
+
+def is_valid_client_id(client_id):
+    return client_id is None or (isinstance(client_id, str) and 0 < len(client_id) <= 128)
+
+
+def get_client_id(request, data):
+    """Idempotency key from the body (client_id) or the Idempotency-Key header."""
+    client_id = data.get("client_id") if isinstance(data, dict) else None
+    if client_id is None:
+        client_id = request.headers.get("Idempotency-Key")
+    return client_id
+
+
+def activity_write_count(activity):
+    """Documents queue_activity_writes() touches, excluding tag counters."""
+    return 1 + len(activity["participants"])
+
+
+def validate_activity_payload(data):
+    """Return an error message for a malformed sync payload, else None."""
+    if not isinstance(data, dict):
+        return "Activity must be an object"
+
+    tags = data.get("tags", [])
+    if not isinstance(tags, list) or not all(isinstance(t, str) and t.strip() for t in tags):
+        return "tags must be a list of non-empty strings"
+
+    if not isinstance(data.get("description", ""), str):
+        return "description must be a string"
+
+    if not is_valid_client_id(data.get("client_id")):
+        return CLIENT_ID_ERROR
+
+    friend_uid = data.get("friend_uid")
+    if friend_uid is not None and (not isinstance(friend_uid, str) or not friend_uid or "/" in friend_uid):
+        return "friend_uid must be a user id"
+
+    lat, lng = data.get("lat"), data.get("lng")
+    if (lat is not None or lng is not None) and parse_lat_lng(lat, lng)[0] is None:
+        return "lat/lng must be valid coordinates"
+
+    return None
+
+
+# Firestore caps a write batch at 500 operations
+MAX_BATCH_WRITES = 500
+MAX_BULK_ACTIVITIES = 500
+
+
+@csrf_exempt
+def sync_offline_activities_bulk(request):
+    """
+    Flush a backlog of offline activities in one request.
+
+    Body: {"activities": [{...same fields as /api/sync/...}, ...]}
+    Every item is validated up front; valid ones are committed in write
+    batches of at most 500 operations (each activity stays atomic with
+    its timeline entries). Items carrying a client_id are idempotent:
+    already-synced ones come back with their original activity_id and
+    "duplicate": true. Returns one result per input item, in order.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST only"}, status=405)
+
+    uid, error = get_uid_from_request(request)
+    if error:
+        return error
+
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    items = body.get("activities") if isinstance(body, dict) else body
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "Expected a non-empty \"activities\" list"}, status=400)
+    if len(items) > MAX_BULK_ACTIVITIES:
+        return JsonResponse({"error": f"At most {MAX_BULK_ACTIVITIES} activities per request"}, status=400)
+
+    ensure_user_profile(uid)
+
+    results = [None] * len(items)
+    pending = []  # (index, activity_ref, activity)
+    seen = {}     # activity id -> index of its first occurrence in this request
+    for index, data in enumerate(items):
+        problem = validate_activity_payload(data)
+        if problem:
+            results[index] = {"index": index, "error": problem}
+            continue
+
+        activity_ref = activity_ref_for(uid, data.get("client_id"))
+        if activity_ref.id in seen:
+            results[index] = {"index": index, "activity_id": activity_ref.id, "duplicate": True}
+            continue
+        seen[activity_ref.id] = index
+        pending.append((index, activity_ref, build_activity(uid, data)))
+
+    # Keys already synced by an earlier (retried) request: one batched read
+    keyed = [ref for index, ref, _ in pending if items[index].get("client_id") is not None]
+    if keyed:
+        existing = {snap.id for snap in db.get_all(keyed) if snap.exists}
+        for index, activity_ref, _ in pending:
+            if activity_ref.id in existing:
+                results[index] = {"index": index, "activity_id": activity_ref.id, "duplicate": True}
+        pending = [item for item in pending if item[1].id not in existing]
+
+    # Pack activities into batches; tag counters are summed per batch so
+    # each tag_stats doc is written once per commit.
+    chunks = []
+    chunk, writes, tags = [], 0, Counter()
+    for item in pending:
+        activity = item[2]
+        chunk_tags = tags + Counter(set(activity["tags"]))
+        if chunk and writes + activity_write_count(activity) + len(chunk_tags) > MAX_BATCH_WRITES:
+            chunks.append((chunk, tags))
+            chunk, writes, chunk_tags = [], 0, Counter(set(activity["tags"]))
+        chunk.append(item)
+        writes += activity_write_count(activity)
+        tags = chunk_tags
+    if chunk:
+        chunks.append((chunk, tags))
+
+    committed = 0
+    for chunk, tags in chunks:
+        batch = db.batch()
+        for _, activity_ref, activity in chunk:
+            queue_activity_writes(batch, activity_ref, activity, count_tags=False)
+        tag_count_increments(batch, tags)
+
+        try:
+            batch.commit()
+            committed += len(chunk)
+            for index, activity_ref, _ in chunk:
+                results[index] = {"index": index, "activity_id": activity_ref.id}
+        except AlreadyExists:
+            # A concurrent retry won the race for one of the keys; fall back
+            # to one batch per activity so the others still land.
+            for index, activity_ref, activity in chunk:
+                single = db.batch()
+                queue_activity_writes(single, activity_ref, activity)
+                try:
+                    single.commit()
+                    committed += 1
+                    results[index] = {"index": index, "activity_id": activity_ref.id}
+                except AlreadyExists:
+                    results[index] = {"index": index, "activity_id": activity_ref.id, "duplicate": True}
+                except Exception as e:
+                    results[index] = {"index": index, "error": str(e)}
+        except Exception as e:
+            for index, _, _ in chunk:
+                results[index] = {"index": index, "error": str(e)}
+
+    if committed:
+        invalidate_added_activities(
+            activity for index, _, activity in pending
+            if "activity_id" in results[index] and not results[index].get("duplicate")
+        )
+
+    failed = sum(1 for r in results if "error" in r)
+    return JsonResponse({
+        "status": "success" if not failed else "partial",
+        "committed": committed,
+        "duplicates": len(items) - committed - failed,
+        "failed": failed,
+        "results": results,
+    })
+
+
 @csrf_exempt
 def get_activities_by_user(request, uid):
+    viewer_uid, _ = get_uid_from_request(request)
+
+    limit, cursor, error = get_page_params(request, default_limit=20)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
+
     try:
-        activities = (
-            db.collection("activities")
-            .where("participants", "array_contains", uid)
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .stream()
+        # One ordered range read over the user's own timeline index
+        timeline_ref = db.collection("users").document(uid).collection("timeline")
+        query = (
+            timeline_ref
+            .select(projection(fields))
+            .order_by("time_start", direction=firestore.Query.DESCENDING)
         )
 
-        result = []
-        for doc in activities:
-            data = doc.to_dict()
-            ts = data.get("timestamp")
-            ts = ts.isoformat() if ts else None
-
-            result.append({
-                "id": doc.id,
-                "type": data.get("type"),
-                "participants": data.get("participants", []),
-                "location": data.get("location", {}),
-                "comment": data.get("user_comment", ""),
-                "tags": data.get("tags", []),
-                "likes": data.get("likes", []),
-                "timestamp": ts,
-            })
-
-        return JsonResponse({"activities": result}, safe=False)
+        if wants_ndjson(request):
+            stream = PageStream(query, timeline_ref, cursor, limit)
+            return stream_activity_rows(
+                stream, viewer_uid, fields, lambda: {"next_cursor": stream.next_cursor}
+            )
+
+        entries, next_cursor = paginate(query, timeline_ref, cursor, limit)
+
+        # Timeline entries do not change when the viewer likes an activity,
+        # so with user_liked the likes lookup has to run before validating
+        result, liked = None, ()
+        if viewer_uid and "user_liked" in fields:
+            result = activity_rows(entries, viewer_uid, fields)
+            liked = sorted(row["id"] for row in result if row["user_liked"])
+
+        validators = page_validators(page_version(entries, next_cursor, *liked), viewer_uid)
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        if result is None:
+            result = activity_rows(entries, viewer_uid, fields)
 
+        return with_validators(
+            JsonResponse({"activities": result, "next_cursor": next_cursor}, safe=False),
+            validators,
+        )
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         print("[ERROR get_activities_by_user]", e)
         return JsonResponse({"error": str(e)}, status=500)
@@ -126,70 +621,101 @@ def get_activities_by_user(request, uid):
 # Feed (Original)
 # ============================================================
 
+FEED_MODES = ("recent", "personal")
+
+
 def get_feed(request):
-    uid, _ = get_uid_from_request(request)
+    uid, auth_error = get_uid_from_request(request)
 
-    try:
-        docs = (
-            db.collection("activities")
-            .order_by("time_start", direction=firestore.Query.DESCENDING)
-            .limit(10)
-            .stream()
-        )
+    mode = request.GET.get("mode", "recent")
+    if mode not in FEED_MODES:
+        return JsonResponse({"error": f"Invalid ?mode= (one of: {', '.join(FEED_MODES)})"}, status=400)
+    if mode == "personal" and auth_error:
+        return auth_error
 
-        feed = []
+    limit, cursor, error = get_page_params(
+        request, decode=decode_rank_cursor if mode == "personal" else decode_cursor
+    )
+    if error:
+        return error
 
-        for doc in docs:
-            act = doc.to_dict()
-            activity_id = doc.id
+    fields, error = get_fields_param(request, FEED_FIELDS)
+    if error:
+        return error
 
-            ts_start = act.get("time_start")
-            ts_end = act.get("time_end")
+    if mode == "personal":
+        return personal_feed(uid, limit, cursor, fields)
 
-            # Likes
-            likes_ref = db.collection("activities").document(activity_id).collection("likes")
-            likes_count = len(list(likes_ref.stream()))
+    try:
+        cache_key = response_cache.make_key(
+            ACTIVITIES, request.path,
+            {"limit": limit, "cursor": cursor, "fields": ",".join(fields)},
+        )
+        # Cached as (page_version, payload) so hits validate without Firestore
+        cached = response_cache.get(cache_key)
+
+        if cached is None:
+            activities_ref = db.collection("activities")
+            query = (
+                activities_ref
+                .select(projection(fields))
+                .order_by("time_start", direction=firestore.Query.DESCENDING)
+            )
+            docs, next_cursor = paginate(query, activities_ref, cursor, limit)
+            version = page_version(docs, next_cursor)
+        else:
+            version, payload = cached
+
+        validators = page_validators(version, uid)
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        if cached is None:
+            feed = [activity_row(doc.id, doc.to_dict(), False, fields) for doc in docs]
+            payload = {
+                "feed": feed,
+                "display_names": feed_display_names(feed),
+                "next_cursor": next_cursor,
+            }
+            response_cache.set(cache_key, (version, payload))
+
+        return with_validators(JsonResponse(with_user_liked(payload, "feed", uid, cache_key)), validators)
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
 
-            user_liked = False
-            if uid:
-                user_liked = likes_ref.document(uid).get().exists
 
-            # Comments
-            comments_ref = db.collection("activities").document(activity_id).collection("comments")
-            comments_count = len(list(comments_ref.stream()))
+def personal_feed(uid, limit, cursor, fields):
+    """get_feed?mode=personal: the caller's candidates in rank order (api.personalize)."""
+    try:
+        profile, ranked, next_cursor = personal_page(db, uid, cursor, limit)
 
-            last_comment = None
-            last_docs = list(
-                comments_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
-                .limit(1)
-                .stream()
-            )
-            if last_docs:
-                c = last_docs[0].to_dict()
-                ts_c = c.get("timestamp")
-                last_comment = {
-                    "user_id": c.get("user_id"),
-                    "user_display_name": c.get("user_display_name"),
-                    "text": c.get("text"),
-                    "timestamp": ts_c.isoformat() if ts_c else None
-                }
-
-            feed.append({
-                "id": activity_id,
-                "tags": act.get("tags"),
-                "description": act.get("description"),
-                "location": act.get("location"),
-                "participants": act.get("participants"),
-                "time_start": ts_start.isoformat() if ts_start else None,
-                "time_end": ts_end.isoformat() if ts_end else None,
-                "likes_count": likes_count,
-                "comments_count": comments_count,
-                "user_liked": uid and user_liked,
-                "last_comment": last_comment
-            })
-
-        return JsonResponse({"feed": feed})
+        liked_ids = set()
+        if "user_liked" in fields:
+            liked_ids = get_liked_activity_ids(uid, [activity_id for activity_id, _, _ in ranked])
 
+        feed = []
+        for activity_id, act, score in ranked:
+            item = activity_row(activity_id, act, activity_id in liked_ids, fields)
+            item["rank_score"] = score
+            item["matched_tags"] = sorted(profile.tags.intersection(act.get("tags") or []))
+            item["co_participants"] = [
+                p for p in act.get("participants") or [] if p in profile.co_participants
+            ]
+            feed.append(item)
+
+        return JsonResponse({
+            "feed": feed,
+            "display_names": feed_display_names(feed),
+            "next_cursor": next_cursor,
+            "mode": "personal",
+        })
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -210,14 +736,14 @@ def like_activity(request, activity_id):
     ensure_user_profile(uid)
 
     try:
-        display_name = get_display_name_or_default(uid)
-        db.collection("activities").document(activity_id).collection("likes").document(uid).set({
-            "user_id": uid,
-            "user_display_name": display_name,
-            "timestamp": firestore.SERVER_TIMESTAMP
-        })
+        display_name = get_display_name(uid)
+        activity_ref = db.collection("activities").document(activity_id)
+        if _like_in_transaction(db.transaction(), activity_ref, uid, display_name):
+            invalidate_summary(activity_ref)
         return JsonResponse({"status": "liked"})
 
+    except NotFound:
+        return JsonResponse({"error": "Activity not found"}, status=404)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -233,8 +759,12 @@ def unlike_activity(request, activity_id):
         return error
 
     try:
-        db.collection("activities").document(activity_id).collection("likes").document(uid).delete()
+        activity_ref = db.collection("activities").document(activity_id)
+        if _unlike_in_transaction(db.transaction(), activity_ref, uid):
+            invalidate_summary(activity_ref)
         return JsonResponse({"status": "unliked"})
+    except NotFound:
+        return JsonResponse({"error": "Activity not found"}, status=404)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -261,47 +791,75 @@ def comment_activity(request, activity_id):
         if not text:
             return JsonResponse({"error": "Empty comment"}, status=400)
 
-        display_name = get_display_name_or_default(uid)
+        display_name = get_display_name(uid)
 
-        ref = db.collection("activities").document(activity_id).collection("comments").document()
-        ref.set({
+        activity_ref = db.collection("activities").document(activity_id)
+        ref = activity_ref.collection("comments").document()
+        comment = {
             "user_id": uid,
             "user_display_name": display_name,
             "text": text,
             "timestamp": firestore.SERVER_TIMESTAMP
+        }
+
+        # Comment + summary land atomically; no reads are needed, so a
+        # write batch is enough (and cheaper than a transaction).
+        batch = db.batch()
+        batch.set(ref, comment)
+        batch.update(activity_ref, {
+            "comments_count": firestore.Increment(1),
+            "last_comment": last_comment_summary(ref.id, comment),
         })
+        batch.commit()
+        invalidate_summary(activity_ref)
 
         return JsonResponse({"status": "comment_added", "comment_id": ref.id})
 
+    except NotFound:
+        return JsonResponse({"error": "Activity not found"}, status=404)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 
 def list_comments(request, activity_id):
+    limit, cursor, error = get_page_params(request, default_limit=20)
+    if error:
+        return error
+
     try:
-        docs = (
-            db.collection("activities")
-            .document(activity_id)
-            .collection("comments")
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .stream()
-        )
+        comments_ref = db.collection("activities").document(activity_id).collection("comments")
+        query = comments_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
+
+        if wants_ndjson(request):
+            stream = PageStream(query, comments_ref, cursor, limit)
 
-        comments = []
-        for d in docs:
-            c = d.to_dict()
-            ts = c.get("timestamp")
-            comments.append({
-                "id": d.id,
-                "user_id": c.get("user_id"),
-                "user_display_name": c.get("user_display_name"),
-                "text": c.get("text"),
-                "timestamp": ts.isoformat() if ts else None
-            })
+            def build_rows(chunk):
+                comments = [comment_item(d.id, d.to_dict()) for d in chunk]
+                apply_comment_display_names(comments, get_display_names(c["user_id"] for c in comments))
+                return comments
 
-        return JsonResponse({"comments": comments})
+            return ndjson_response(stream, build_rows, lambda: {"next_cursor": stream.next_cursor})
 
+        docs, next_cursor = paginate(query, comments_ref, cursor, limit)
+
+        validators = page_validators(page_version(docs, next_cursor))
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        comments = [comment_item(d.id, d.to_dict()) for d in docs]
+        display_names = get_display_names(c["user_id"] for c in comments)
+        apply_comment_display_names(comments, display_names)
+
+        return with_validators(JsonResponse({
+            "comments": comments,
+            "display_names": display_names,
+            "next_cursor": next_cursor,
+        }), validators)
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -317,16 +875,16 @@ def delete_comment(request, activity_id, comment_id):
         return error
 
     try:
-        ref = db.collection("activities").document(activity_id).collection("comments").document(comment_id)
-        doc = ref.get()
+        activity_ref = db.collection("activities").document(activity_id)
+        status, activity = _delete_comment_in_transaction(db.transaction(), activity_ref, comment_id, uid)
 
-        if not doc.exists:
+        if status == "not_found":
             return JsonResponse({"error": "Comment not found"}, status=404)
 
-        if doc.to_dict().get("user_id") != uid:
+        if status == "forbidden":
             return JsonResponse({"error": "Unauthorized"}, status=403)
 
-        ref.delete()
+        invalidate_summary(activity_ref, activity)
         return JsonResponse({"status": "comment_deleted"})
 
     except Exception as e:
@@ -343,32 +901,57 @@ def activities_by_tag(request):
     if not tag:
         return JsonResponse({"error": "Missing ?tag="}, status=400)
 
+    uid, _ = get_uid_from_request(request)
+
+    limit, cursor, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
+
     try:
-        docs = (
-            db.collection("activities")
+        activities_ref = db.collection("activities")
+        query = (
+            activities_ref
             .where("tags", "array_contains", tag)
+            .select(projection(fields))
             .order_by("time_start", direction=firestore.Query.DESCENDING)
-            .limit(50)
-            .stream()
         )
 
-        results = []
-        for doc in docs:
-            a = doc.to_dict()
-            ts = a.get("time_start")
-
-            results.append({
-                "id": doc.id,
-                "participants": a.get("participants"),
-                "tags": a.get("tags"),
-                "description": a.get("description"),
-                "location": a.get("location"),
-                "time_start": ts.isoformat() if ts else None,
-                "time_end": a.get("time_end")
-            })
-
-        return JsonResponse({"activities": results})
+        # Streamed pages go straight to Firestore and skip the response cache
+        if wants_ndjson(request):
+            stream = PageStream(query, activities_ref, cursor, limit)
+            return stream_activity_rows(
+                stream, uid, fields, lambda: {"next_cursor": stream.next_cursor}
+            )
+
+        cache_key = response_cache.make_key(
+            tag_namespace(tag), request.path,
+            {"tag": tag, "limit": limit, "cursor": cursor, "fields": ",".join(fields)},
+        )
+        cached = response_cache.get(cache_key)
+
+        if cached is None:
+            docs, next_cursor = paginate(query, activities_ref, cursor, limit)
+
+            results = [activity_row(doc.id, doc.to_dict(), False, fields) for doc in docs]
+            cached = (page_version(docs, next_cursor), {"activities": results, "next_cursor": next_cursor})
+            response_cache.set(cache_key, cached)
 
+        version, payload = cached
+        validators = page_validators(version, uid)
+        response = not_modified(request, validators)
+        if response:
+            return response
+
+        return with_validators(
+            JsonResponse(with_user_liked(payload, "activities", uid, cache_key)), validators
+        )
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -379,30 +962,34 @@ def activities_by_tags_any(request):
     if not raw:
         return JsonResponse({"error": "Missing ?tags="}, status=400)
 
-    tags = [t.strip() for t in raw.split(",") if t.strip()]
+    tags = parse_tags(raw)
+    if not tags:
+        return JsonResponse({"error": "Missing ?tags="}, status=400)
+
+    uid, _ = get_uid_from_request(request)
+
+    limit, cursor, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
 
     try:
-        first = tags[0]
-        docs = db.collection("activities").where("tags", "array_contains", first).stream()
+        docs, next_cursor = query_tags_any(tags, cursor, limit, select=projection(fields))
 
-        results = []
-        for doc in docs:
-            a = doc.to_dict()
-            if any(t in a.get("tags", []) for t in tags):
-                ts = a.get("time_start")
-                results.append({
-                    "id": doc.id,
-                    "participants": a.get("participants"),
-                    "tags": a.get("tags"),
-                    "description": a.get("description"),
-                    "location": a.get("location"),
-                    "time_start": ts.isoformat() if ts else None,
-                    "time_end": a.get("time_end")
-                })
-
-        results.sort(key=lambda x: x.get("time_start") or "", reverse=True)
-        return JsonResponse({"activities": results})
+        # The planner merges / filters several scans, so the page is
+        # materialised first; rows are still encoded and sent one by one
+        if wants_ndjson(request):
+            return stream_activity_rows(docs, uid, fields, lambda: {"next_cursor": next_cursor})
+
+        results = activity_rows(docs, uid, fields)
 
+        return JsonResponse({"activities": results, "next_cursor": next_cursor})
+
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -413,39 +1000,159 @@ def activities_by_tags_all(request):
     if not raw:
         return JsonResponse({"error": "Missing ?tags="}, status=400)
 
-    tags = [t.strip() for t in raw.split(",") if t.strip()]
+    tags = parse_tags(raw)
+    if not tags:
+        return JsonResponse({"error": "Missing ?tags="}, status=400)
+
+    uid, _ = get_uid_from_request(request)
+
+    limit, cursor, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, TAG_FIELDS)
+    if error:
+        return error
 
     try:
-        first = tags[0]
-        docs = db.collection("activities").where("tags", "array_contains", first).stream()
+        docs, next_cursor = query_tags_all(tags, cursor, limit, select=projection(fields))
+
+        # The planner merges / filters several scans, so the page is
+        # materialised first; rows are still encoded and sent one by one
+        if wants_ndjson(request):
+            return stream_activity_rows(docs, uid, fields, lambda: {"next_cursor": next_cursor})
+
+        results = activity_rows(docs, uid, fields)
+
+        return JsonResponse({"activities": results, "next_cursor": next_cursor})
 
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# ============================================================
+# Nearby
+# ============================================================
+
+MAX_NEARBY_RADIUS_KM = 50
+MAX_NEARBY_CANDIDATES = 1000
+
+
+def activities_nearby(request):
+    lat, lng = parse_lat_lng(request.GET.get("lat"), request.GET.get("lng"))
+    if lat is None:
+        return JsonResponse({"error": "Missing or invalid ?lat=&lng="}, status=400)
+
+    try:
+        radius_km = float(request.GET.get("radius_km", 5))
+    except ValueError:
+        return JsonResponse({"error": "Invalid ?radius_km="}, status=400)
+    if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+        return JsonResponse(
+            {"error": f"?radius_km= must be in (0, {MAX_NEARBY_RADIUS_KM}]"}, status=400
+        )
+
+    uid, _ = get_uid_from_request(request)
+
+    # One page, nearest first: widen ?radius_km= or raise ?limit= instead
+    if request.GET.get("cursor"):
+        return JsonResponse({"error": "?cursor= is not supported here"}, status=400)
+
+    limit, _, error = get_page_params(request, default_limit=50)
+    if error:
+        return error
+
+    fields, error = get_fields_param(request, FEED_FIELDS)
+    if error:
+        return error
+
+    try:
+        # Query the cells covering the circle (finest precision that fits
+        # in MAX_COVER_CELLS, in array_contains_any-sized chunks), then an
+        # exact haversine cut on the candidates. Each chunk is capped at
+        # MAX_NEARBY_CANDIDATES; hitting the cap is reported as `truncated`.
+        cells = covering_geohashes(lat, lng, radius_km)
+        docs = {}
+        truncated = False
+        for i in range(0, len(cells), ANY_CHUNK_SIZE):
+            chunk = list(
+                db.collection("activities")
+                .where("geohash_prefixes", "array_contains_any", cells[i:i + ANY_CHUNK_SIZE])
+                .select(projection(fields, "location"))
+                .limit(MAX_NEARBY_CANDIDATES + 1)
+                .stream()
+            )
+            if len(chunk) > MAX_NEARBY_CANDIDATES:
+                truncated = True
+                chunk = chunk[:MAX_NEARBY_CANDIDATES]
+            for doc in chunk:
+                docs.setdefault(doc.id, doc)
+
+        nearby = []
+        for doc in docs.values():
+            act = doc.to_dict()
+            loc = act.get("location") or {}
+            a_lat, a_lng = parse_lat_lng(loc.get("lat"), loc.get("lng"))
+            if a_lat is None:
+                continue
+
+            distance = haversine_km(lat, lng, a_lat, a_lng)
+            if distance <= radius_km:
+                nearby.append((distance, doc.id, act))
+
+        nearby.sort(key=lambda x: x[0])
+        nearby = nearby[:limit]
+
+        liked_ids = set()
+        if "user_liked" in fields:
+            liked_ids = get_liked_activity_ids(uid, [activity_id for _, activity_id, _ in nearby])
         results = []
-        for doc in docs:
-            a = doc.to_dict()
-
-            if all(t in a.get("tags", []) for t in tags):
-                ts = a.get("time_start")
-                results.append({
-                    "id": doc.id,
-                    "participants": a.get("participants"),
-                    "tags": a.get("tags"),
-                    "description": a.get("description"),
-                    "location": a.get("location"),
-                    "time_start": ts.isoformat() if ts else None,
-                    "time_end": a.get("time_end")
-                })
-
-        results.sort(key=lambda x: x.get("time_start") or "", reverse=True)
-        return JsonResponse({"activities": results})
+        for distance, activity_id, act in nearby:
+            item = activity_row(activity_id, act, activity_id in liked_ids, fields)
+            item["distance_km"] = round(distance, 3)
+            results.append(item)
+
+        return JsonResponse({"activities": results, "radius_km": radius_km, "truncated": truncated})
 
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
+# ============================================================
+# Live updates (SSE, see api.live)
+# ============================================================
+
+def _live(request):
+    # Streams are only served by the async views (api.live): redirect there
+    if not served_over_asgi(request):
+        return JsonResponse({"error": ASGI_REQUIRED}, status=503)
+    return HttpResponseRedirect(request.get_full_path().replace("/api/live/", "/api/async/live/", 1))
+
+
+def live_feed(request):
+    """Deltas for /api/feed/ as Server-Sent Events (moved to /api/async/live/feed/)."""
+    return _live(request)
+
+
+def live_activities_by_tag(request):
+    """Deltas for /api/activities/by-tag/ as Server-Sent Events (moved to /api/async/live/activities/by-tag/)."""
+    return _live(request)
+
+
 # ============================================================
 # User Tags (No Auth)
 # ============================================================
 
+def reindex_partner_tags(uid, added=(), removed=()):
+    """Apply a users/{uid}.tags change to the partner index (api.partners)."""
+    partner_index.update_tags(
+        uid, added, removed,
+        load=lambda: db.collection("users").document(uid).get(["tags", "city"]).to_dict(),
+    )
+
+
 @csrf_exempt
 def user_add_tag(request, uid, tag):
     if request.method != "POST":
@@ -455,6 +1162,7 @@ def user_add_tag(request, uid, tag):
         db.collection("users").document(uid).update({
             "tags": firestore.ArrayUnion([tag])
         })
+        reindex_partner_tags(uid, added=[tag])
         return JsonResponse({"status": "tag_added", "uid": uid, "tag": tag})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -477,6 +1185,7 @@ def user_add_tags(request, uid, tags):
         user_ref.update({
             "tags": firestore.ArrayUnion(tag_list)
         })
+        reindex_partner_tags(uid, added=tag_list)
         return JsonResponse({"status": "tags_added", "uid": uid, "tags": tag_list})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -492,12 +1201,66 @@ def user_remove_tag(request, uid, tag):
         db.collection("users").document(uid).update({
             "tags": firestore.ArrayRemove([tag])
         })
+        reindex_partner_tags(uid, removed=[tag])
         return JsonResponse({"status": "tag_removed", "uid": uid, "tag": tag})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 
+# ============================================================
+# Partner Suggestions
+# ============================================================
+
+MAX_PARTNER_SUGGESTIONS = 50
+
+
+def suggest_partners(request):
+    """Users whose profile tags are most like the caller's (api.partners), optionally in ?city=."""
+    uid, error = get_uid_from_request(request)
+    if error:
+        return error
+
+    limit, _, error = get_page_params(request, default_limit=20, max_limit=MAX_PARTNER_SUGGESTIONS)
+    if error:
+        return error
+
+    city = request.GET.get("city") or None
+
+    try:
+        if not partner_index.ensure(db):
+            response = JsonResponse({"error": "Partner index is still building, retry shortly"}, status=503)
+            response["Retry-After"] = "5"
+            return response
+
+        profile = partner_index.profile(uid)
+        if profile is not None:
+            tags = profile[0]
+        else:
+            # Not indexed: no tags yet, or they were added through another worker
+            user_doc = db.collection("users").document(uid).get(["tags"])
+            tags = frozenset((user_doc.to_dict() or {}).get("tags") or [])
+
+        matches = partner_index.similar(tags, city, exclude=uid, limit=limit)
+        display_names = get_display_names(match_uid for match_uid, _, _ in matches)
+
+        partners = [
+            {
+                "uid": match_uid,
+                "display_name": display_names.get(match_uid),
+                "city": match.city,
+                "tags": sorted(match.tags),
+                "shared_tags": sorted(match.tags & tags),
+                "similarity": round(similarity, 3),
+            }
+            for match_uid, similarity, match in matches
+        ]
+        return JsonResponse({"partners": partners, "tags": sorted(tags), "city": city})
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
 # ============================================================
 # Test Firestore
 # ============================================================
@@ -515,53 +1278,26 @@ def test_firestore(request):
 # ============================================================
 # AI Feed (NEW)
 # ============================================================
-VISUAL_CROSSING_API_KEY = settings.VISUAL_CROSSING_API_KEY
-
 
-def fetch_weather_ai(lat, lng):
-    """Fetch current weather from Visual Crossing."""
-    try:
-        url = (
-            f"https://weather.visualcrossing.com/VisualCrossingWebServices/"
-            f"rest/services/timeline/{lat},{lng}?unitGroup=metric&key={VISUAL_CROSSING_API_KEY}"
-        )
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("currentConditions", {})
-    except Exception as e:
-        print("[Weather ERROR]", e)
-        return {}
-
-
-def score_activity_weather(activity, weather):
-    """AI-style weather scoring."""
-    tags = activity.get("tags", [])
-    temp = weather.get("temp")
-    conditions = (weather.get("conditions") or "").lower()
-
-    score = 50  # baseline
-
-    # Temperature
-    if temp is not None:
-        if temp < 5:
-            score -= 15
-        elif 5 <= temp <= 15:
-            score += 5
-        elif 16 <= temp <= 25:
-            score += 10
-        elif temp > 30:
-            score -= 10
+def score_activity_weather(activity, timeline):
+    """
+    AI-style weather scoring against the forecast hour of the activity's
+    time_start (CandidatePool.weather_scores is the vectorized twin).
+    """
+    weather = timeline.at(activity.get("time_start"))
+    tags = set(activity.get("tags", []))
+    score = weather_base_score(weather)
 
     # Conditions
-    if "rain" in conditions or "snow" in conditions:
-        if any(t in ["outside", "walking", "sport", "adventure"] for t in tags):
+    wet, sunny = weather_flags(weather)
+    if wet:
+        if not tags.isdisjoint(RAIN_AVOID_TAGS):
             score -= 20
-        if any(t in ["indoor", "cafe", "gaming", "movie"] for t in tags):
+        if not tags.isdisjoint(RAIN_FRIENDLY_TAGS):
             score += 10
 
-    if "sunny" in conditions or "clear" in conditions:
-        if any(t in ["walking", "nature", "sport", "outside"] for t in tags):
+    if sunny:
+        if not tags.isdisjoint(SUN_FRIENDLY_TAGS):
             score += 15
 
     return max(1, min(score, 100))
@@ -579,49 +1315,37 @@ def get_feed_ai(request):
     if not lat or not lng:
         return JsonResponse({"error": "Missing ?lat=&lng="}, status=400)
 
-    weather = fetch_weather_ai(lat, lng)
-
-    try:
-        docs = (
-            db.collection("activities")
-            .order_by("time_start", direction=firestore.Query.DESCENDING)
-            .limit(10)
-            .stream()
-        )
-
-        feed = []
-
-        for doc in docs:
-            act = doc.to_dict()
-            activity_id = doc.id
+    lat, lng = parse_lat_lng(lat, lng)
+    if lat is None:
+        return JsonResponse({"error": "Invalid ?lat=&lng="}, status=400)
 
-            ts_start = act.get("time_start")
-            ts_end = act.get("time_end")
-
-            likes_ref = db.collection("activities").document(activity_id).collection("likes")
-            likes_count = len(list(likes_ref.stream()))
-            user_liked = uid and likes_ref.document(uid).get().exists
-
-            ai_score = score_activity_weather(act, weather)
-
-            feed.append({
-                "id": activity_id,
-                "tags": act.get("tags"),
-                "description": act.get("description"),
-                "location": act.get("location"),
-                "participants": act.get("participants"),
-                "time_start": ts_start.isoformat() if ts_start else None,
-                "time_end": ts_end.isoformat() if ts_end else None,
-                "likes_count": likes_count,
-                "comments_count": 0,
-                "user_liked": user_liked,
-                "ai_score": ai_score,
-                "weather_now": weather
-            })
-
-        feed.sort(key=lambda x: x["ai_score"], reverse=True)
+    limit, cursor, error = get_page_params(request, decode=decode_rank_cursor)
+    if error:
+        return error
 
-        return JsonResponse({"feed": feed})
+    try:
+        # One cached timeline per cell; activities are scored at their start hour
+        timeline = fetch_weather_timeline(lat, lng)
+
+        # The whole candidate pool is ranked for this caller. The pool and
+        # its features are cached (api.ranking); the ranking is not, since
+        # distances depend on the exact lat/lng.
+        pool = get_candidate_pool(db)
+        ranked, next_cursor = ranked_page(pool, lat, lng, timeline, cursor, limit)
+
+        liked_ids = get_liked_activity_ids(uid, [row[0] for row in ranked])
+        feed = [
+            ai_feed_item(activity_id, act, activity_id in liked_ids, timeline, *scores)
+            for activity_id, act, *scores in ranked
+        ]
+
+        return JsonResponse({
+            "feed": feed,
+            "display_names": feed_display_names(feed),
+            "next_cursor": next_cursor,
+        })
 
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,363 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+import numpy as np
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from api.geo import geohash_decode, geohash_encode
+from api.metrics import CACHE_STATS, timed_http
+
+# ============================================================
+# HTTP session
+# ============================================================
+#
+# One pooled session per process: keeps TLS connections to Visual
+# Crossing alive between requests instead of handshaking on every call.
+
+_session = requests.Session()
+_session.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=settings.WEATHER_POOL_SIZE, max_retries=1),
+)
+_session.mount(
+    "http://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=settings.WEATHER_POOL_SIZE, max_retries=1),
+)
+
+
+# ============================================================
+# Forecast timeline
+# ============================================================
+
+# Hour fields kept from the upstream payload (it carries ~30 per hour)
+HOUR_FIELDS = ("datetime", "datetimeEpoch", "temp", "conditions", "precipprob", "icon")
+
+
+def weather_base_score(weather):
+    """Tag-independent part of the weather score: baseline + temperature."""
+    temp = weather.get("temp")
+    score = 50
+
+    if temp is not None:
+        if temp < 5:
+            score -= 15
+        elif 5 <= temp <= 15:
+            score += 5
+        elif 16 <= temp <= 25:
+            score += 10
+        elif temp > 30:
+            score -= 10
+    return score
+
+
+def weather_flags(weather):
+    """(wet, sunny) for one set of conditions."""
+    conditions = (weather.get("conditions") or "").lower()
+    wet = "rain" in conditions or "snow" in conditions
+    sunny = "sunny" in conditions or "clear" in conditions
+    return wet, sunny
+
+
+class WeatherTimeline:
+    """
+    Current conditions plus the hourly forecast of one cell, parsed once
+    per upstream fetch. Hours are "slots" 0..n-1 in time order; slot n is
+    the current conditions, used for times outside the forecast (e.g.
+    activities that already started).
+    """
+
+    def __init__(self, current, hours):
+        self.current = current
+        self.hours = sorted(hours, key=lambda h: h["datetimeEpoch"])
+        self.epochs = np.array([h["datetimeEpoch"] for h in self.hours], dtype=np.float64)
+
+        slots = self.hours + [current]
+        self.base_scores = np.array([weather_base_score(h) for h in slots], dtype=np.int64)
+        flags = [weather_flags(h) for h in slots]
+        self.wet = np.array([wet for wet, _ in flags], dtype=bool)
+        self.sunny = np.array([sunny for _, sunny in flags], dtype=bool)
+
+    @classmethod
+    def from_payload(cls, payload):
+        hours = [
+            {k: hour[k] for k in HOUR_FIELDS if k in hour}
+            for day in payload.get("days") or []
+            for hour in day.get("hours") or []
+            if isinstance(hour.get("datetimeEpoch"), (int, float))
+        ]
+        return cls(payload.get("currentConditions") or {}, hours)
+
+    def slots(self, timestamps):
+        """Slot per epoch timestamp; NaN or outside the forecast -> current conditions."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        current = len(self.hours)
+        if not current:
+            return np.zeros(timestamps.shape, dtype=np.intp)
+
+        index = np.searchsorted(self.epochs, timestamps, side="right") - 1
+        covered = (index >= 0) & (timestamps - self.epochs[np.maximum(index, 0)] < 3600)
+        return np.where(covered, index, current)
+
+    def at(self, when):
+        """Forecast hour covering `when` (a datetime), else the current conditions."""
+        if not hasattr(when, "timestamp"):
+            return self.current
+        slot = int(self.slots([when.timestamp()])[0])
+        return self.hours[slot] if slot < len(self.hours) else self.current
+
+
+EMPTY_TIMELINE = WeatherTimeline({}, [])
+
+
+# ============================================================
+# Cache
+# ============================================================
+
+class WeatherCache:
+    """
+    Bounded LRU cache of parsed upstream timelines, keyed by geohash cell.
+
+    - Fresh entries (age < ttl) are returned directly.
+    - Stale entries (ttl <= age < ttl + stale_ttl) are returned immediately
+      while one background thread refreshes them (stale-while-revalidate).
+    - Concurrent misses on the same cell wait for a single upstream call.
+    - Failed fetches are not cached; a stale value, if any, keeps being served.
+    """
+
+    def __init__(self, ttl, stale_ttl, max_entries):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()  # key -> (payload, fetched_at)
+        self._inflight = {}            # key -> threading.Event
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_errors = 0
+
+    def get(self, key, fetch):
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, fetched_at = entry
+                age = now - fetched_at
+
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return payload
+
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._inflight:
+                        self._inflight[key] = threading.Event()
+                        threading.Thread(
+                            target=self._refresh, args=(key, fetch), daemon=True
+                        ).start()
+                    return payload
+
+            self.misses += 1
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+
+        if not owner:
+            # Someone else is already fetching this cell
+            event.wait(timeout=settings.WEATHER_READ_TIMEOUT + settings.WEATHER_CONNECT_TIMEOUT)
+            with self._lock:
+                entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+        return self._refresh(key, fetch)
+
+    def _refresh(self, key, fetch):
+        payload = None
+        try:
+            payload = fetch()
+        except Exception as e:
+            print("[Weather ERROR]", e)
+
+        with self._lock:
+            if payload is None:
+                self.upstream_errors += 1
+                entry = self._entries.get(key)
+                payload = entry[0] if entry else None
+            else:
+                self._store(key, payload)
+
+            self._inflight.pop(key).set()
+
+        return payload
+
+    def _store(self, key, payload):
+        self._entries[key] = (payload, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # Non-blocking API for async callers, which do their own fetching
+
+    def peek(self, key):
+        """Return (payload, fresh); payload is None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return payload, True
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    return payload, False
+
+            self.misses += 1
+            return None, False
+
+    def store(self, key, payload):
+        with self._lock:
+            if payload is None:
+                self.upstream_errors += 1
+            else:
+                self._store(key, payload)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "upstream_errors": self.upstream_errors,
+                "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.stale_hits = self.misses = self.upstream_errors = 0
+
+
+weather_cache = WeatherCache(
+    ttl=settings.WEATHER_CACHE_TTL,
+    stale_ttl=settings.WEATHER_CACHE_STALE_TTL,
+    max_entries=settings.WEATHER_CACHE_MAX_ENTRIES,
+)
+CACHE_STATS.register("weather", weather_cache.stats)
+
+
+# ============================================================
+# Lookups
+# ============================================================
+
+def weather_cell(lat, lng):
+    return geohash_encode(lat, lng, settings.WEATHER_GEOHASH_PRECISION)
+
+
+def _fetch_timeline(cell):
+    # Query the cell centre so every caller in the cell gets the same answer
+    lat, lng = geohash_decode(cell)
+    url = f"{settings.WEATHER_API_URL}/{lat:.4f},{lng:.4f}"
+    with timed_http("weather"):
+        response = _session.get(
+            url,
+            params={"unitGroup": "metric", "key": settings.VISUAL_CROSSING_API_KEY},
+            timeout=(settings.WEATHER_CONNECT_TIMEOUT, settings.WEATHER_READ_TIMEOUT),
+        )
+        response.raise_for_status()
+    return WeatherTimeline.from_payload(response.json())
+
+
+def fetch_weather_timeline(lat, lng):
+    """Hourly forecast (WeatherTimeline) from Visual Crossing, shared per geohash cell."""
+    cell = weather_cell(lat, lng)
+    return weather_cache.get(cell, lambda: _fetch_timeline(cell)) or EMPTY_TIMELINE
+
+
+def fetch_weather_ai(lat, lng):
+    """Current weather from Visual Crossing, shared per geohash cell."""
+    return fetch_weather_timeline(lat, lng).current
+
+
+# ============================================================
+# Async lookups (api.async_views)
+# ============================================================
+#
+# Same cache, but fetched with httpx.AsyncClient so the event loop is
+# never blocked. Clients and in-flight refreshes are kept per event loop.
+
+_async_http = weakref.WeakKeyDictionary()      # loop -> httpx.AsyncClient
+_async_inflight = weakref.WeakKeyDictionary()  # loop -> {cell: Task}
+
+
+def _get_async_http():
+    loop = asyncio.get_running_loop()
+    client = _async_http.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.WEATHER_READ_TIMEOUT, connect=settings.WEATHER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.WEATHER_POOL_SIZE,
+                max_keepalive_connections=settings.WEATHER_POOL_SIZE,
+            ),
+        )
+        _async_http[loop] = client
+    return client
+
+
+async def _afetch_timeline(cell):
+    lat, lng = geohash_decode(cell)
+    with timed_http("weather"):
+        response = await _get_async_http().get(
+            f"{settings.WEATHER_API_URL}/{lat:.4f},{lng:.4f}",
+            params={"unitGroup": "metric", "key": settings.VISUAL_CROSSING_API_KEY},
+        )
+        response.raise_for_status()
+    return WeatherTimeline.from_payload(response.json())
+
+
+async def _arefresh(cell):
+    payload = None
+    try:
+        payload = await _afetch_timeline(cell)
+    except Exception as e:
+        print("[Weather ERROR]", e)
+
+    weather_cache.store(cell, payload)
+    return payload
+
+
+async def async_fetch_weather_timeline(lat, lng):
+    """Async fetch_weather_timeline(): fresh hit, stale hit + background refresh, or one shared fetch."""
+    cell = weather_cell(lat, lng)
+    payload, fresh = weather_cache.peek(cell)
+
+    if not fresh:
+        inflight = _async_inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(cell)
+        if task is None:
+            task = asyncio.ensure_future(_arefresh(cell))
+            inflight[cell] = task
+            task.add_done_callback(lambda _: inflight.pop(cell, None))
+
+        if payload is None:
+            payload = await asyncio.shield(task)
+
+    return payload or EMPTY_TIMELINE
@@ -33,6 +33,9 @@ INSTALLED_APPS = [
 # ------------------------------------------------
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    # Outermost after CORS so Server-Timing covers the whole request
+    "api.middleware.RequestMetricsMiddleware",
+    "api.middleware.JsonGZipMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -77,6 +80,15 @@ DATABASES = {
 # ------------------------------------------------
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+# Let the browser's devtools show our Server-Timing breakdown cross-origin,
+# and let clients read ETag for If-None-Match revalidation
+CORS_EXPOSE_HEADERS = ["Server-Timing", "ETag"]
+
+# ------------------------------------------------
+# COMPRESSION
+# ------------------------------------------------
+# JSON responses at least this large are gzipped (api.middleware.JsonGZipMiddleware)
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
 
 # ------------------------------------------------
 # STATIC
@@ -84,3 +96,107 @@ CORS_ALLOW_CREDENTIALS = True
 STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# ------------------------------------------------
+# FIRESTORE
+# ------------------------------------------------
+# "firestore" (default) or "memory" for the in-process stand-in used by
+# `python manage.py bench_endpoints`.
+FIRESTORE_BACKEND = os.getenv("FIRESTORE_BACKEND", "firestore")
+
+# ------------------------------------------------
+# WEATHER (Visual Crossing)
+# ------------------------------------------------
+# Point WEATHER_API_URL at `python manage.py weather_stub` for local runs.
+WEATHER_API_URL = os.getenv(
+    "WEATHER_API_URL",
+    "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline",
+)
+WEATHER_GEOHASH_PRECISION = int(os.getenv("WEATHER_GEOHASH_PRECISION", "5"))  # ~5 km cells
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_STALE_TTL = int(os.getenv("WEATHER_CACHE_STALE_TTL", "1800"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "2048"))
+WEATHER_CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "3"))
+WEATHER_READ_TIMEOUT = float(os.getenv("WEATHER_READ_TIMEOUT", "5"))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "10"))
+
+# ------------------------------------------------
+# AI FEED RANKING (api.ranking)
+# ------------------------------------------------
+# Candidates: activities starting after now - LOOKBACK (soonest first),
+# topped up with earlier ones; re-read every TTL
+AI_CANDIDATE_POOL_SIZE = int(os.getenv("AI_CANDIDATE_POOL_SIZE", "500"))
+AI_CANDIDATE_LOOKBACK_HOURS = int(os.getenv("AI_CANDIDATE_LOOKBACK_HOURS", "24"))
+AI_CANDIDATE_POOL_TTL = int(os.getenv("AI_CANDIDATE_POOL_TTL", "60"))
+AI_DISTANCE_SCALE_KM = float(os.getenv("AI_DISTANCE_SCALE_KM", "5"))
+AI_RECENCY_HALF_LIFE_HOURS = float(os.getenv("AI_RECENCY_HALF_LIFE_HOURS", "24"))
+
+# ------------------------------------------------
+# PERSONALIZED FEED (api.personalize, /api/feed/?mode=personal)
+# ------------------------------------------------
+PERSONAL_PROFILE_TTL = int(os.getenv("PERSONAL_PROFILE_TTL", "60"))  # tags + co-participants
+PERSONAL_CANDIDATES_TTL = int(os.getenv("PERSONAL_CANDIDATES_TTL", "30"))  # candidate lists, rankings
+PERSONAL_CACHE_MAX_ENTRIES = int(os.getenv("PERSONAL_CACHE_MAX_ENTRIES", "10000"))
+PERSONAL_TIMELINE_DEPTH = int(os.getenv("PERSONAL_TIMELINE_DEPTH", "50"))  # entries read for co-participants
+PERSONAL_TAG_CANDIDATES = int(os.getenv("PERSONAL_TAG_CANDIDATES", "150"))
+PERSONAL_RECENT_CANDIDATES = int(os.getenv("PERSONAL_RECENT_CANDIDATES", "50"))
+PERSONAL_SOCIAL_CANDIDATES = int(os.getenv("PERSONAL_SOCIAL_CANDIDATES", "50"))
+PERSONAL_RECENCY_HALF_LIFE_HOURS = float(os.getenv("PERSONAL_RECENCY_HALF_LIFE_HOURS", "48"))
+
+# ------------------------------------------------
+# PARTNER MATCHING (api.partners)
+# ------------------------------------------------
+# MinHash signature length and LSH bands (rows per band = permutations / bands)
+PARTNER_MINHASH_PERMUTATIONS = int(os.getenv("PARTNER_MINHASH_PERMUTATIONS", "64"))
+PARTNER_LSH_BANDS = int(os.getenv("PARTNER_LSH_BANDS", "32"))
+PARTNER_MAX_CANDIDATES = int(os.getenv("PARTNER_MAX_CANDIDATES", "2000"))  # exact-scored per lookup
+# Background rebuild from users/ (picks up other workers' tag changes)
+PARTNER_INDEX_TTL = int(os.getenv("PARTNER_INDEX_TTL", "900"))
+# How long a request waits for the first build before answering 503
+PARTNER_INDEX_WARMUP_WAIT = float(os.getenv("PARTNER_INDEX_WARMUP_WAIT", "2"))
+
+# ------------------------------------------------
+# AUTH
+# ------------------------------------------------
+# Verified Firebase ID tokens kept in memory until their `exp` claim
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Firebase Auth display names (likes / comments / feed participants)
+DISPLAY_NAME_CACHE_TTL = int(os.getenv("DISPLAY_NAME_CACHE_TTL", "900"))
+DISPLAY_NAME_NEGATIVE_TTL = int(os.getenv("DISPLAY_NAME_NEGATIVE_TTL", "120"))
+DISPLAY_NAME_CACHE_MAX_ENTRIES = int(os.getenv("DISPLAY_NAME_CACHE_MAX_ENTRIES", "50000"))
+
+# ------------------------------------------------
+# CACHES
+# ------------------------------------------------
+# "responses" backs the shared tier of api.response_cache. LocMemCache is
+# the local stand-in; point it at Redis/Memcached to share between workers,
+# or set RESPONSE_CACHE_BACKEND="" to keep only the in-process tier.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "responses")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+# ------------------------------------------------
+# LIVE UPDATES (api.live, Server-Sent Events)
+# ------------------------------------------------
+LIVE_WINDOW = int(os.getenv("LIVE_WINDOW", "50"))  # newest activities each listener watches
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# Streams end after this long; EventSource reconnects with Last-Event-ID
+LIVE_MAX_STREAM_SECONDS = int(os.getenv("LIVE_MAX_STREAM_SECONDS", "300"))
+LIVE_RETRY_MS = int(os.getenv("LIVE_RETRY_MS", "3000"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))  # per subscriber, then resync
+LIVE_REPLAY_EVENTS = int(os.getenv("LIVE_REPLAY_EVENTS", "512"))  # per listener
+LIVE_LISTENER_LINGER = int(os.getenv("LIVE_LISTENER_LINGER", "60"))
+LIVE_MAX_LISTENERS = int(os.getenv("LIVE_MAX_LISTENERS", "200"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "5000"))
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path
 from api.views import (
     sync_offline_activity,
+    sync_offline_activities_bulk,
     get_feed,
     get_feed_ai,   # NEW AI FEED
     test_firestore,
@@ -20,24 +21,40 @@ from api.views import (
     activities_by_tags_any,
     activities_by_tags_all,
 
+    # Live updates (SSE)
+    live_feed,
+    live_activities_by_tag,
+
+    # Nearby
+    activities_nearby,
+
     # User tags
     user_add_tag,
     user_add_tags,
     user_remove_tag,
     get_activities_by_user,
+
+    # Partner suggestions
+    suggest_partners,
 )
+from api import async_views
+from api.metrics import metrics_view
 
 urlpatterns = [
 
     # Admin
     path("admin/", admin.site.urls),
 
+    # Prometheus scrape target
+    path("metrics", metrics_view),
+
     # Activities
     path("api/sync/", sync_offline_activity),
+    path("api/sync/bulk/", sync_offline_activities_bulk),
     path("api/feed/", get_feed),
     path("api/feed/ai/", get_feed_ai),  # NEW AI FEED
     path("api/test-firestore/", test_firestore),
-    path("api/activities/<str:uid>/", get_activities_by_user),
+    path("api/activities/nearby/", activities_nearby),
 
     # Likes
     path("api/activity/<str:activity_id>/like/", like_activity),
@@ -53,8 +70,26 @@ urlpatterns = [
     path("api/activities/by-tags-any/", activities_by_tags_any),
     path("api/activities/by-tags-all/", activities_by_tags_all),
 
+    # Live updates (Server-Sent Events)
+    path("api/live/feed/", live_feed),
+    path("api/live/activities/by-tag/", live_activities_by_tag),
+
+    # Catch-all uid route last, or it shadows the fixed /activities/... paths
+    path("api/activities/<str:uid>/", get_activities_by_user),
+
+    # Async read endpoints (ASGI)
+    path("api/async/feed/", async_views.get_feed),
+    path("api/async/feed/ai/", async_views.get_feed_ai),
+    path("api/async/activity/<str:activity_id>/comments/", async_views.list_comments),
+    path("api/async/activities/by-tag/", async_views.activities_by_tag),
+    path("api/async/activities/by-tags-any/", async_views.activities_by_tags_any),
+    path("api/async/activities/by-tags-all/", async_views.activities_by_tags_all),
+    path("api/async/live/feed/", async_views.live_feed),
+    path("api/async/live/activities/by-tag/", async_views.live_activities_by_tag),
+
     # User tag modification (no auth)
     path("api/user/<str:uid>/add-tag/<str:tag>/", user_add_tag),
     path("api/user/<str:uid>/add-tags/<str:tags>/", user_add_tags),
     path("api/user/<str:uid>/remove-tag/<str:tag>/", user_remove_tag),
+    path("api/partners/", suggest_partners),
 ]
@@ -11,19 +11,17 @@ import {
   Check
 } from 'lucide-react';
 import { 
-  doc, 
-  setDoc, 
-  deleteDoc, 
   collection, 
-  addDoc, 
   query, 
   orderBy, 
-  getDocs,
-  serverTimestamp 
+  getDocs
 } from 'firebase/firestore';
 import { auth, db } from '../lib/firebase';
 import type { ActivityPost } from '../types';
 
+// Lajki i komentarze idą przez API - backend trzyma liczniki w dokumencie aktywności
+const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
+
 interface ActivityCardProps {
   post: ActivityPost;
   onUserClick?: (uid: string) => void;
@@ -64,16 +62,13 @@ const ActivityCard = ({ post, onUserClick = () => {}, onActivityClick = () => {}
     setLikesCount(prev => isLiked ? prev - 1 : prev + 1);
 
     try {
-      const likeRef = doc(db, "activities", post.id, "likes", auth.currentUser.uid);
-      if (previousLiked) {
-        await deleteDoc(likeRef);
-      } else {
-        await setDoc(likeRef, {
-          user_id: auth.currentUser.uid,
-          user_display_name: auth.currentUser.displayName || "User",
-          timestamp: serverTimestamp()
-        });
-      }
+      const token = await auth.currentUser.getIdToken();
+      const action = previousLiked ? "unlike" : "like";
+      const response = await fetch(`${API_URL}/api/activity/${post.id}/${action}/`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      if (!response.ok) throw new Error(`Like failed: ${response.status}`);
     } catch (error) {
       console.error("Error toggling like:", error);
       setIsLiked(previousLiked);
@@ -128,11 +123,20 @@ const ActivityCard = ({ post, onUserClick = () => {}, onActivityClick = () => {}
       const commentData = {
         user_id: auth.currentUser.uid,
         user_display_name: auth.currentUser.displayName || "User",
-        text: newComment.trim(),
-        timestamp: serverTimestamp()
+        text: newComment.trim()
       };
-      const docRef = await addDoc(collection(db, "activities", post.id, "comments"), commentData);
-      setComments([...comments, { id: docRef.id, ...commentData, timestamp: new Date() }]);
+      const token = await auth.currentUser.getIdToken();
+      const response = await fetch(`${API_URL}/api/activity/${post.id}/comment/`, {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json"
+        },
+        body: JSON.stringify({ text: commentData.text })
+      });
+      if (!response.ok) throw new Error(`Comment failed: ${response.status}`);
+      const data = await response.json();
+      setComments([...comments, { id: data.comment_id, ...commentData, timestamp: new Date() }]);
       setCommentsCount(prev => prev + 1);
       setNewComment("");
     } catch (error) {
@@ -1,9 +1,12 @@
 import { useState, useEffect } from 'react';
-import { doc, getDoc, collection, query, orderBy, onSnapshot, addDoc, serverTimestamp, setDoc, deleteDoc } from 'firebase/firestore';
+import { doc, getDoc, collection, query, orderBy, onSnapshot } from 'firebase/firestore';
 import { auth, db } from '../lib/firebase';
 import { ArrowLeft, MapPin, Clock, Heart, MessageCircle, Send, Share2, Timer, Flame, Users, Check } from 'lucide-react';
 import type { ActivityPost } from '../types';
 
+// Lajki i komentarze idą przez API - backend trzyma liczniki w dokumencie aktywności
+const API_URL = import.meta.env.VITE_API_URL || "http://127.0.0.1:8000";
+
 interface ActivityDetailProps {
   activityId: string;
   onBack: () => void;
@@ -127,15 +130,13 @@ const ActivityDetail = ({ activityId, onBack, onUserClick }: ActivityDetailProps
 
   const handleToggleLike = async () => {
     if (!auth.currentUser || !post) return;
-    const likeRef = doc(db, "activities", post.id, "likes", auth.currentUser.uid);
-    if (isLiked) {
-      await deleteDoc(likeRef);
-    } else {
-      await setDoc(likeRef, {
-        user_id: auth.currentUser.uid,
-        timestamp: serverTimestamp()
-      });
-    }
+    const token = await auth.currentUser.getIdToken();
+    const action = isLiked ? "unlike" : "like";
+    const response = await fetch(`${API_URL}/api/activity/${post.id}/${action}/`, {
+      method: "POST",
+      headers: { Authorization: `Bearer ${token}` }
+    });
+    if (!response.ok) console.error("Error toggling like:", response.status);
   };
 
   const handleShare = () => {
@@ -159,12 +160,19 @@ const ActivityDetail = ({ activityId, onBack, onUserClick }: ActivityDetailProps
     e.preventDefault();
     if (!newComment.trim() || !auth.currentUser) return;
 
-    await addDoc(collection(db, "activities", activityId, "comments"), {
-      user_id: auth.currentUser.uid,
-      user_display_name: auth.currentUser.displayName || "User",
-      text: newComment.trim(),
-      timestamp: serverTimestamp()
+    const token = await auth.currentUser.getIdToken();
+    const response = await fetch(`${API_URL}/api/activity/${activityId}/comment/`, {
+      method: "POST",
+      headers: {
+        Authorization: `Bearer ${token}`,
+        "Content-Type": "application/json"
+      },
+      body: JSON.stringify({ text: newComment.trim() })
     });
+    if (!response.ok) {
+      console.error("Error adding comment:", response.status);
+      return;
+    }
     setNewComment("");
   };
 